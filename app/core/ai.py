@@ -0,0 +1,173 @@
+"""
+Dịch vụ gọi mô hình AI
+
+Client được tạo một lần trong lifespan và dùng chung cho mọi request. Lời gọi
+mô hình là async (không chặn event loop), số lời gọi đồng thời bị giới hạn
+bằng semaphore và mỗi lời gọi có timeout riêng.
+
+AI_BACKEND=fake dùng mô hình giả lập cục bộ để load test không cần mạng.
+"""
+import asyncio
+import os
+from collections import deque
+from collections.abc import AsyncIterator
+from time import perf_counter
+from dotenv import load_dotenv
+from google import genai
+
+load_dotenv()
+
+
+class GeminiBackend:
+    def __init__(self, api_key: str, model: str):
+        self.model = model
+        self.client = genai.Client(api_key=api_key)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.client.aio.models.generate_content(model=self.model, contents=prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        chunks = await self.client.aio.models.generate_content_stream(model=self.model, contents=prompt)
+        async for chunk in chunks:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend:
+    """Mô hình giả lập: chờ latency giây rồi trả về câu trả lời cố định"""
+
+    model = "fake"
+
+    def __init__(self, latency: float = 1.0):
+        self.latency = latency
+
+    def _answer(self, prompt: str) -> str:
+        return f"[fake] Đã nhận câu hỏi ({len(prompt)} ký tự)."
+
+    async def generate(self, prompt: str) -> str:
+        await asyncio.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        # Tổng thời gian bằng generate(), chia đều cho từng từ
+        words = self._answer(prompt).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield word if i == 0 else " " + word
+
+
+class AIService:
+    def __init__(self, backend, max_concurrency: int = 8, timeout: float = 30):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._ttft_ms = deque(maxlen=500)  # time-to-first-token của các lần stream gần nhất
+        self.stats = {"calls": 0, "in_flight": 0, "waiting": 0, "timeouts": 0, "errors": 0}
+
+    @property
+    def model(self) -> str:
+        return self.backend.model
+
+    async def _acquire(self):
+        self.stats["waiting"] += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.stats["waiting"] -= 1
+        self.stats["in_flight"] += 1
+
+    def _release(self):
+        self.stats["in_flight"] -= 1
+        self._semaphore.release()
+
+    async def _call(self, prompt: str) -> str:
+        await self._acquire()
+        try:
+            return await self.backend.generate(prompt)
+        finally:
+            self._release()
+
+    async def generate(self, prompt: str) -> str:
+        """Gọi mô hình, thời gian chờ slot và thời gian sinh đều tính vào timeout"""
+        self.stats["calls"] += 1
+        try:
+            return await asyncio.wait_for(self._call(prompt), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Trả về từng đoạn văn bản ngay khi mô hình sinh ra (cùng giới hạn và timeout)"""
+        self.stats["calls"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        started = perf_counter()
+
+        try:
+            await asyncio.wait_for(self._acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+
+        chunks = self.backend.stream(prompt)
+        first = True
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    text = await asyncio.wait_for(anext(chunks), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+
+                if first:
+                    self._ttft_ms.append((perf_counter() - started) * 1000)
+                    first = False
+                yield text
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            await chunks.aclose()
+            self._release()
+
+    def metrics(self) -> dict:
+        ttft = sorted(self._ttft_ms)
+        return {
+            **self.stats,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "ttft_ms": {
+                "count": len(ttft),
+                "p50": round(ttft[len(ttft) // 2], 1) if ttft else None,
+                "p95": round(ttft[int(len(ttft) * 0.95)], 1) if ttft else None
+            }
+        }
+
+
+def create_ai_service() -> AIService | None:
+    """Tạo dịch vụ AI từ biến môi trường (None nếu chưa cấu hình)"""
+    backend_name = os.getenv("AI_BACKEND", "gemini").lower()
+
+    if backend_name == "fake":
+        backend = FakeBackend(latency=float(os.getenv("AI_FAKE_LATENCY", 1.0)))
+    else:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            return None
+        backend = GeminiBackend(api_key, os.getenv("AI_MODEL", "gemini-2.5-flash"))
+
+    return AIService(
+        backend,
+        max_concurrency=int(os.getenv("AI_MAX_CONCURRENCY", 8)),
+        timeout=float(os.getenv("AI_TIMEOUT", 30))
+    )
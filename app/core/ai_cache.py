@@ -0,0 +1,80 @@
+"""
+Cache câu trả lời AI
+
+Câu hỏi được chuẩn hóa (chữ thường, gộp khoảng trắng, bỏ dấu câu cuối) và
+ghép với role người hỏi + hash của context để làm khóa. Cache chính là LRU+TTL
+trong bộ nhớ; nếu AI_CACHE_PERSIST=true thì ghi thêm vào collection
+ai_answer_cache (TTL index) để giữ cache qua các lần khởi động lại.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo.asynchronous.database import AsyncDatabase
+
+from app.core.cache import TTLCache
+
+load_dotenv()
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(message.lower().split()).rstrip("?!.… ")
+
+
+def answer_cache_key(message: str, role: str, context: str | None = None) -> str:
+    context_hash = hashlib.sha256((context or "").encode()).hexdigest()
+    raw = f"{role}\n{normalize_message(message)}\n{context_hash}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 86400, db: AsyncDatabase | None = None):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.collection = db.ai_answer_cache if db is not None else None
+        self.persistent_hits = 0
+
+    async def get(self, key: str) -> str | None:
+        answer = self.memory.get(key)
+        if answer is not None or self.collection is None:
+            return answer
+
+        doc = await self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now()}})
+        if doc is None:
+            return None
+
+        self.persistent_hits += 1
+        self.memory.set(key, doc["answer"])
+        return doc["answer"]
+
+    async def set(self, key: str, answer: str):
+        self.memory.set(key, answer)
+        if self.collection is not None:
+            await self.collection.update_one(
+                {"_id": key},
+                {"$set": {"answer": answer, "expires_at": datetime.now() + timedelta(seconds=self.ttl)}},
+                upsert=True
+            )
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        # Lần trượt bộ nhớ nhưng trúng MongoDB vẫn tính là trúng cache
+        total = stats["hits"] + stats["misses"]
+        hits = stats["hits"] + self.persistent_hits
+        stats["persistent"] = self.collection is not None
+        stats["persistent_hits"] = self.persistent_hits
+        stats["hit_rate"] = round(hits / total, 4) if total else 0.0
+        return stats
+
+
+def create_answer_cache(db: AsyncDatabase) -> AnswerCache | None:
+    """Tạo cache câu trả lời AI từ biến môi trường (None nếu tắt)"""
+    if os.getenv("AI_CACHE_ENABLED", "true").lower() != "true":
+        return None
+
+    persist = os.getenv("AI_CACHE_PERSIST", "false").lower() == "true"
+    return AnswerCache(
+        maxsize=int(os.getenv("AI_CACHE_SIZE", 1024)),
+        ttl=float(os.getenv("AI_CACHE_TTL", 86400)),
+        db=db if persist else None
+    )
@@ -0,0 +1,135 @@
+"""
+Pub/sub cho tin nhắn real-time giữa các worker
+
+ConnectionManager chỉ biết các WebSocket trong process của nó. Broker đứng
+trước manager: publish() phát sự kiện tới mọi process, mỗi process nhận lại và
+giao cho các kết nối local.
+
+- memory: 1 process (mặc định), giao thẳng cho handler
+- mongo: capped collection + tailable cursor, chạy được với mongod standalone
+  (không cần replica set). Process phát giao local ngay, các process khác
+  nhận qua tailable cursor.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable
+from dotenv import load_dotenv
+from pymongo import CursorType
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import CollectionInvalid
+
+load_dotenv()
+
+# handler(message, user_ids): giao message cho kết nối local của các user
+Handler = Callable[[dict, list[str]], Awaitable[int]]
+
+
+class MemoryBroker:
+    backend = "memory"
+
+    def __init__(self):
+        self.handler: Handler | None = None
+        self.stats = {"published": 0, "received": 0}
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def stop(self):
+        self.handler = None
+
+    async def publish(self, message: dict, user_ids: list[str]):
+        self.stats["published"] += 1
+        if self.handler:
+            self.stats["received"] += 1
+            await self.handler(message, list(user_ids))
+
+    def metrics(self) -> dict:
+        return {"backend": self.backend, **self.stats}
+
+
+class MongoBroker(MemoryBroker):
+    backend = "mongo"
+
+    def __init__(self, db: AsyncDatabase, collection: str = "ws_events", size: int = 16 * 1024 * 1024):
+        super().__init__()
+        self.db = db
+        self.collection_name = collection
+        self.size = size
+        self.origin = uuid.uuid4().hex  # Định danh process này
+        self.stats.update({"remote": 0, "errors": 0})
+        self._task: asyncio.Task | None = None
+
+    async def _ensure_collection(self):
+        try:
+            await self.db.create_collection(self.collection_name, capped=True, size=self.size)
+            # Tailable cursor trên collection rỗng sẽ chết ngay, chèn 1 bản ghi mồi
+            await self.db[self.collection_name].insert_one({"origin": None, "created_at": datetime.now()})
+        except CollectionInvalid:
+            pass  # Đã tồn tại (process khác tạo trước)
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        await self._ensure_collection()
+
+        # Chỉ nhận sự kiện phát sau thời điểm khởi động
+        last = await self.db[self.collection_name].find_one({}, {"_id": 1}, sort=[("$natural", -1)])
+        self._task = asyncio.create_task(self._tail(last["_id"] if last else None))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await super().stop()
+
+    async def publish(self, message: dict, user_ids: list[str]):
+        user_ids = list(user_ids)
+        await self.db[self.collection_name].insert_one({
+            "origin": self.origin,
+            "user_ids": user_ids,
+            "message": message,
+            "created_at": datetime.now()
+        })
+        # Giao local ngay, không chờ vòng qua MongoDB
+        await super().publish(message, user_ids)
+
+    async def _tail(self, last_id):
+        collection = self.db[self.collection_name]
+        while True:
+            try:
+                query = {"_id": {"$gt": last_id}} if last_id else {}
+                cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT, max_await_time_ms=1000)
+                while cursor.alive:
+                    async for doc in cursor:
+                        last_id = doc["_id"]
+                        if doc.get("origin") in (None, self.origin):
+                            continue
+                        self.stats["remote"] += 1
+                        self.stats["received"] += 1
+                        await self.handler(doc["message"], doc["user_ids"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Broker tail error: {e!r}")
+            # Cursor chết (collection bị drop, mất kết nối...) -> mở lại
+            await asyncio.sleep(1)
+
+    def metrics(self) -> dict:
+        return {**super().metrics(), "collection": self.collection_name, "origin": self.origin}
+
+
+def create_broker(db: AsyncDatabase) -> MemoryBroker:
+    """Chọn broker theo WS_BROKER (memory | mongo)"""
+    if os.getenv("WS_BROKER", "memory").lower() == "mongo":
+        return MongoBroker(
+            db,
+            collection=os.getenv("WS_BROKER_COLLECTION", "ws_events"),
+            size=int(os.getenv("WS_BROKER_SIZE", 16 * 1024 * 1024))
+        )
+    return MemoryBroker()
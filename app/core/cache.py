@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from time import monotonic
+from pymongo import UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+
+
+class VersionCounter:
+    """
+    Bộ đếm version tăng dần theo key (vd: student_id), lưu trong MongoDB
+
+    Mỗi key là 1 document {_id: key, v: n} trong collection `name`, nên version
+    chung cho mọi worker: bump() ở worker này làm cache của mọi worker lệch
+    version. current() là 1 find_one theo _id, rẻ hơn nhiều so với thứ được cache.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def current(self, db: AsyncDatabase, key: str) -> int:
+        doc = await db[self.name].find_one({"_id": key}, {"v": 1})
+        return doc["v"] if doc else 0
+
+    async def bump(self, db: AsyncDatabase, *keys: str):
+        keys = set(keys)
+        if not keys:
+            return
+        await db[self.name].bulk_write(
+            [UpdateOne({"_id": key}, {"$inc": {"v": 1}}, upsert=True) for key in keys],
+            ordered=False
+        )
+
+
+class VersionedCache:
+    """LRU cache, mỗi entry gắn với version lúc tính; entry lệch version bị bỏ qua"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key, version):
+        entry = self._data.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, version, value):
+        self._data[key] = (version, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class TTLCache:
+    """LRU cache có thời hạn: entry quá ttl giây bị coi như không có"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._data[key] = (monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Xóa các entry có value thỏa predicate (dùng khi không biết key)"""
+        for key in [k for k, (_, value) in self._data.items() if predicate(value)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# Version điểm theo sinh viên: tăng khi điểm/lớp học phần của sinh viên thay đổi
+grade_versions = VersionCounter("grade_versions")
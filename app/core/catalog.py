@@ -0,0 +1,144 @@
+"""
+Danh mục môn học trong bộ nhớ
+
+Collection courses nhỏ và ít thay đổi nên được nạp toàn bộ khi khởi động,
+các router tra tín chỉ / công thức điểm từ đây thay vì truy vấn MongoDB.
+create_course / update_course / delete_course gọi refresh() để cập nhật, mỗi
+lần thay đổi tăng version (dùng làm khóa cache cho dữ liệu phụ thuộc môn học).
+
+Nhiều worker: refresh() tăng version chung trong app_meta, mỗi worker đọc lại
+version này mỗi CATALOG_POLL_INTERVAL giây và nạp lại danh mục khi thấy đổi.
+Môn học không có trong danh mục (vd ghi thẳng vào MongoDB bằng script) được
+tra lại từ DB khi cần (fetch / ensure).
+"""
+import asyncio
+import os
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from pymongo.asynchronous.database import AsyncDatabase
+
+load_dotenv()
+
+DEFAULT_GRADE_FORMULA = (0.2, 0.3, 0.5)
+META_ID = "course_catalog"
+
+
+class CourseCatalog:
+    def __init__(self, poll_interval: float = 5.0):
+        self.version = 0  # version cục bộ, tăng mỗi khi dữ liệu trong bộ nhớ đổi
+        self.shared_version = 0  # version chung (app_meta) lúc nạp gần nhất
+        self.poll_interval = poll_interval
+        self.db: AsyncDatabase | None = None
+        self._courses: dict[str, dict] = {}
+        self._task: asyncio.Task | None = None
+
+    async def load(self, db: AsyncDatabase):
+        """Nạp lại toàn bộ môn học"""
+        self.db = db
+        meta = await db.app_meta.find_one({"_id": META_ID}, {"version": 1})
+        courses = await db.courses.find().to_list(length=None)
+        self._courses = {str(c["_id"]): self._entry(c) for c in courses}
+        self.shared_version = (meta or {}).get("version", 0)
+        self.version += 1
+
+    def start(self):
+        """Theo dõi version chung để nạp lại khi worker khác sửa môn học"""
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                meta = await self.db.app_meta.find_one({"_id": META_ID}, {"version": 1})
+                if (meta or {}).get("version", 0) != self.shared_version:
+                    await self.load(self.db)
+            except Exception as e:
+                print(f"Error when polling course catalog: {str(e)}")
+
+    @staticmethod
+    async def notify_changed(db: AsyncDatabase) -> int:
+        """Tăng version chung: mọi worker nạp lại danh mục ở lần poll tiếp theo"""
+        meta = await db.app_meta.find_one_and_update(
+            {"_id": META_ID}, {"$inc": {"version": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return meta["version"]
+
+    async def refresh(self, db: AsyncDatabase, course_id: str):
+        """Nạp lại 1 môn học sau khi tạo/sửa/xóa"""
+        course = await db.courses.find_one({"_id": ObjectId(course_id)})
+        if course:
+            self._courses[course_id] = self._entry(course)
+        else:
+            self._courses.pop(course_id, None)
+        self.version += 1
+        self.shared_version = await self.notify_changed(db)
+
+    async def fetch(self, db: AsyncDatabase, course_id) -> dict | None:
+        """Như get(), tra MongoDB nếu môn học chưa có trong danh mục"""
+        await self.ensure(db, [course_id])
+        return self.get(course_id)
+
+    async def ensure(self, db: AsyncDatabase, course_ids):
+        """
+        Nạp các môn học còn thiếu trong danh mục bằng 1 truy vấn
+
+        Không tăng version: môn học nạp thêm chưa từng có trong danh mục nên không
+        làm sai dữ liệu đã cache, chỉ tạo/sửa/xóa (refresh) và nạp lại mới tăng.
+        """
+        missing = {str(cid) for cid in course_ids if cid is not None} - self._courses.keys()
+        missing = [ObjectId(cid) for cid in missing if ObjectId.is_valid(cid)]
+        if not missing:
+            return
+        courses = await db.courses.find({"_id": {"$in": missing}}).to_list(length=None)
+        for course in courses:
+            self._courses[str(course["_id"])] = self._entry(course)
+
+    @staticmethod
+    def _entry(course: dict) -> dict:
+        return {
+            "_id": str(course["_id"]),
+            "code": course.get("code", ""),
+            "name": course.get("name", ""),
+            "credits": course.get("credits", 0),
+            "grade_formula": course.get("grade_formula") or {}
+        }
+
+    def get(self, course_id) -> dict | None:
+        if course_id is None:
+            return None
+        return self._courses.get(str(course_id))
+
+    def credits(self, course_id) -> int | None:
+        course = self.get(course_id)
+        return course["credits"] if course else None
+
+    def grade_formula(self, course_id) -> tuple[float, float, float]:
+        """Trọng số (thường xuyên 1, thường xuyên 2, cuối kỳ), mặc định 20-30-50"""
+        course = self.get(course_id)
+        if not course:
+            return DEFAULT_GRADE_FORMULA
+
+        formula = course["grade_formula"]
+        return (
+            formula.get("regular_weight_1", 0.2),
+            formula.get("regular_weight_2", 0.3),
+            formula.get("final_weight", 0.5)
+        )
+
+    def __len__(self) -> int:
+        return len(self._courses)
+
+
+course_catalog = CourseCatalog(poll_interval=float(os.getenv("CATALOG_POLL_INTERVAL", 5)))
@@ -0,0 +1,56 @@
+"""
+Hội thoại 1-1 định danh bằng pair_key
+
+pair_key = 2 user_id sắp xếp tăng dần nối bằng ":", có unique index, nên tìm
+hội thoại giữa 2 người là 1 lần tra index và tạo mới là 1 lệnh upsert nguyên
+tử (2 request "New chat" đồng thời không tạo ra 2 hội thoại).
+"""
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+
+def pair_key(user_a: str, user_b: str) -> str:
+    return ":".join(sorted((user_a, user_b)))
+
+
+async def get_or_create_conversation(db: AsyncDatabase, sender_id: str, receiver_id: str) -> dict:
+    """Lấy hội thoại giữa 2 người, tạo mới nếu chưa có"""
+    key = pair_key(sender_id, receiver_id)
+    try:
+        return await db.conversations.find_one_and_update(
+            {"pair_key": key},
+            {"$setOnInsert": {
+                "participants": [sender_id, receiver_id],
+                "last_message": None,
+                "updated_at": datetime.now()
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Upsert đồng thời: request kia đã tạo trước
+        return await db.conversations.find_one({"pair_key": key})
+
+
+async def backfill_pair_keys(db: AsyncDatabase) -> dict:
+    """Gán pair_key cho các hội thoại cũ (tạo trước khi có pair_key)"""
+    legacy = await db.conversations.find(
+        {"pair_key": {"$exists": False}}, {"participants": 1}
+    ).sort("updated_at", -1).to_list(length=None)
+
+    operations = [
+        UpdateOne({"_id": c["_id"]}, {"$set": {"pair_key": pair_key(*c["participants"])}})
+        for c in legacy if len(c.get("participants", [])) == 2
+    ]
+    if not operations:
+        return {"updated": 0, "duplicates": 0}
+
+    try:
+        result = await db.conversations.bulk_write(operations, ordered=False)
+        return {"updated": result.modified_count, "duplicates": 0}
+    except BulkWriteError as e:
+        # Các hội thoại trùng cặp cũ được giữ nguyên (không có pair_key)
+        duplicates = sum(1 for err in e.details.get("writeErrors", []) if err.get("code") == 11000)
+        return {"updated": e.details.get("nModified", 0), "duplicates": duplicates}
@@ -0,0 +1,90 @@
+"""
+Cập nhật tổng kết học kỳ khi điểm thay đổi
+
+Router ghi điểm phát sự kiện GradeChange (sinh viên, học kỳ). Consumer chạy nền
+gom các sự kiện trong khoảng debounce rồi tính lại tổng kết của các cặp
+(sinh viên, học kỳ) bị ảnh hưởng bằng recalculate_semester_summaries (mỗi học
+kỳ 1 lượt). Tính lại từ điểm đang lưu nên kết quả luôn đúng dù nhiều request
+ghi điểm chạy đồng thời, /calculate đã chạy trước đó hay tín chỉ môn học đổi.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from typing import NamedTuple
+from dotenv import load_dotenv
+from pymongo.asynchronous.database import AsyncDatabase
+
+from app.core.summary_engine import recalculate_semester_summaries
+
+load_dotenv()
+
+
+class GradeChange(NamedTuple):
+    student_id: str
+    semester: str
+
+
+class GradeEventBus:
+    def __init__(self, debounce: float = 0.5):
+        self.debounce = debounce
+        self.db: AsyncDatabase | None = None
+        self.stats = {"events": 0, "batches": 0, "recomputed": 0, "errors": 0}
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self, db: AsyncDatabase):
+        self.db = db
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # None = tín hiệu dừng, consumer xử lý nốt các sự kiện trước nó rồi thoát
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    def emit(self, *events: GradeChange):
+        """Đưa sự kiện vào hàng đợi (bỏ qua nếu consumer chưa chạy)"""
+        if self._queue is None:
+            return
+        for event in events:
+            if event.semester:
+                self._queue.put_nowait(event)
+                self.stats["events"] += 1
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            # Chờ thêm để gom các sự kiện đến liên tiếp (vd: lưu điểm cả lớp)
+            await asyncio.sleep(self.debounce)
+            events = [item]
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                events.append(item)
+            try:
+                await self._flush(events)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error when applying grade events: {str(e)}")
+
+    async def _flush(self, events: list[GradeChange]):
+        self.stats["batches"] += 1
+        by_semester = defaultdict(set)  # {semester: {student_id}}
+        for e in events:
+            by_semester[e.semester].add(e.student_id)
+
+        # recalculate_semester_summaries tự cập nhật GPA tích lũy cho các sinh viên này
+        for semester, students in by_semester.items():
+            await recalculate_semester_summaries(self.db, list(students), semester)
+            self.stats["recomputed"] += len(students)
+
+
+grade_events = GradeEventBus(debounce=float(os.getenv("GRADE_EVENT_DEBOUNCE", 0.5)))
@@ -0,0 +1,245 @@
+"""
+Import điểm lớp học phần từ CSV/Excel theo MSSV
+
+File được đọc dần theo từng dòng (không nạp cả file), sau đó:
+1. validate từng dòng (điểm 0-10, trùng mssv trong file)
+2. tra toàn bộ mssv -> student_id bằng 1 truy vấn $in
+3. đọc điểm hiện tại của lớp bằng 1 truy vấn, gộp với điểm trong file
+   (ô trống giữ nguyên điểm cũ) rồi tính tổng kết vector hóa cho cả lớp
+4. ghi bằng 1 bulk_write (bỏ qua khi dry_run), mỗi dòng chỉ ghi khi điểm trong DB
+   vẫn như lúc đọc ở bước 3; dòng bị request khác sửa xen giữa báo lỗi để import lại
+Kết quả là báo cáo thay đổi theo từng dòng.
+"""
+import math
+import numpy as np
+from datetime import datetime
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError
+from starlette.concurrency import run_in_threadpool
+from typing import Iterator
+
+from app.core.cache import grade_versions
+from app.core.catalog import course_catalog
+from app.core.grade_events import GradeChange, grade_events
+from app.model.mgrade import CourseGradeImport
+from app.utils.grade_calculator import calculate_total_score_array
+from app.utils.tabular import take
+
+SCORE_FIELDS = ("regular_score_1", "regular_score_2", "final_score")
+
+# Tên cột chấp nhận trong file -> trường điểm
+COLUMN_ALIASES = {
+    "tx1": "regular_score_1",
+    "diem_tx1": "regular_score_1",
+    "tx2": "regular_score_2",
+    "diem_tx2": "regular_score_2",
+    "ck": "final_score",
+    "diem_ck": "final_score",
+    "cuoi_ky": "final_score",
+}
+
+READ_CHUNK_SIZE = 500
+
+
+def _score(value):
+    # CSV có thể dùng dấu phẩy thập phân ("8,5")
+    if isinstance(value, str):
+        return value.replace(",", ".")
+    return value
+
+
+async def write_course_grades(
+    db: AsyncDatabase,
+    class_obj: dict,
+    rows: list[tuple[str, float | None, float | None, float | None, float | None]],
+    expected: dict[str, dict | None] | None = None
+):
+    """
+    Upsert điểm (student_id, tx1, tx2, ck, tổng kết) của 1 lớp học phần bằng 1 bulk_write,
+    rồi tăng version bảng điểm và phát sự kiện tính lại tổng kết
+
+    expected = {student_id: điểm đã đọc trước đó (None nếu chưa có điểm)}: chỉ ghi
+    khi điểm trong DB vẫn như đã đọc, dòng không khớp bị bỏ qua (không báo lỗi).
+    """
+    course_class_id = str(class_obj["_id"])
+    now = datetime.now()
+    writes = []
+    for student_id, regular_score_1, regular_score_2, final_score, total_score in rows:
+        fields = {
+            "course_class_id": course_class_id,
+            "student_id": student_id,
+            "regular_score_1": regular_score_1,
+            "regular_score_2": regular_score_2,
+            "final_score": final_score,
+            "total_score": total_score,
+            "updated_at": now
+        }
+        key = {"course_class_id": course_class_id, "student_id": student_id}
+        if expected is None:
+            writes.append(UpdateOne(key, {"$set": fields}, upsert=True))
+        elif expected.get(student_id) is None:
+            # Chưa có điểm lúc đọc: chỉ tạo mới, không ghi đè điểm vừa được tạo xen giữa
+            writes.append(UpdateOne(key, {"$setOnInsert": fields}, upsert=True))
+        else:
+            old = expected[student_id]
+            writes.append(UpdateOne({**key, **{f: old.get(f) for f in SCORE_FIELDS}}, {"$set": fields}))
+
+    try:
+        return await db.course_grades.bulk_write(writes, ordered=expected is None)
+    finally:
+        await grade_versions.bump(db, *(row[0] for row in rows))
+        grade_events.emit(*(GradeChange(row[0], class_obj.get("semester")) for row in rows))
+
+
+class GradeImport:
+    def __init__(self, db: AsyncDatabase, class_obj: dict):
+        self.db = db
+        self.class_obj = class_obj
+        self.course_class_id = str(class_obj["_id"])
+        self.enrolled = {str(sid) for sid in class_obj.get("student_ids", [])}
+        self.total_rows = 0
+        self.report: list[dict] = []
+        self._seen_mssv: set[str] = set()
+
+    def error(self, row: int, mssv, message: str):
+        self.report.append({"row": row, "mssv": mssv, "status": "error", "error": message})
+
+    def validate(self, row_number: int, row: dict) -> CourseGradeImport | None:
+        row = {COLUMN_ALIASES.get(k, k): v for k, v in row.items()}
+        mssv = row.get("mssv")
+        mssv = str(mssv) if mssv is not None else None
+        try:
+            grade = CourseGradeImport(mssv=mssv, **{f: _score(row.get(f)) for f in SCORE_FIELDS})
+        except ValidationError as e:
+            err = e.errors()[0]
+            self.error(row_number, mssv, f"{'.'.join(map(str, err['loc']))}: {err['msg']}")
+            return None
+
+        if grade.mssv in self._seen_mssv:
+            self.error(row_number, grade.mssv, "Duplicate mssv in file")
+            return None
+        self._seen_mssv.add(grade.mssv)
+        return grade
+
+    async def read(self, rows: Iterator[dict]) -> list[tuple[int, CourseGradeImport]]:
+        valid = []
+        row_number = 1  # Dòng 1 là header
+        while True:
+            chunk = await run_in_threadpool(take, rows, READ_CHUNK_SIZE)
+            if not chunk:
+                return valid
+            self.total_rows += len(chunk)
+            for row in chunk:
+                row_number += 1
+                grade = self.validate(row_number, row)
+                if grade is not None:
+                    valid.append((row_number, grade))
+
+    async def resolve_students(self, mssvs: list[str]) -> dict[str, dict]:
+        users = await self.db.users.find(
+            {"mssv": {"$in": mssvs}}, {"mssv": 1, "full_name": 1}
+        ).to_list(length=None)
+        return {u["mssv"]: u for u in users}
+
+    async def write(self, writes: list[tuple], current: dict[str, dict]) -> set[str]:
+        """Ghi có điều kiện theo điểm đã đọc, trả về student_id các dòng không ghi được"""
+        expected = {w[0]: current.get(w[0]) for w in writes}
+        try:
+            await write_course_grades(self.db, self.class_obj, writes, expected=expected)
+        except BulkWriteError as e:
+            # 2 upsert tạo cùng 1 điểm đồng thời: bên thua nhận lỗi trùng khóa
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+        # Đọc lại để biết dòng nào đã bị request khác ghi trước (không khớp điều kiện)
+        stored = await self.db.course_grades.find(
+            {"course_class_id": self.course_class_id, "student_id": {"$in": list(expected)}},
+            {"student_id": 1, **{f: 1 for f in SCORE_FIELDS}}
+        ).to_list(length=None)
+        stored = {g["student_id"]: g for g in stored}
+        return {
+            student_id for student_id, *scores in (w[:4] for w in writes)
+            if [stored.get(student_id, {}).get(f) for f in SCORE_FIELDS] != scores
+        }
+
+    async def run(self, rows: Iterator[dict], dry_run: bool = False) -> dict:
+        valid = await self.read(rows)
+        students = await self.resolve_students([g.mssv for _, g in valid])
+
+        matched = []  # (row_number, grade, student)
+        for row_number, grade in valid:
+            student = students.get(grade.mssv)
+            if student is None:
+                self.error(row_number, grade.mssv, "Student not found")
+            elif str(student["_id"]) not in self.enrolled:
+                self.error(row_number, grade.mssv, "Student not enrolled in this class")
+            else:
+                matched.append((row_number, grade, student))
+
+        current = await self.db.course_grades.find(
+            {"course_class_id": self.course_class_id,
+             "student_id": {"$in": [str(s["_id"]) for _, _, s in matched]}},
+            {"student_id": 1, "total_score": 1, **{f: 1 for f in SCORE_FIELDS}}
+        ).to_list(length=None)
+        current = {g["student_id"]: g for g in current}
+
+        # Ô trống giữ điểm cũ
+        merged = []
+        for _, grade, student in matched:
+            old = current.get(str(student["_id"]), {})
+            merged.append([
+                getattr(grade, f) if getattr(grade, f) is not None else old.get(f)
+                for f in SCORE_FIELDS
+            ])
+
+        await course_catalog.ensure(self.db, [self.class_obj.get("course_id")])
+        w1, w2, w3 = course_catalog.grade_formula(self.class_obj.get("course_id"))
+        score_columns = np.array(merged, dtype=np.float64).reshape(-1, 3)
+        total_scores = calculate_total_score_array(score_columns[:, 0], score_columns[:, 1], score_columns[:, 2], w1, w2, w3)
+
+        writes = []
+        counts = {"created": 0, "updated": 0, "unchanged": 0}
+        for (row_number, grade, student), scores, total in zip(matched, merged, total_scores.tolist()):
+            student_id = str(student["_id"])
+            new = dict(zip(SCORE_FIELDS, scores), total_score=None if math.isnan(total) else total)
+            old = current.get(student_id)
+
+            if old is None:
+                status = "created"
+                changes = {f: [None, v] for f, v in new.items() if v is not None}
+            else:
+                changes = {f: [old.get(f), v] for f, v in new.items() if old.get(f) != v}
+                status = "updated" if changes else "unchanged"
+            counts[status] += 1
+
+            if status != "unchanged":
+                writes.append((student_id, *scores, new["total_score"]))
+                self.report.append({
+                    "row": row_number,
+                    "student_id": student_id,
+                    "mssv": grade.mssv,
+                    "student_name": student.get("full_name"),
+                    "status": status,
+                    "changes": changes
+                })
+
+        if writes and not dry_run:
+            conflicts = await self.write(writes, current)
+            for entry in self.report:
+                if entry.get("student_id") in conflicts:
+                    counts[entry["status"]] -= 1
+                    entry["status"] = "error"
+                    entry["error"] = "Grades changed concurrently, please re-run import"
+        for entry in self.report:
+            entry.pop("student_id", None)
+
+        self.report.sort(key=lambda r: r["row"])
+        return {
+            "dry_run": dry_run,
+            "total_rows": self.total_rows,
+            **counts,
+            "failed": sum(1 for r in self.report if r["status"] == "error"),
+            "rows": self.report
+        }
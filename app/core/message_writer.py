@@ -0,0 +1,85 @@
+"""
+Ghi tin nhắn chat theo lô
+
+Mỗi WebSocket gọi write() và chờ tin nhắn được lưu. Writer chạy nền lấy mọi
+tin nhắn đang chờ trong hàng đợi (tối đa max_batch) và ghi bằng 1 lệnh
+insert_many: khi ít tin nhắn thì mỗi lô chỉ có 1 bản ghi (không thêm độ trễ),
+khi tải cao các tin nhắn đến trong lúc lô trước đang ghi được gom lại.
+"""
+import asyncio
+import os
+from dotenv import load_dotenv
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError
+
+load_dotenv()
+
+
+class MessageWriter:
+    def __init__(self, max_batch: int = 200):
+        self.max_batch = max_batch
+        self.db: AsyncDatabase | None = None
+        self.stats = {"messages": 0, "batches": 0, "max_batch_seen": 0, "errors": 0}
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self, db: AsyncDatabase):
+        self.db = db
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # None = tín hiệu dừng, writer ghi nốt các tin nhắn trước nó rồi thoát
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def write(self, doc: dict):
+        """Lưu 1 tin nhắn (doc phải có sẵn _id), chờ tới khi ghi xong"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((doc, future))
+        await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            item = await self._queue.get()
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch or self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        self.stats["batches"] += 1
+        self.stats["messages"] += len(batch)
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+
+        failed = {}
+        try:
+            await self.db.messages.insert_many([doc for doc, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "write error") for err in e.details.get("writeErrors", [])}
+        except Exception as e:
+            failed = {i: str(e) for i in range(len(batch))}
+
+        self.stats["errors"] += len(failed)
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if i in failed:
+                future.set_exception(RuntimeError(failed[i]))
+            else:
+                future.set_result(None)
+
+
+# Instance global
+message_writer = MessageWriter(max_batch=int(os.getenv("CHAT_WRITE_BATCH", 200)))
@@ -1,5 +1,9 @@
+import asyncio
 import bcrypt
 import os
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from dotenv import load_dotenv
@@ -66,12 +70,182 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 
-def hash_password(password: str) -> str:
+def hash_password(password: str, rounds: int = 10) -> str:
     pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt(rounds=10) # số mũ của 2 ==> 2 ^ rounds = số vòng lặp thực tế
+    salt = bcrypt.gensalt(rounds=rounds) # số mũ của 2 ==> 2 ^ rounds = số vòng lặp thực tế
     return bcrypt.hashpw(password=pwd_bytes, salt=salt).decode()
 
 
+def hash_passwords(passwords: list[str], rounds: int = 10) -> list[str]:
+    """Băm cả lô (1 việc trên pool khi import hàng loạt)"""
+    return [hash_password(p, rounds) for p in passwords]
+
+
+def bcrypt_rounds(hashed_password: str) -> int | None:
+    """Cost của hash bcrypt dạng $2b$<rounds>$..."""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+# Chạy trong worker (thread/process), trả về thêm thời gian chạy thực tế
+def _timed_hash(password: str, rounds: int) -> tuple[str, float]:
+    started = perf_counter()
+    return hash_password(password, rounds), perf_counter() - started
+
+
+def _timed_hash_many(passwords: list[str], rounds: int) -> tuple[list[str], float]:
+    started = perf_counter()
+    return hash_passwords(passwords, rounds), perf_counter() - started
+
+
+def _timed_verify(password: str, hashed_password: str) -> tuple[bool, float]:
+    started = perf_counter()
+    try:
+        ok = verify_password(password, hashed_password)
+    except ValueError:
+        ok = False  # Hash hỏng / không phải bcrypt
+    return ok, perf_counter() - started
+
+
+class PasswordServiceBusy(RuntimeError):
+    """Hàng đợi bcrypt đã đầy"""
+
+
+class LatencyHistogram:
+    """Histogram độ trễ theo các mốc cố định (ms)"""
+    BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.buckets[bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self) -> dict:
+        labels = [f"<={b}ms" for b in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "buckets": dict(zip(labels, self.buckets))
+        }
+
+
+class PasswordService:
+    """
+    Băm/kiểm tra mật khẩu bcrypt trên pool riêng để không chặn event loop.
+
+    Số việc đang chờ + đang chạy bị giới hạn ở workers + queue_limit; vượt quá thì
+    báo PasswordServiceBusy (router trả 503) thay vì để request xếp hàng vô hạn.
+    """
+
+    def __init__(self, rounds: int = 10, workers: int = 4, queue_limit: int = 64, executor: str = "thread"):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = workers + queue_limit
+        self.executor_type = executor
+        self._executor = None
+        self._pending = 0
+        self.stats = {"hashes": 0, "verifies": 0, "rehashes": 0, "rejected": 0}
+        self.latency = {op: LatencyHistogram() for op in ("hash", "verify", "hash_many")}  # Tổng thời gian (chờ + chạy)
+        self.run_time = {op: LatencyHistogram() for op in ("hash", "verify", "hash_many")}  # Chỉ thời gian bcrypt
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                # bcrypt nhả GIL khi băm nên thread là đủ để chạy song song
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, op: str, func, *args):
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise PasswordServiceBusy("Password service is busy")
+
+        self._pending += 1
+        started = perf_counter()
+        try:
+            result, elapsed = await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self._pending -= 1
+
+        self.latency[op].observe(perf_counter() - started)
+        self.run_time[op].observe(elapsed)
+        return result
+
+    async def hash(self, password: str) -> str:
+        self.stats["hashes"] += 1
+        return await self._run("hash", _timed_hash, password, self.rounds)
+
+    async def hash_many(self, passwords: list[str]) -> list[str]:
+        """Băm cả lô (import hàng loạt): chia thành tối đa `workers` phần, mỗi phần là 1 việc trên pool"""
+        if not passwords:
+            return []
+        step = -(-len(passwords) // self.workers)
+        parts = [passwords[i:i + step] for i in range(0, len(passwords), step)]
+        if self._pending + len(parts) > self.max_pending:
+            self.stats["rejected"] += 1
+            raise PasswordServiceBusy("Password service is busy")
+
+        self.stats["hashes"] += len(passwords)
+        hashed = await asyncio.gather(*(self._run("hash_many", _timed_hash_many, part, self.rounds) for part in parts))
+        return [h for part in hashed for h in part]
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        self.stats["verifies"] += 1
+        return await self._run("verify", _timed_verify, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return bcrypt_rounds(hashed_password) != self.rounds
+
+    async def verify_and_rehash(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Kiểm tra mật khẩu; nếu đúng mà cost khác cấu hình thì trả về hash mới để lưu"""
+        if not await self.verify(password, hashed_password):
+            return False, None
+        if not self.needs_rehash(hashed_password):
+            return True, None
+
+        self.stats["rehashes"] += 1
+        return True, await self.hash(password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "rounds": self.rounds,
+            "executor": self.executor_type,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "latency": {op: h.snapshot() for op, h in self.latency.items()},
+            "run_time": {op: h.snapshot() for op, h in self.run_time.items()}
+        }
+
+
+password_service = PasswordService(
+    rounds=int(os.getenv("BCRYPT_ROUNDS", 10)),
+    workers=int(os.getenv("PASSWORD_WORKERS", min(4, os.cpu_count() or 1))),
+    queue_limit=int(os.getenv("PASSWORD_QUEUE_LIMIT", 64)),
+    executor=os.getenv("PASSWORD_EXECUTOR", "thread")
+)
+
+
 if __name__ == "__main__":
     password = "sherlock"
     hashed_pass = hash_password(password)
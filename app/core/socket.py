@@ -1,28 +1,202 @@
+"""
+Quản lý kết nối WebSocket
+
+Mỗi user có thể mở nhiều kết nối (nhiều thiết bị/tab). Mỗi kết nối có hàng đợi
+gửi riêng (giới hạn WS_QUEUE_SIZE) và 1 writer task, nên fan-out chỉ là đưa
+message vào hàng đợi - client chậm không làm nghẽn các client khác. Khi hàng
+đợi đầy: WS_OVERFLOW_POLICY=disconnect thì ngắt kết nối đó (client tự kết nối
+lại), =drop thì bỏ message và đếm lại.
+
+Để gửi tới user có thể đang ở worker khác, dùng publish() (đi qua broker,
+xem app/core/broker.py); send_to_users() chỉ giao cho kết nối trong process.
+"""
+import asyncio
+import json
+import os
+from collections import defaultdict
+from time import monotonic
+from dotenv import load_dotenv
 from fastapi import WebSocket
 
+from app.core.broker import MemoryBroker
+
+load_dotenv()
+
+
+class Connection:
+    """1 kết nối WebSocket + hàng đợi gửi và writer task của nó"""
+
+    def __init__(self, websocket: WebSocket, user_id: str, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: asyncio.Task | None = None
+        self.connected_at = monotonic()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag = 0.0  # Thời gian message nằm trong hàng đợi (giây)
+        self.max_lag = 0.0
+        self.acks = 0
+        self.last_ack: str | None = None  # Message id client xác nhận gần nhất
+        self.delivered: dict = {}  # {conversation_id: message ObjectId mới nhất client đã ack}
+        self.pending_delivered: dict = {}  # Các mốc delivered chưa ghi xuống DB
+        self.ack_flush: asyncio.Task | None = None  # Task ghi dồn pending_delivered
+
+    def enqueue(self, text: str) -> bool:
+        try:
+            self.queue.put_nowait((monotonic(), text))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def metrics(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "acks": self.acks,
+            "last_ack": self.last_ack,
+            "lag_ms": round(self.last_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "age_s": round(monotonic() - self.connected_at, 1)
+        }
+
 
 class ConnectionManager:
-    def __init__(self):
-        # Lưu danh sách kết nối đang hoạt động: {user_id: WebSocket}
-        self.active_connections: str | WebSocket = {}
+    def __init__(self, queue_size: int = 100, send_timeout: float = 5.0, overflow_policy: str = "disconnect"):
+        # Các kết nối đang hoạt động: {user_id: {Connection, ...}}
+        self.active_connections: dict[str, set[Connection]] = defaultdict(set)
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.overflow_policy = overflow_policy
+        self.stats = {"connected": 0, "disconnected": 0, "slow_disconnects": 0, "sent": 0, "dropped": 0, "acks": 0}
+        self.broker = MemoryBroker()
+        self._closing: set[asyncio.Task] = set()  # Giữ tham chiếu tới các task đóng kết nối chậm
 
-    async def connect(self, websocket: WebSocket, user_id: str):
+    async def start(self, broker: MemoryBroker):
+        """Gắn broker và bắt đầu nhận sự kiện từ các worker khác"""
+        self.broker = broker
+        await broker.start(self.send_to_users)
+
+    async def stop(self):
+        await self.broker.stop()
+        await self.close_all()
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> Connection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"User {user_id} connected via WebSocket")
+        connection = Connection(websocket, user_id, self.queue_size)
+        connection.writer = asyncio.create_task(self._writer(connection))
+        self.active_connections[user_id].add(connection)
+        self.stats["connected"] += 1
+        print(f"User {user_id} connected via WebSocket ({len(self.active_connections[user_id])} connections)")
+        return connection
+
+    def disconnect(self, connection: Connection):
+        """Gỡ kết nối khỏi manager và dừng writer (gọi nhiều lần không sao)"""
+        if connection.closed:
+            return
+        connection.closed = True
+        self.stats["disconnected"] += 1
 
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            print(f"User {user_id} disconnected")
+        connections = self.active_connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.active_connections[connection.user_id]
 
-    async def send_personal_message(self, message: dict, user_id: str):
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        print(f"User {connection.user_id} disconnected")
+
+    async def _writer(self, connection: Connection):
+        try:
+            while True:
+                enqueued_at, text = await connection.queue.get()
+                lag = monotonic() - enqueued_at
+                connection.last_lag = lag
+                connection.max_lag = max(connection.max_lag, lag)
+
+                await asyncio.wait_for(connection.websocket.send_text(text), self.send_timeout)
+                connection.sent += 1
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Gửi lỗi hoặc quá send_timeout: coi như client đã chết
+            print(f"WebSocket send to {connection.user_id} failed: {e!r}")
+            await self._close(connection, code=1011)
+
+    async def _close(self, connection: Connection, code: int):
+        self.disconnect(connection)
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass  # Đã đóng từ phía client
+
+    def _deliver(self, connection: Connection, text: str) -> bool:
+        if connection.enqueue(text):
+            return True
+
+        self.stats["dropped"] += 1
+        if self.overflow_policy == "disconnect" and not connection.closed:
+            self.stats["slow_disconnects"] += 1
+            print(f"WebSocket of {connection.user_id} is too slow, disconnecting")
+            # 1013 = Try Again Later: client kết nối lại và tải lại lịch sử
+            task = asyncio.create_task(self._close(connection, code=1013))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        return False
+
+    async def send_to_users(self, message: dict, user_ids) -> int:
+        """Gửi message tới mọi kết nối của các user đang online, trả về số kết nối nhận"""
+        # Serialize 1 lần cho tất cả kết nối
+        text = json.dumps(message, default=str)
+        delivered = 0
+        for user_id in set(user_ids):
+            for connection in list(self.active_connections.get(user_id, ())):
+                delivered += self._deliver(connection, text)
+        return delivered
+
+    async def send_personal_message(self, message: dict, user_id: str) -> int:
         """Gửi tin nhắn cho 1 user cụ thể nếu họ đang online"""
-        if user_id in self.active_connections:
-            connection = self.active_connections[user_id]
-            # Gửi dưới dạng JSON
-            await connection.send_json(message)
+        return await self.send_to_users(message, [user_id])
+
+    async def publish(self, message: dict, user_ids):
+        """Gửi tới các user trên mọi worker (qua broker)"""
+        await self.broker.publish(message, list(user_ids))
+
+    def acknowledge(self, connection: Connection, message_id: str):
+        """Client báo đã nhận message"""
+        connection.acks += 1
+        connection.last_ack = message_id
+        self.stats["acks"] += 1
+
+    async def close_all(self):
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                await self._close(connection, code=1001)
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        connections = [c for conns in self.active_connections.values() for c in conns]
+        return {
+            **self.stats,
+            "users": len(self.active_connections),
+            "connections": len(connections),
+            "queue_size": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "max_lag_ms": max((round(c.max_lag * 1000, 1) for c in connections), default=0.0),
+            "broker": self.broker.metrics(),
+            "per_connection": [c.metrics() for c in connections]
+        }
 
 
 # Tạo instance global
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager(
+    queue_size=int(os.getenv("WS_QUEUE_SIZE", 100)),
+    send_timeout=float(os.getenv("WS_SEND_TIMEOUT", 5)),
+    overflow_policy=os.getenv("WS_OVERFLOW_POLICY", "disconnect")
+)
@@ -0,0 +1,135 @@
+"""
+Tính tổng kết học kỳ hàng loạt
+
+Lấy toàn bộ lớp học phần và điểm của nhóm sinh viên trong 2 truy vấn (tín
+chỉ lấy từ danh mục môn học), tính GPA cho tất cả sinh viên bằng numpy và ghi
+kết quả bằng 1 lệnh bulk_write không theo thứ tự, sau đó cập nhật GPA tích lũy.
+"""
+from time import perf_counter
+from datetime import datetime
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+
+from app.core.catalog import course_catalog
+from app.utils.grade_calculator import calculate_semester_gpa_batch, convert_to_gpa_4_array
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((perf_counter() - start) * 1000, 2)
+
+
+async def recalculate_semester_summaries(db: AsyncDatabase, student_ids: list[str], semester: str) -> dict:
+    """Tính lại và lưu tổng kết học kỳ cho danh sách sinh viên"""
+    student_ids = list(dict.fromkeys(student_ids))
+    student_index = {sid: i for i, sid in enumerate(student_ids)}
+    timings = {}
+    started = perf_counter()
+
+    # 1. Lớp học phần trong học kỳ mà các sinh viên đăng ký
+    course_classes = await db.course_classes.find(
+        {"semester": semester, "student_ids": {"$in": student_ids}},
+        {"course_id": 1, "student_ids": 1}
+    ).to_list(length=None)
+    classes_by_id = {str(c["_id"]): c for c in course_classes}
+    await course_catalog.ensure(db, (c.get("course_id") for c in course_classes))
+    enrolled = {cid: set(c.get("student_ids", [])) for cid, c in classes_by_id.items()}
+
+    # 2. Điểm của các sinh viên trong các lớp đó
+    grades = []
+    if classes_by_id:
+        grades = await db.course_grades.find(
+            {"course_class_id": {"$in": list(classes_by_id)}, "student_id": {"$in": student_ids}},
+            {"course_class_id": 1, "student_id": 1, "total_score": 1}
+        ).to_list(length=None)
+
+    timings["fetch_ms"] = _elapsed_ms(started)
+
+    # Tính GPA cho tất cả sinh viên trong 1 lượt
+    compute_started = perf_counter()
+    rows_student, rows_score, rows_credits = [], [], []
+    for grade in grades:
+        total_score = grade.get("total_score")
+        class_id = grade["course_class_id"]
+        student_id = grade["student_id"]
+        if total_score is None or student_id not in enrolled[class_id]:
+            continue
+
+        credits = course_catalog.credits(classes_by_id[class_id].get("course_id"))
+        if credits is None:
+            continue
+
+        rows_student.append(student_index[student_id])
+        rows_score.append(total_score)
+        rows_credits.append(credits)
+
+    batch = calculate_semester_gpa_batch(rows_student, rows_score, rows_credits)
+    # Tổng gpa_4 * tín chỉ, dùng để tính GPA tích lũy
+    grade_points = np.bincount(
+        np.asarray(rows_student, dtype=np.intp),
+        weights=convert_to_gpa_4_array(rows_score) * np.asarray(rows_credits, dtype=np.float64),
+        minlength=len(student_ids)
+    )
+
+    results = {}
+    for sid, i in student_index.items():
+        gpa, credits_earned, credits_passed = batch.get(i, (0.0, 0, 0))
+        results[sid] = {
+            "gpa": gpa,
+            "credits_earned": credits_earned,
+            "credits_passed": credits_passed,
+            "grade_points": float(grade_points[i])
+        }
+    timings["compute_ms"] = _elapsed_ms(compute_started)
+
+    # Ghi toàn bộ kết quả bằng 1 lệnh bulk_write
+    write_started = perf_counter()
+    now = datetime.now()
+    operations = [
+        UpdateOne(
+            {"student_id": sid, "semester": semester},
+            {
+                "$set": {**result, "updated_at": now},
+                "$setOnInsert": {"tuition_debt": False, "academic_warning": 0}
+            },
+            upsert=True
+        )
+        for sid, result in results.items()
+    ]
+    if operations:
+        await db.semester_summaries.bulk_write(operations, ordered=False)
+        await refresh_cumulative_gpa(db, student_ids)
+    timings["write_ms"] = _elapsed_ms(write_started)
+    timings["total_ms"] = _elapsed_ms(started)
+
+    return {
+        "processed": len(results),
+        "results": results,
+        "timings_ms": timings
+    }
+
+
+async def refresh_cumulative_gpa(db: AsyncDatabase, student_ids: list[str]):
+    """Cập nhật GPA tích lũy (cumulative_gpa) trên mọi tổng kết học kỳ của sinh viên"""
+    summaries = await db.semester_summaries.find(
+        {"student_id": {"$in": list(student_ids)}},
+        {"student_id": 1, "semester": 1, "gpa": 1, "credits_earned": 1, "grade_points": 1, "cumulative_gpa": 1}
+    ).sort([("student_id", 1), ("semester", 1)]).to_list(length=None)
+
+    operations = []
+    running = {}  # {student_id: [grade_points, credits]}
+    for summary in summaries:
+        credits = summary.get("credits_earned") or 0
+        # Tổng kết cũ chưa có grade_points thì ước lượng từ gpa
+        points = summary.get("grade_points", (summary.get("gpa") or 0) * credits)
+
+        total = running.setdefault(summary["student_id"], [0.0, 0])
+        total[0] += points
+        total[1] += credits
+        cumulative_gpa = round(total[0] / total[1], 2) if total[1] > 0 else 0.0
+
+        if summary.get("cumulative_gpa") != cumulative_gpa:
+            operations.append(UpdateOne({"_id": summary["_id"]}, {"$set": {"cumulative_gpa": cumulative_gpa}}))
+
+    if operations:
+        await db.semester_summaries.bulk_write(operations, ordered=False)
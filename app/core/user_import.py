@@ -0,0 +1,199 @@
+"""
+Import user hàng loạt từ CSV/Excel
+
+File được đọc dần theo lô (IMPORT_CHUNK_SIZE dòng), mỗi lô:
+1. validate từng dòng (lỗi ghi theo số dòng, trùng mssv/email trong file)
+2. băm mật khẩu song song trên pool của password_service (chung giới hạn hàng
+   đợi với đăng nhập/đăng ký; pool đầy thì chờ rồi thử lại, quá IMPORT_BUSY_RETRIES
+   lần thì báo PasswordServiceBusy -> router trả 503)
+3. insert_many(ordered=False): trùng mssv/email với DB được unique index báo
+   lại theo từng dòng, các dòng khác vẫn được ghi
+Cuối cùng thêm sinh viên vào lớp chính quy bằng 1 bulk_write $addToSet/$each.
+"""
+import asyncio
+import os
+from time import perf_counter
+from typing import Iterator
+from bson import ObjectId
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.security import password_service, PasswordServiceBusy
+from app.model.muser import UserBase
+from app.utils.tabular import take
+
+load_dotenv()
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+IMPORT_BUSY_RETRIES = int(os.getenv("IMPORT_BUSY_RETRIES", 10))
+MAX_REPORTED_ERRORS = 1000
+
+
+class ClassNotFound(LookupError):
+    pass
+
+
+class UserImport:
+    def __init__(self, db: AsyncDatabase, default_class_id: str | None = None):
+        self.db = db
+        self.default_class_id = default_class_id
+        self.total_rows = 0
+        self.inserted = 0
+        self.errors: list[dict] = []
+        self.error_count = 0
+        self.roster: dict[str, list[str]] = {}  # {class_id: [student_id, ...]}
+        self._seen_mssv: set[str] = set()
+        self._seen_email: set[str] = set()
+        self._classes: dict[str, str | None] = {}  # tên/id lớp -> class_id (None nếu không tồn tại)
+
+    def error(self, row: int, mssv, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "mssv": mssv, "error": message})
+
+    async def resolve_classes(self, rows: list[tuple[int, dict]]):
+        """Tra các lớp chính quy mới xuất hiện trong lô (theo id hoặc tên) bằng 1 truy vấn"""
+        refs = {r.get("administrative_class_id") or r.get("class_name") for _, r in rows} - {None}
+        refs -= self._classes.keys()
+        if not refs:
+            return
+
+        ids = [ObjectId(ref) for ref in refs if ObjectId.is_valid(ref)]
+        found = await self.db.administrative_classes.find(
+            {"$or": [{"_id": {"$in": ids}}, {"name": {"$in": list(refs)}}]}, {"name": 1}
+        ).to_list(length=None)
+
+        for ref in refs:
+            self._classes[ref] = None
+        for c in found:
+            self._classes[str(c["_id"])] = str(c["_id"])
+            self._classes[c["name"]] = str(c["_id"])
+
+    def validate(self, row_number: int, row: dict) -> dict | None:
+        mssv = row.get("mssv")
+        mssv = str(mssv) if mssv is not None else None
+        try:
+            user = UserBase(
+                mssv=mssv,
+                email=row.get("email"),
+                full_name=row.get("full_name"),
+                phone=str(row["phone"]) if row.get("phone") is not None else None,
+                role=str(row.get("role") or "STUDENT").upper()
+            )
+        except ValidationError as e:
+            err = e.errors()[0]
+            self.error(row_number, mssv, f"{'.'.join(map(str, err['loc']))}: {err['msg']}")
+            return None
+
+        if user.mssv in self._seen_mssv:
+            self.error(row_number, user.mssv, "Duplicate mssv in file")
+            return None
+        if user.email in self._seen_email:
+            self.error(row_number, user.mssv, "Duplicate email in file")
+            return None
+
+        class_id = None
+        class_ref = row.get("administrative_class_id") or row.get("class_name") or self.default_class_id
+        if class_ref and user.role == "STUDENT":
+            class_id = self._classes.get(class_ref)
+            if class_id is None:
+                self.error(row_number, user.mssv, f"Administrative class not found: {class_ref}")
+                return None
+
+        self._seen_mssv.add(user.mssv)
+        self._seen_email.add(user.email)
+
+        doc = user.model_dump(mode="json")
+        doc["administrative_class_id"] = class_id
+        doc["password"] = str(row.get("password") or f"{user.mssv}@123")
+        return doc
+
+    async def hash_chunk(self, docs: list[dict]):
+        """Băm mật khẩu cả lô trên pool dùng chung, chờ khi pool đang đầy"""
+        passwords = [d["password"] for d in docs]
+        for attempt in range(IMPORT_BUSY_RETRIES + 1):
+            try:
+                hashes = await password_service.hash_many(passwords)
+                break
+            except PasswordServiceBusy:
+                if attempt == IMPORT_BUSY_RETRIES:
+                    raise
+                await asyncio.sleep(min(0.25 * (attempt + 1), 2))
+        for doc, h in zip(docs, hashes):
+            doc["password"] = h
+
+    async def insert_chunk(self, docs: list[dict], row_numbers: list[int]):
+        failed = set()
+        try:
+            await self.db.users.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                i = err["index"]
+                failed.add(i)
+                if err.get("code") == 11000:
+                    field = next(iter(err.get("keyValue") or {"mssv": None}))
+                    self.error(row_numbers[i], docs[i]["mssv"], f"{field} already exists")
+                else:
+                    self.error(row_numbers[i], docs[i]["mssv"], err.get("errmsg", "Write error"))
+
+        for i, doc in enumerate(docs):
+            if i in failed:
+                continue
+            self.inserted += 1
+            if doc.get("administrative_class_id"):
+                self.roster.setdefault(doc["administrative_class_id"], []).append(str(doc["_id"]))
+
+    async def update_rosters(self) -> int:
+        if not self.roster:
+            return 0
+        await self.db.administrative_classes.bulk_write([
+            UpdateOne({"_id": ObjectId(class_id)}, {"$addToSet": {"student_ids": {"$each": student_ids}}})
+            for class_id, student_ids in self.roster.items()
+        ], ordered=False)
+        return len(self.roster)
+
+    async def run(self, rows: Iterator[dict]) -> dict:
+        started = perf_counter()
+        if self.default_class_id:
+            await self.resolve_classes([(0, {"administrative_class_id": self.default_class_id})])
+            if not self._classes.get(self.default_class_id):
+                raise ClassNotFound("Administrative class not found")
+
+        try:
+            while True:
+                chunk = await run_in_threadpool(take, rows, IMPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                # Dòng 1 là header
+                numbered = list(enumerate(chunk, start=self.total_rows + 2))
+                self.total_rows += len(chunk)
+                await self.resolve_classes(numbered)
+
+                docs, row_numbers = [], []
+                for row_number, row in numbered:
+                    doc = self.validate(row_number, row)
+                    if doc is not None:
+                        docs.append(doc)
+                        row_numbers.append(row_number)
+                if not docs:
+                    continue
+
+                await self.hash_chunk(docs)
+                await self.insert_chunk(docs, row_numbers)
+        finally:
+            # Kể cả khi dừng giữa chừng: user đã ghi vẫn phải có trong lớp
+            classes_updated = await self.update_rosters()
+
+        return {
+            "total_rows": self.total_rows,
+            "inserted": self.inserted,
+            "failed": self.error_count,
+            "classes_updated": classes_updated,
+            "errors": self.errors,
+            "elapsed_ms": round((perf_counter() - started) * 1000, 1)
+        }
@@ -0,0 +1,66 @@
+"""
+Nạp dữ liệu hàng loạt bằng insert_many song song
+
+Document được gom theo collection thành lô batch_size, mỗi lô ghi bằng
+insert_many(ordered=False) trong 1 task riêng; tối đa concurrency lô chạy cùng
+lúc, khi đủ thì add() chờ (giữ bộ nhớ ổn định khi sinh dữ liệu nhanh hơn ghi).
+Lỗi từng document (vd trùng unique key) được đếm, không dừng cả lô.
+"""
+import asyncio
+from collections import defaultdict
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError
+
+
+class BulkLoader:
+    def __init__(self, db: AsyncDatabase, batch_size: int = 5000, concurrency: int = 8):
+        self.db = db
+        self.batch_size = batch_size
+        self.inserted: dict[str, int] = defaultdict(int)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.batches = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._buffers: dict[str, list] = defaultdict(list)
+        self._tasks: set[asyncio.Task] = set()
+        self._failure: Exception | None = None
+
+    async def add(self, collection: str, doc: dict):
+        buffer = self._buffers[collection]
+        buffer.append(doc)
+        if len(buffer) >= self.batch_size:
+            self._buffers[collection] = []
+            await self._submit(collection, buffer)
+
+    async def flush(self):
+        """Ghi nốt các lô còn dở và chờ mọi lô ghi xong"""
+        for collection, docs in list(self._buffers.items()):
+            if docs:
+                await self._submit(collection, docs)
+        self._buffers.clear()
+        await asyncio.gather(*self._tasks)
+        if self._failure:
+            raise self._failure
+
+    async def _submit(self, collection: str, docs: list[dict]):
+        if self._failure:
+            raise self._failure
+        await self._slots.acquire()
+        task = asyncio.create_task(self._insert(collection, docs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # Nhường event loop để các lô đang chờ được gửi đi trong lúc sinh tiếp
+        await asyncio.sleep(0)
+
+    async def _insert(self, collection: str, docs: list[dict]):
+        try:
+            await self.db[collection].insert_many(docs, ordered=False)
+            self.inserted[collection] += len(docs)
+        except BulkWriteError as e:
+            failed = len(e.details.get("writeErrors", []))
+            self.inserted[collection] += e.details.get("nInserted", len(docs) - failed)
+            self.errors[collection] += failed
+        except Exception as e:
+            self._failure = self._failure or e
+        finally:
+            self.batches += 1
+            self._slots.release()
@@ -4,6 +4,17 @@ from fastapi import FastAPI, Request
 import os
 from contextlib import asynccontextmanager
 
+from app.db.indexes import ensure_indexes
+from app.core.grade_events import grade_events
+from app.core.catalog import course_catalog
+from app.core.ai import create_ai_service
+from app.core.ai_cache import create_answer_cache
+from app.core.socket import manager
+from app.core.broker import create_broker
+from app.core.message_writer import message_writer
+from app.core.conversations import backfill_pair_keys
+from app.core.security import password_service
+
 # Load .env file
 load_dotenv()
 
@@ -17,11 +28,38 @@ async def lifespan(app: FastAPI):
     app.state.db = app.state.client[os.getenv("DATABASE_NAME", "data")]
 
     try:
-        await app.state.db.users.create_index("mssv", unique=True)
+        app.state.index_report = await ensure_indexes(app.state.db)
+        print(f"Indexes created: {len(app.state.index_report['created'])}, dropped: {len(app.state.index_report['dropped'])}, errors: {len(app.state.index_report['errors'])}")
     except Exception as e:
+        app.state.index_report = {"created": [], "dropped": [], "errors": [{"index": "*", "error": str(e)}]}
         print(f"Error when creating index: {str(e)}")
 
+    backfill = await backfill_pair_keys(app.state.db)
+    if backfill["updated"] or backfill["duplicates"]:
+        print(f"Conversations pair_key backfill: {backfill['updated']} updated, {backfill['duplicates']} duplicates skipped")
+
+    await course_catalog.load(app.state.db)
+    print(f"Course catalog loaded: {len(course_catalog)} courses")
+    course_catalog.start()
+
+    # Client AI dùng chung cho mọi request (None nếu chưa cấu hình)
+    app.state.ai = create_ai_service()
+    app.state.ai_cache = create_answer_cache(app.state.db)
+
+    # Consumer cập nhật tổng kết học kỳ khi điểm thay đổi
+    grade_events.start(app.state.db)
+    message_writer.start(app.state.db)
+
+    # Broker cho WebSocket (memory: 1 worker, mongo: nhiều worker)
+    await manager.start(create_broker(app.state.db))
+    print(f"WebSocket broker: {manager.broker.backend}")
+
     yield
+    await manager.stop()
+    await message_writer.stop()
+    password_service.shutdown()
+    await grade_events.stop()
+    await course_catalog.stop()
     print("Closing MongoDB connectiongs")
     await app.state.client.close()
 
@@ -0,0 +1,153 @@
+"""
+Registry index cho toàn bộ collection
+
+Mỗi collection khai báo danh sách IndexModel với tên cố định, lifespan gọi
+ensure_indexes() khi khởi động (idempotent) và get_index_drift() dùng để so
+sánh registry với index đang tồn tại trên MongoDB.
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import OperationFailure
+
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "users": [
+        IndexModel([("mssv", ASCENDING)], name="mssv_1", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_1", unique=True),
+        IndexModel([("phone", ASCENDING)], name="phone_1"),
+    ],
+    "course_grades": [
+        IndexModel([("course_class_id", ASCENDING), ("student_id", ASCENDING)],
+                   name="course_class_id_1_student_id_1", unique=True),
+        IndexModel([("student_id", ASCENDING)], name="student_id_1"),
+    ],
+    "course_classes": [
+        IndexModel([("student_ids", ASCENDING), ("semester", ASCENDING)], name="student_ids_1_semester_1"),
+        IndexModel([("teacher_id", ASCENDING), ("semester", ASCENDING)], name="teacher_id_1_semester_1"),
+        IndexModel([("semester", ASCENDING)], name="semester_1"),
+    ],
+    "administrative_classes": [
+        IndexModel([("advisor_id", ASCENDING)], name="advisor_id_1"),
+        IndexModel([("student_ids", ASCENDING)], name="student_ids_1"),
+    ],
+    "messages": [
+        IndexModel([("conversation_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+                   name="conversation_id_1_created_at_1__id_1"),
+    ],
+    "conversations": [
+        IndexModel([("participants", ASCENDING), ("updated_at", DESCENDING)],
+                   name="participants_1_updated_at_-1"),
+        # Hội thoại cũ chưa có pair_key không tính vào unique
+        IndexModel([("pair_key", ASCENDING)], name="pair_key_1", unique=True,
+                   partialFilterExpression={"pair_key": {"$exists": True}}),
+    ],
+    "posts": [
+        IndexModel([("class_id", ASCENDING), ("post_type", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="class_id_1_post_type_1_created_at_-1__id_-1"),
+    ],
+    "semester_summaries": [
+        IndexModel([("student_id", ASCENDING), ("semester", ASCENDING)],
+                   name="student_id_1_semester_1", unique=True),
+    ],
+    "ai_answer_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+    ],
+}
+
+# Index cũ đã được thay thế, ensure_indexes() sẽ xóa nếu còn tồn tại
+RETIRED_INDEXES: dict[str, list[str]] = {
+    # Thay bằng conversation_id_1_created_at_1__id_1 (phân trang keyset)
+    "messages": ["conversation_id_1_created_at_1"],
+    # Thay bằng class_id_1_post_type_1_created_at_-1__id_-1 (phân trang keyset)
+    "posts": ["class_id_1_post_type_1_created_at_-1"],
+}
+
+# Các option được so sánh khi kiểm tra drift
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _normalize(spec: dict) -> dict:
+    """Chuẩn hóa document index để so sánh (key + option quan trọng)"""
+    # Server có thể trả về hướng index dạng float (1.0) nếu tạo từ shell
+    normalized = {"key": [(k, v if isinstance(v, str) else int(v)) for k, v in spec["key"].items()]}
+    for option in _COMPARED_OPTIONS:
+        value = spec.get(option)
+        if option in ("unique", "sparse"):
+            value = bool(value)
+        if value is not None:
+            normalized[option] = value
+    return normalized
+
+
+async def ensure_indexes(db: AsyncDatabase) -> dict:
+    """Tạo toàn bộ index trong registry, bỏ qua index đã tồn tại"""
+    report = {"created": [], "dropped": [], "errors": []}
+
+    for collection, models in INDEXES.items():
+        existing = await db[collection].index_information()
+
+        for name in RETIRED_INDEXES.get(collection, []):
+            if name not in existing:
+                continue
+            try:
+                await db[collection].drop_index(name)
+                report["dropped"].append(f"{collection}.{name}")
+            except OperationFailure as e:
+                print(f"Error when dropping index {collection}.{name}: {str(e)}")
+                report["errors"].append({"index": f"{collection}.{name}", "error": str(e)})
+        missing = [m for m in models if m.document["name"] not in existing]
+
+        for model in missing:
+            # Tạo từng index để một index lỗi (dữ liệu trùng, xung đột option)
+            # không chặn các index còn lại
+            name = model.document["name"]
+            try:
+                await db[collection].create_indexes([model])
+                report["created"].append(f"{collection}.{name}")
+            except OperationFailure as e:
+                print(f"Error when creating index {collection}.{name}: {str(e)}")
+                report["errors"].append({"index": f"{collection}.{name}", "error": str(e)})
+
+    return report
+
+
+async def get_index_drift(db: AsyncDatabase) -> dict:
+    """So sánh registry với index thực tế trên database"""
+    drift = {"missing": [], "mismatched": [], "extra": []}
+
+    for collection, models in INDEXES.items():
+        existing = {}
+        async for info in await db[collection].list_indexes():
+            existing[info["name"]] = info
+
+        expected_names = set()
+        for model in models:
+            spec = model.document
+            name = spec["name"]
+            expected_names.add(name)
+
+            if name not in existing:
+                drift["missing"].append(f"{collection}.{name}")
+                continue
+
+            expected = _normalize(spec)
+            actual = _normalize(existing[name])
+            if expected != actual:
+                drift["mismatched"].append({
+                    "index": f"{collection}.{name}",
+                    "expected": _to_json(expected),
+                    "actual": _to_json(actual)
+                })
+
+        for name in existing:
+            if name != "_id_" and name not in expected_names:
+                drift["extra"].append(f"{collection}.{name}")
+
+    drift["in_sync"] = not (drift["missing"] or drift["mismatched"])
+    return drift
+
+
+def _to_json(normalized: dict) -> dict:
+    result = dict(normalized)
+    result["key"] = {k: v for k, v in normalized["key"]}
+    return result
@@ -0,0 +1,113 @@
+"""
+Batch loader theo request (kiểu DataLoader)
+
+Các lời gọi load()/load_many() trong cùng một vòng event loop được gom lại
+thành một truy vấn {"_id": {"$in": [...]}} duy nhất, kết quả được ghi nhớ
+trong suốt request.
+"""
+import asyncio
+from bson import ObjectId
+from fastapi import Request
+from pymongo.asynchronous.collection import AsyncCollection
+
+
+class EntityLoader:
+    def __init__(self, collection: AsyncCollection, projection: dict | None = None):
+        self.collection = collection
+        self.projection = projection
+        self.query_count = 0
+        self._cache: dict[str, asyncio.Future] = {}
+        self._queue: list[str] = []
+        self._tasks: set[asyncio.Task] = set()  # Giữ tham chiếu tới các task dispatch đang chạy
+
+    def _future_for(self, key: str) -> asyncio.Future:
+        """Lấy future đã có hoặc đưa key vào hàng đợi batch kế tiếp"""
+        future = self._cache.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+
+        if not self._queue:
+            # Dispatch ở lượt kế tiếp của event loop để gom các key còn lại
+            loop.call_soon(self._start_dispatch)
+        self._queue.append(key)
+        return future
+
+    def _start_dispatch(self):
+        task = asyncio.get_running_loop().create_task(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self):
+        keys, self._queue = self._queue, []
+        self.query_count += 1
+
+        try:
+            docs = await self.collection.find(
+                {"_id": {"$in": [ObjectId(k) for k in keys]}},
+                self.projection
+            ).to_list(length=None)
+            found = {str(d["_id"]): d for d in docs}
+        except BaseException as e:
+            # Báo lỗi (hoặc hủy) cho mọi lời gọi đang chờ batch này, bỏ khỏi cache để lần sau tải lại
+            cancelled = isinstance(e, asyncio.CancelledError)
+            for key in keys:
+                future = self._cache.pop(key, None)
+                if future is not None and not future.done():
+                    if cancelled:
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(found.get(key))
+
+    async def load(self, key) -> dict | None:
+        """Lấy 1 document theo _id (None nếu không tồn tại hoặc id không hợp lệ)"""
+        if key is None or not ObjectId.is_valid(key):
+            return None
+        return await self._future_for(str(key))
+
+    async def load_many(self, keys) -> dict[str, dict | None]:
+        """Lấy nhiều document, trả về dict {id: document}"""
+        unique_keys = list(dict.fromkeys(str(k) for k in keys if k is not None and ObjectId.is_valid(k)))
+        if not unique_keys:
+            return {}
+
+        futures = [self._future_for(k) for k in unique_keys]
+        docs = await asyncio.gather(*futures)
+        return dict(zip(unique_keys, docs))
+
+    def prime(self, doc: dict):
+        """Đưa sẵn document đã có vào cache"""
+        key = str(doc["_id"])
+        if key in self._cache:
+            return
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(doc)
+        self._cache[key] = future
+
+
+class Loaders:
+    """Tập loader dùng chung trong 1 request"""
+
+    def __init__(self, db):
+        self.users = EntityLoader(db.users, {"password": 0})
+        self.course_classes = EntityLoader(db.course_classes)
+
+
+def get_loaders(request: Request) -> Loaders:
+    """Lấy (hoặc tạo) Loaders gắn với request hiện tại"""
+    loaders = getattr(request.state, "loaders", None)
+    if loaders is None:
+        loaders = Loaders(request.app.state.db)
+        request.state.loaders = loaders
+    return loaders
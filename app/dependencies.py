@@ -2,12 +2,32 @@ from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from app.model.muser import UserResponse
 from pymongo.asynchronous.database import AsyncDatabase
+import os
+from dotenv import load_dotenv
 
 from app.core.security import jwt_service
+from app.core.cache import TTLCache
+
+load_dotenv()
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+# Cache user đã xác thực theo mssv, tránh truy vấn users ở mọi request
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", 4096)),
+    ttl=float(os.getenv("USER_CACHE_TTL", 60))
+)
+
+
+def invalidate_user(mssv: str | None = None, user_id: str | None = None):
+    """Xóa user khỏi cache sau khi sửa/xóa/khóa tài khoản"""
+    if mssv is not None:
+        user_cache.invalidate(mssv)
+    if user_id is not None:
+        user_cache.invalidate_where(lambda user: str(user["_id"]) == str(user_id))
+
+
 async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> UserResponse:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -24,13 +44,17 @@ async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)
     except Exception as e:
         raise credentials_exception
     
-    db: AsyncDatabase = request.app.state.db
-    user = await db.users.find_one({"mssv": mssv})
-    
-    if user is None or not user.get("is_active", True):
-        raise credentials_exception
+    user = user_cache.get(mssv)
+    if user is None:
+        db: AsyncDatabase = request.app.state.db
+        user = await db.users.find_one({"mssv": mssv})
+        
+        if user is None or not user.get("is_active", True):
+            raise credentials_exception
+        user_cache.set(mssv, user)
     
-    return user
+    # Trả về bản sao vì một số endpoint sửa trực tiếp current_user
+    return dict(user)
 
 
 async def get_current_cvht(current_user: dict = Depends(get_current_user)):
@@ -14,6 +14,7 @@ from app.routers.posts import router as posts
 from app.routers.chat import router as chat
 from app.routers.stats import router as stats
 from app.routers.ai_assistant import router as ai_assistant
+from app.routers.system import router as system
 
 load_dotenv()
 
@@ -42,6 +43,7 @@ app.include_router(posts)
 app.include_router(chat)
 app.include_router(stats)
 app.include_router(ai_assistant)
+app.include_router(system)
 
 
 @app.exception_handler(Exception)
@@ -29,6 +29,12 @@ class MessageResponse(BaseModel):
     }
 
 
+class MessagePage(BaseModel):
+    messages: list[MessageResponse]  # Theo thứ tự thời gian tăng dần
+    next_cursor: str | None = None  # Message id cho trang kế tiếp (before/after)
+    has_more: bool = False
+
+
 class LastMessage(BaseModel):
     content: str
     sender_id: str
@@ -46,6 +52,8 @@ class ConversationResponse(BaseModel):
 
     other_user_name: str | None = None  # Tên người chat
     other_user_phone: str | None = None  # Phone người chat
+    unread_count: int = 0  # Số tin nhắn tôi chưa đọc
+    last_read_at: datetime | None = None  # Lần cuối tôi đọc hội thoại
 
     model_config = {
         "populate_by_name": True,
@@ -31,6 +31,23 @@ class CourseGradeResponse(CourseGradeBase):
     }
 
 
+class SemesterGPA(BaseModel):
+    semester: str
+    gpa: float = Field(..., ge=0.0, le=4.0)
+    credits: int = 0  # Tín chỉ có điểm
+    passed_credits: int = 0  # Tín chỉ đạt
+
+
+# Bảng điểm sinh viên (điểm từng môn + GPA theo học kỳ)
+class TranscriptResponse(BaseModel):
+    student_id: str
+    grades: list[CourseGradeResponse] = []
+    semesters: list[SemesterGPA] = []
+    overall_gpa: float = 0.0
+    total_credits: int = 0
+    passed_credits: int = 0
+
+
 # Tổng kết học kỳ (tự động tính từ điểm các môn)
 class SemesterSummaryResponse(BaseModel):
     id: str = Field(..., alias="_id")
@@ -39,6 +56,7 @@ class SemesterSummaryResponse(BaseModel):
     gpa: float = Field(..., ge=0.0, le=4.0)  # Điểm trung bình hệ 4
     credits_earned: int = Field(..., ge=0)  # Tín chỉ tích lũy trong kỳ
     credits_passed: int = Field(..., ge=0)  # Tín chỉ đạt (>= 4.0)
+    cumulative_gpa: float | None = None  # GPA tích lũy đến hết học kỳ này
     tuition_debt: bool = False  # Nợ học phí
     academic_warning: int = 0  # Cảnh báo học vụ: 0, 1, 2, 3
     updated_at: datetime
@@ -45,3 +45,29 @@ class PostResponse(PostBase):
         "populate_by_name": True,
         "from_attributes": True
     }
+
+
+class PostSummary(PostBase):
+    """Bài viết trong danh sách: chỉ kèm vài comment mới nhất và số lượng"""
+    id: str = Field(..., alias="_id")
+    post_type: PostType
+    class_id: str
+    author_id: str
+    author_name: str | None = None
+    author_role: str | None = None
+    like_count: int = 0
+    is_liked: bool = False  # User hiện tại đã like chưa
+    comment_count: int = 0
+    comments: list[CommentResponse] = []  # Các comment mới nhất
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {
+        "populate_by_name": True,
+        "from_attributes": True
+    }
+
+
+class PostPage(BaseModel):
+    posts: list[PostSummary]
+    next_cursor: str | None = None  # Token cho trang kế tiếp (None nếu đã hết)
@@ -9,6 +9,7 @@ class GPADistribution(BaseModel):
 
 class DashboardStats(BaseModel):
     class_id: str
+    class_name: str | None = None
     semester: str
     total_students: int = 0
     warning_count: int = 0
@@ -7,7 +7,7 @@ from dotenv import load_dotenv
 
 from app.model.madministrative_class import AdministrativeClassCreate, AdministrativeClassResponse
 from app.model.muser import UserResponse
-from app.dependencies import get_current_cvht, get_current_user
+from app.dependencies import get_current_cvht, get_current_user, invalidate_user
 
 load_dotenv()
 
@@ -158,5 +158,6 @@ async def remove_student(
             {"_id": ObjectId(student_id)},
             {"$set": {"administrative_class_id": None}}
         )
+        invalidate_user(user_id=student_id)
 
     return {"message": "Student removed from class"}
@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from google import genai
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
 
+from app.core.ai import AIService
+from app.core.ai_cache import AnswerCache, answer_cache_key
 from app.dependencies import get_current_user
 
 load_dotenv()
@@ -14,40 +18,27 @@ router = APIRouter(prefix=os.getenv("API_V1_STR", "/api/v1") + "/ai", tags=['AI
 class ChatRequest(BaseModel):
     message: str
     context: str | None = None
+    no_cache: bool = False  # Bỏ qua cache, luôn gọi mô hình
 
 
 class ChatResponse(BaseModel):
     response: str
     error: str | None = None
+    cached: bool = False
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(
-    chat_request: ChatRequest,
-    request: Request,
-    current_user: dict = Depends(get_current_user)
-):
+def build_prompt(current_user: dict, message: str, context: str | None = None, personal: bool = True) -> str:
     """
-    AI Assistant for students, teachers, and advisors
-    Helps with academic questions, course information, and general guidance
+    Build context-aware prompt
+    
+    personal=False bỏ tên người dùng khỏi prompt: câu trả lời được cache theo
+    role nên không được phụ thuộc vào người hỏi.
     """
-    try:
-        # Initialize Gemini client
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="AI service not configured"
-            )
-        
-        client = genai.Client(api_key=api_key)
-        
-        # Build context-aware prompt
-        user_role = current_user.get("role", "STUDENT")
-        user_name = current_user.get("full_name", "User")
-        
-        system_prompt = f"""You are an AI assistant for a Student Management System.
-You are helping {user_name}, who is a {user_role}.
+    user_role = current_user.get("role", "STUDENT")
+    user = f"{current_user.get('full_name', 'User')}, who is a {user_role}" if personal else f"a {user_role}"
+    
+    system_prompt = f"""You are an AI assistant for a Student Management System.
+You are helping {user}.
 
 Your role:
 - For STUDENTS: Help with academic questions, course information, study tips, grade understanding
@@ -62,20 +53,55 @@ Guidelines:
 - Encourage users to contact administrators for system-specific issues
 - Use Vietnamese when appropriate, but can respond in English
 
-User's question: {chat_request.message}
+User's question: {message}
 """
+    
+    if context:
+        system_prompt += f"\n\nAdditional context: {context}"
+    
+    return system_prompt
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_with_ai(
+    chat_request: ChatRequest,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    AI Assistant for students, teachers, and advisors
+    Helps with academic questions, course information, and general guidance
+    """
+    try:
+        ai: AIService | None = request.app.state.ai
+        if ai is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="AI service not configured"
+            )
         
-        if chat_request.context:
-            system_prompt += f"\n\nAdditional context: {chat_request.context}"
-        
-        # Generate response
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=system_prompt
-        )
+        # Câu hỏi lặp lại (cùng role, cùng context) lấy từ cache
+        cache: AnswerCache | None = request.app.state.ai_cache
+        use_cache = cache is not None and not chat_request.no_cache
+        cache_key = answer_cache_key(chat_request.message, current_user.get("role", "STUDENT"), chat_request.context)
+        if use_cache:
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                return ChatResponse(response=cached, error=None, cached=True)
         
-        return ChatResponse(response=response.text, error=None)
+        # Generate response (không chặn event loop, giới hạn đồng thời + timeout)
+        prompt = build_prompt(current_user, chat_request.message, chat_request.context, personal=not use_cache)
+        text = await ai.generate(prompt)
+        if use_cache and text:
+            await cache.set(cache_key, text)
         
+        return ChatResponse(response=text, error=None)
+    
+    except asyncio.TimeoutError:
+        return ChatResponse(
+            response="Xin lỗi, trợ lý AI đang quá tải. Vui lòng thử lại sau.",
+            error="AI request timed out"
+        )
     except Exception as e:
         return ChatResponse(
             response="Xin lỗi, tôi đang gặp sự cố kỹ thuật. Vui lòng thử lại sau.",
@@ -83,11 +109,72 @@ User's question: {chat_request.message}
         )
 
 
+def _sse(data: dict, event: str | None = None) -> str:
+    """Đóng gói 1 sự kiện Server-Sent Events"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_with_ai_stream(
+    chat_request: ChatRequest,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Giống /chat nhưng trả về câu trả lời dạng stream (text/event-stream)
+    
+    Mỗi đoạn văn bản là 1 sự kiện `data: {"delta": "..."}`, kết thúc bằng
+    `event: done` hoặc `event: error`.
+    """
+    ai: AIService | None = request.app.state.ai
+    if ai is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="AI service not configured"
+        )
+    
+    cache: AnswerCache | None = request.app.state.ai_cache
+    use_cache = cache is not None and not chat_request.no_cache
+    prompt = build_prompt(current_user, chat_request.message, chat_request.context, personal=not use_cache)
+    cache_key = answer_cache_key(chat_request.message, current_user.get("role", "STUDENT"), chat_request.context)
+    
+    async def event_stream():
+        try:
+            if use_cache:
+                cached = await cache.get(cache_key)
+                if cached is not None:
+                    yield _sse({"delta": cached})
+                    yield _sse({"cached": True}, event="done")
+                    return
+            
+            parts = []
+            async for text in ai.stream(prompt):
+                parts.append(text)
+                yield _sse({"delta": text})
+            if use_cache and parts:
+                await cache.set(cache_key, "".join(parts))
+            yield _sse({}, event="done")
+        except asyncio.TimeoutError:
+            yield _sse({"error": "AI request timed out"}, event="error")
+        except Exception as e:
+            yield _sse({"error": str(e)}, event="error")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/health")
-async def check_ai_health(current_user: dict = Depends(get_current_user)):
+async def check_ai_health(request: Request, current_user: dict = Depends(get_current_user)):
     """Check if AI service is available"""
-    api_key = os.getenv("GEMINI_API_KEY")
+    ai: AIService | None = request.app.state.ai
+    cache: AnswerCache | None = request.app.state.ai_cache
     return {
-        "available": bool(api_key),
-        "model": "gemini-2.5-flash"
+        "available": ai is not None,
+        "model": ai.model if ai else None,
+        "stats": ai.metrics() if ai else None,
+        "cache": cache.stats() if cache else None
     }
@@ -3,7 +3,7 @@ from pymongo.asynchronous.database import AsyncDatabase
 from dotenv import load_dotenv
 import os
 
-from app.core.security import hash_password, verify_password, jwt_service
+from app.core.security import password_service, PasswordServiceBusy, jwt_service
 from app.model.muser import UserCreate, UserResponse, UserLogin
 from app.model.token import Token
 
@@ -13,6 +13,17 @@ load_dotenv()
 
 router = APIRouter(prefix=os.getenv("API_V1_STR","/api/v1") + "/auth", tags=['Authentication'])
 
+# Tắt khi dữ liệu mẫu còn lưu mật khẩu dạng thô
+PASSWORD_CHECK = os.getenv("PASSWORD_CHECK", "false").lower() == "true"
+
+
+def service_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/register", response_model=UserResponse)
 async def register(request: Request, user: UserCreate) -> UserResponse:
     db: AsyncDatabase = request.app.state.db
@@ -22,7 +33,10 @@ async def register(request: Request, user: UserCreate) -> UserResponse:
         raise HTTPException(status_code=400, detail="Mssv already registered")
     
     user_dict = user.model_dump()
-    # user_dict["password"] = hash_password(user_dict["password"])
+    try:
+        user_dict["password"] = await password_service.hash(user_dict["password"])
+    except PasswordServiceBusy:
+        raise service_busy()
 
     new_user = await db.users.insert_one(user_dict)
     created_user = await db.users.find_one({"_id": new_user.inserted_id})
@@ -42,8 +56,17 @@ async def login(request: Request, response: Response, user_login: UserLogin) ->
 
     user = await db.users.find_one({"mssv": user_login.mssv})
 
-    # if not user or not verify_password(user_login.password, user["password"]):
-    if not user:
+    valid = user is not None
+    if valid and PASSWORD_CHECK:
+        try:
+            valid, new_hash = await password_service.verify_and_rehash(user_login.password, user.get("password", ""))
+        except PasswordServiceBusy:
+            raise service_busy()
+        if new_hash:
+            # Cost bcrypt đã đổi: lưu lại hash mới
+            await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Wrong student code or password",
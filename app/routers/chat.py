@@ -1,18 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, WebSocket, WebSocketDisconnect
 from pymongo.asynchronous.database import AsyncDatabase
 from bson import ObjectId
 from datetime import datetime
+from pymongo import UpdateOne
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
 
-from app.model.mchat import ConversationCreate, ConversationResponse, MessageResponse, MessageCreate
+from app.model.mchat import ConversationCreate, ConversationResponse, MessageResponse, MessageCreate, MessagePage
 from app.dependencies import get_current_user
-from app.core.socket import manager # Import socket manager
+from app.core.socket import manager, Connection # Import socket manager
+from app.core.message_writer import message_writer
+from app.core.conversations import get_or_create_conversation
 
 load_dotenv()
 
 router = APIRouter(prefix=os.getenv("API_V1_STR", "/api/v1"), tags=['Chat System'])
 
+# Số tin nhắn tối đa gửi bù khi kết nối lại
+REPLAY_LIMIT = int(os.getenv("WS_REPLAY_LIMIT", 500))
+# Ack delivered được gom theo kết nối, ghi xuống DB tối đa 1 lần mỗi khoảng này (giây)
+ACK_FLUSH_INTERVAL = float(os.getenv("WS_ACK_FLUSH_INTERVAL", 1.0))
+
 # --- REST API (Quản lý hội thoại & Lịch sử) ---
 
 # Tạo cuộc hội thoại mới hoặc lấy cái cũ
@@ -57,26 +67,10 @@ async def create_conversation_by_phone(
     if sender_id == receiver_id:
         raise HTTPException(status_code=400, detail="Cannot chat with yourself")
     
-    # Kiểm tra xem đã có cuộc hội thoại giữa 2 người chưa
-    existing_conv = await db.conversations.find_one({
-        "participants": {"$all": [sender_id, receiver_id]}
-    })
-
-    if existing_conv:
-        existing_conv["_id"] = str(existing_conv["_id"])
-        return existing_conv
-
-    # Nếu chưa có -> Tạo mới
-    new_conv = {
-        "participants": [sender_id, receiver_id],
-        "last_message": None,
-        "updated_at": datetime.now()
-    }
-    result = await db.conversations.insert_one(new_conv)
-    
-    created_conv = await db.conversations.find_one({"_id": result.inserted_id})
-    created_conv["_id"] = str(created_conv["_id"])
-    return created_conv
+    # Lấy cuộc hội thoại giữa 2 người hoặc tạo mới (1 lệnh upsert theo pair_key)
+    conv = await get_or_create_conversation(db, sender_id, receiver_id)
+    conv["_id"] = str(conv["_id"])
+    return conv
 
 
 @router.post("/conversations", response_model=ConversationResponse)
@@ -101,27 +95,10 @@ async def create_conversation(
     if not receiver:
         raise HTTPException(status_code=404, detail="Receiver not found")
 
-    # Kiểm tra xem đã có cuộc hội thoại giữa 2 người chưa
-    # Tìm document nào mà participants chứa cả 2 ID
-    existing_conv = await db.conversations.find_one({
-        "participants": {"$all": [sender_id, receiver_id]}
-    })
-
-    if existing_conv:
-        existing_conv["_id"] = str(existing_conv["_id"])
-        return existing_conv
-
-    # Nếu chưa có -> Tạo mới
-    new_conv = {
-        "participants": [sender_id, receiver_id],
-        "last_message": None,
-        "updated_at": datetime.now()
-    }
-    result = await db.conversations.insert_one(new_conv)
-    
-    created_conv = await db.conversations.find_one({"_id": result.inserted_id})
-    created_conv["_id"] = str(created_conv["_id"])
-    return created_conv
+    # Lấy cuộc hội thoại giữa 2 người hoặc tạo mới (1 lệnh upsert theo pair_key)
+    conv = await get_or_create_conversation(db, sender_id, receiver_id)
+    conv["_id"] = str(conv["_id"])
+    return conv
 
 
 # Lấy danh sách hội thoại của tôi (Inbox)
@@ -130,118 +107,365 @@ async def get_my_conversations(
     request: Request,
     current_user: dict = Depends(get_current_user)
 ):
+    """Inbox: hội thoại + người chat + tin nhắn cuối + số chưa đọc trong 1 aggregation"""
     db: AsyncDatabase = request.app.state.db
     user_id = str(current_user["_id"])
 
-    # Tìm tất cả hội thoại mà tôi là thành viên
-    cursor = db.conversations.find({"participants": user_id}).sort("updated_at", -1)
-    conversations = await cursor.to_list(length=100)
+    conversations = await db.conversations.aggregate([
+        # Tìm tất cả hội thoại mà tôi là thành viên
+        {"$match": {"participants": user_id}},
+        {"$sort": {"updated_at": -1}},
+        {"$limit": 100},
+        {"$addFields": {
+            "other_id": {"$arrayElemAt": [
+                {"$filter": {"input": "$participants", "cond": {"$ne": ["$$this", user_id]}}}, 0
+            ]}
+        }},
+        {"$lookup": {
+            "from": "users",
+            # $convert thay vì $toObjectId: participant không phải ObjectId hợp lệ
+            # (hoặc hội thoại với chính mình, other_id = null) không làm hỏng cả inbox
+            "let": {"other_oid": {"$convert": {"input": "$other_id", "to": "objectId", "onError": None, "onNull": None}}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$other_oid"]}}},
+                {"$project": {"full_name": 1, "phone": 1}}
+            ],
+            "as": "other_user"
+        }},
+        {"$project": {
+            "participants": 1,
+            "last_message": 1,
+            "updated_at": 1,
+            "unread_count": {"$ifNull": [f"$unread.{user_id}", 0]},
+            "last_read_at": f"$last_read.{user_id}",
+            "other_user_name": {"$ifNull": [{"$arrayElemAt": ["$other_user.full_name", 0]}, "Unknown"]},
+            "other_user_phone": {"$ifNull": [{"$arrayElemAt": ["$other_user.phone", 0]}, ""]}
+        }}
+    ]).to_list(length=100)
 
     for c in conversations:
         c["_id"] = str(c["_id"])
-        
-        # Populate other user info
-        participants = c.get("participants", [])
-        other_user_id = next((p for p in participants if p != user_id), None)
-        
-        if other_user_id and ObjectId.is_valid(other_user_id):
-            other_user = await db.users.find_one({"_id": ObjectId(other_user_id)})
-            if other_user:
-                c["other_user_name"] = other_user.get("full_name", "Unknown")
-                c["other_user_phone"] = other_user.get("phone", "")
     
     return conversations
 
 
-# Lấy lịch sử tin nhắn của 1 hội thoại
-@router.get("/conversations/{conversation_id}/messages", response_model=list[MessageResponse])
+# Đánh dấu đã đọc hội thoại (reset số tin chưa đọc)
+@router.post("/conversations/{conversation_id}/read")
+async def mark_conversation_read(
+    conversation_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    db: AsyncDatabase = request.app.state.db
+    user_id = str(current_user["_id"])
+
+    if not ObjectId.is_valid(conversation_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid ID")
+
+    result = await db.conversations.update_one(
+        {"_id": ObjectId(conversation_id), "participants": user_id},
+        {"$set": {f"unread.{user_id}": 0, f"last_read.{user_id}": datetime.now()}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+
+    return {"conversation_id": conversation_id, "unread_count": 0}
+
+
+# Lấy lịch sử tin nhắn của 1 hội thoại (phân trang keyset theo created_at, _id)
+@router.get("/conversations/{conversation_id}/messages", response_model=MessagePage)
 async def get_messages(
     conversation_id: str,
     request: Request,
+    before: str | None = None,
+    after: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
     current_user: dict = Depends(get_current_user)
 ):
+    """
+    - Không có cursor: trang mới nhất
+    - before=<message_id>: trang cũ hơn tin nhắn đó (cuộn lên)
+    - after=<message_id>: các tin nhắn mới hơn tin nhắn đó
+    
+    Tin nhắn trong trang luôn theo thứ tự thời gian tăng dần, next_cursor dùng
+    cho trang kế tiếp theo cùng chiều (None nếu đã hết).
+    """
     db: AsyncDatabase = request.app.state.db
     user_id = str(current_user["_id"])
 
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
     # Kiểm tra quyền (phải là thành viên)
     conv = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
     if not conv or user_id not in conv["participants"]:
          raise HTTPException(status_code=403, detail="Access denied")
 
-    # Lấy tin nhắn
-    cursor = db.messages.find({"conversation_id": conversation_id}).sort("created_at", 1)
-    messages = await cursor.to_list(length=500)
+    query = {"conversation_id": conversation_id}
+    direction = 1 if after else -1
+    cursor_id = before or after
+    if cursor_id:
+        if not ObjectId.is_valid(cursor_id):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        anchor = await db.messages.find_one(
+            {"_id": ObjectId(cursor_id), "conversation_id": conversation_id},
+            {"created_at": 1}
+        )
+        if not anchor:
+            raise HTTPException(status_code=404, detail="Cursor message not found")
+
+        op = "$gt" if after else "$lt"
+        query["$or"] = [
+            {"created_at": {op: anchor["created_at"]}},
+            {"created_at": anchor["created_at"], "_id": {op: anchor["_id"]}}
+        ]
+
+    # Lấy thêm 1 bản ghi để biết còn trang sau hay không
+    cursor = db.messages.find(query).sort([("created_at", direction), ("_id", direction)]).limit(limit + 1)
+    messages = await cursor.to_list(length=limit + 1)
     
+    has_more = len(messages) > limit
+    messages = messages[:limit]
     for m in messages:
         m["_id"] = str(m["_id"])
+    
+    next_cursor = messages[-1]["_id"] if has_more else None
+    if direction == -1:
+        messages.reverse()
         
-    return messages
+    return {"messages": messages, "next_cursor": next_cursor, "has_more": has_more}
 
 
 # --- WEBSOCKET (Real-time Messaging) ---
 
-# Connect vào: ws://localhost:8080/api/v1/ws/{user_id}
+def unread_increments(participants: list[str], sender_id: str) -> dict:
+    return {f"unread.{p}": 1 for p in participants if p != sender_id}
+
+
+def first_message_update(sender_id: str, last_message: dict, now: datetime) -> list[dict]:
+    """
+    Pipeline update cho tin nhắn đầu tiên qua 1 socket (chưa biết participants):
+    đặt last_message và tăng unread của người nhận từ $participants ngay trên server
+    """
+    others_unread = {"$arrayToObject": {"$map": {
+        "input": {"$filter": {"input": "$participants", "cond": {"$ne": ["$$this", sender_id]}}},
+        "as": "p",
+        "in": {"k": "$$p", "v": {"$add": [1, {"$ifNull": [{"$arrayElemAt": [
+            {"$map": {
+                "input": {"$filter": {
+                    "input": {"$objectToArray": {"$ifNull": ["$unread", {}]}},
+                    "cond": {"$eq": ["$$this.k", "$$p"]}
+                }},
+                "in": "$$this.v"
+            }}, 0
+        ]}, 0]}]}}
+    }}}
+    return [{"$set": {
+        "last_message": {"$literal": last_message},  # content có thể bắt đầu bằng "$"
+        "updated_at": now,
+        # Người gửi coi như đã đọc hết
+        "unread": {"$mergeObjects": [{"$ifNull": ["$unread", {}]}, others_unread, {sender_id: 0}]},
+        f"last_read.{sender_id}": now
+    }}]
+
+
+def message_payload(msg: dict) -> dict:
+    return {
+        "id": str(msg["_id"]),
+        "conversation_id": msg["conversation_id"],
+        "sender_id": msg["sender_id"],
+        "content": msg["content"],
+        "created_at": msg["created_at"].isoformat()
+    }
+
+
+async def replay_missed_messages(db: AsyncDatabase, connection: Connection, user_id: str, last_seen: str):
+    """Gửi lại các tin nhắn mới hơn last_seen (client vừa kết nối lại) trong 1 sự kiện replay"""
+    anchor = None
+    if ObjectId.is_valid(last_seen):
+        anchor = await db.messages.find_one({"_id": ObjectId(last_seen)}, {"created_at": 1, "conversation_id": 1})
+    if not anchor:
+        connection.enqueue(json.dumps({"event": "resync_required", "data": {"reason": "unknown last_seen"}}))
+        return
+
+    since = anchor["created_at"]
+    # Chỉ các hội thoại có hoạt động sau last_seen (index participants_1_updated_at_-1)
+    convs = await db.conversations.find(
+        {"participants": user_id, "updated_at": {"$gte": since}}, {"_id": 1}
+    ).to_list(length=None)
+    conversation_ids = [str(c["_id"]) for c in convs]
+
+    # Mốc phải là tin nhắn trong hội thoại của user (hội thoại đó luôn có updated_at >= since);
+    # không thì last_seen của người khác cũng dùng được để dò thời điểm nhắn tin
+    if anchor.get("conversation_id") not in conversation_ids:
+        connection.enqueue(json.dumps({"event": "resync_required", "data": {"reason": "unknown last_seen"}}))
+        return
+
+    messages = []
+    if convs:
+        messages = await db.messages.find({
+            "conversation_id": {"$in": conversation_ids},
+            "$or": [
+                {"created_at": {"$gt": since}},
+                {"created_at": since, "_id": {"$gt": anchor["_id"]}}
+            ]
+        }).sort([("created_at", 1), ("_id", 1)]).limit(REPLAY_LIMIT + 1).to_list(length=REPLAY_LIMIT + 1)
+
+    # Quá nhiều tin bị lỡ: client nên tải lại lịch sử thay vì nhận replay
+    truncated = len(messages) > REPLAY_LIMIT
+    connection.enqueue(json.dumps({"event": "replay", "data": {
+        "messages": [message_payload(m) for m in messages[:REPLAY_LIMIT]],
+        "truncated": truncated
+    }}))
+
+
+def acknowledge_delivery(db: AsyncDatabase, connection: Connection, user_id: str, data: dict):
+    """
+    Client xác nhận đã nhận tin nhắn -> mốc delivered.<user_id> của hội thoại
+
+    Mốc chỉ được giữ trong kết nối, ghi xuống DB theo lô (flush_delivery) mỗi
+    ACK_FLUSH_INTERVAL giây và khi ngắt kết nối.
+    """
+    conversation_id, message_id = data.get("conversation_id"), data.get("message_id")
+    if not (ObjectId.is_valid(conversation_id or "") and ObjectId.is_valid(message_id or "")):
+        return
+
+    message_oid = ObjectId(message_id)
+    manager.acknowledge(connection, message_id)
+    # Ack dồn: chỉ giữ mốc mới nhất của mỗi hội thoại
+    last_delivered = connection.delivered.get(conversation_id)
+    if last_delivered is None or message_oid > last_delivered:
+        connection.delivered[conversation_id] = message_oid
+        connection.pending_delivered[conversation_id] = message_oid
+        if connection.ack_flush is None or connection.ack_flush.done():
+            connection.ack_flush = asyncio.create_task(_flush_delivery_later(db, connection, user_id))
+
+
+async def flush_delivery(db: AsyncDatabase, connection: Connection, user_id: str):
+    """Ghi các mốc delivered đang chờ của kết nối bằng 1 bulk_write"""
+    pending = dict(connection.pending_delivered)
+    if not pending:
+        return
+
+    await db.conversations.bulk_write([
+        UpdateOne(
+            {"_id": ObjectId(conversation_id), "participants": user_id},
+            {"$max": {f"delivered.{user_id}": message_oid}}
+        )
+        for conversation_id, message_oid in pending.items()
+    ], ordered=False)
+    # Chỉ bỏ các mốc đã ghi; ack mới đến trong lúc ghi để lần sau
+    for conversation_id, message_oid in pending.items():
+        if connection.pending_delivered.get(conversation_id) == message_oid:
+            del connection.pending_delivered[conversation_id]
+
+
+async def _flush_delivery_later(db: AsyncDatabase, connection: Connection, user_id: str):
+    while connection.pending_delivered:
+        await asyncio.sleep(ACK_FLUSH_INTERVAL)
+        try:
+            await flush_delivery(db, connection, user_id)
+        except Exception as e:
+            print(f"Error when saving delivery acks: {str(e)}")
+            return
+
+
+# Connect vào: ws://localhost:8080/api/v1/ws/{user_id}?last_seen=<message_id>
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    # Chấp nhận kết nối
-    await manager.connect(websocket, user_id)
+    # Chấp nhận kết nối (mỗi thiết bị/tab là 1 kết nối riêng)
+    connection = await manager.connect(websocket, user_id)
     db: AsyncDatabase = websocket.app.state.db
+    # Participants của các hội thoại đã nhắn qua socket này (không đổi trong hội thoại 1-1)
+    participants_cache: dict[str, list[str]] = {}
 
     try:
+        # Kết nối lại: gửi bù các tin nhắn bị lỡ (sau khi đã đăng ký kết nối nên không hụt tin;
+        # tin trùng với tin real-time được client bỏ qua theo id)
+        last_seen = websocket.query_params.get("last_seen")
+        if last_seen:
+            await replay_missed_messages(db, connection, user_id, last_seen)
+
         while True:
             data = await websocket.receive_json()
+
+            if data.get("type") == "ack":
+                acknowledge_delivery(db, connection, user_id, data)
+                continue
             
             conversation_id = data.get("conversation_id")
             content = data.get("content")
             
-            if conversation_id and content:
-                # Lưu tin nhắn vào DB
+            if conversation_id and content and ObjectId.is_valid(conversation_id):
+                # 1 timestamp cho tin nhắn, last_message và payload gửi đi
+                now = datetime.now()
                 msg_doc = {
+                    "_id": ObjectId(),
                     "conversation_id": conversation_id,
                     "sender_id": user_id,
                     "content": content,
-                    "created_at": datetime.now()
+                    "created_at": now
                 }
-                new_msg = await db.messages.insert_one(msg_doc)
-                
-                # Update "Last Message" cho Conversation
-                await db.conversations.update_one(
-                    {"_id": ObjectId(conversation_id)},
-                    {
+                conv_filter = {"_id": ObjectId(conversation_id), "participants": user_id}
+                last_message = {"content": content, "sender_id": user_id, "created_at": now}
+
+                # Lưu tin nhắn (theo lô) trước: hội thoại chỉ nhận last_message / unread
+                # của tin nhắn đã thực sự có trong DB
+                try:
+                    await message_writer.write(msg_doc)
+                except Exception as e:
+                    print(f"Error when saving message: {str(e)}")
+                    connection.enqueue(json.dumps({"event": "error", "data": {
+                        "conversation_id": conversation_id, "detail": "Message could not be saved"
+                    }}))
+                    continue
+
+                # Mỗi tin nhắn = insert + 1 lệnh cập nhật hội thoại
+                participants = participants_cache.get(conversation_id)
+                if participants is None:
+                    # Lần đầu: kiểm tra quyền, cập nhật hội thoại và đọc participants trong 1 lệnh
+                    conv = await db.conversations.find_one_and_update(
+                        conv_filter, first_message_update(user_id, last_message, now),
+                        projection={"participants": 1}
+                    )
+                    if not conv:
+                        # Không phải thành viên: bỏ tin nhắn vừa lưu
+                        await db.messages.delete_one({"_id": msg_doc["_id"]})
+                        connection.enqueue(json.dumps({"event": "error", "data": {
+                            "conversation_id": conversation_id, "detail": "Access denied"
+                        }}))
+                        continue
+                    participants = participants_cache[conversation_id] = conv["participants"]
+                else:
+                    # Các lần sau: tăng số chưa đọc của người nhận trong cùng lệnh cập nhật
+                    await db.conversations.update_one(conv_filter, {
                         "$set": {
-                            "last_message": {
-                                "content": content,
-                                "sender_id": user_id,
-                                "created_at": datetime.now()
-                            },
-                            "updated_at": datetime.now()
-                        }
-                    }
-                )
-                
-                conv = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
-                if conv:
-                    participants = conv["participants"]
-                    
-                    # Chuẩn bị payload để gửi
-                    response_msg = {
-                        "event": "new_message",
-                        "data": {
-                            "id": str(new_msg.inserted_id),
-                            "conversation_id": conversation_id,
-                            "sender_id": user_id,
-                            "content": content,
-                            "created_at": str(datetime.now())
-                        }
-                    }
-
-                    # Gửi cho tất cả thành viên (bao gồm cả chính mình để update UI)
-                    for p_id in participants:
-                        await manager.send_personal_message(response_msg, p_id)
+                            "last_message": last_message,
+                            "updated_at": now,
+                            f"unread.{user_id}": 0,
+                            f"last_read.{user_id}": now
+                        },
+                        "$inc": unread_increments(participants, user_id)
+                    })
+
+                # Chuẩn bị payload để gửi
+                response_msg = {"event": "new_message", "data": message_payload(msg_doc)}
+
+                # Gửi cho tất cả thành viên (bao gồm cả chính mình để update UI)
+                await manager.publish(response_msg, participants)
 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
         print(f"User {user_id} disconnected from Chat")
+    finally:
+        manager.disconnect(connection)
+        # Ghi nốt các ack còn chờ (task ghi dồn bị hủy, $max nên ghi lại không sao)
+        if connection.ack_flush is not None:
+            connection.ack_flush.cancel()
+            await asyncio.gather(connection.ack_flush, return_exceptions=True)
+        try:
+            await flush_delivery(db, connection, user_id)
+        except Exception as e:
+            print(f"Error when saving delivery acks: {str(e)}")
 
 
 
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File, Query
 from pymongo.asynchronous.database import AsyncDatabase
-from pymongo import UpdateOne
 from bson import ObjectId
 from datetime import datetime
 from pydantic import BaseModel
 from typing import List, Optional
+import math
 import os
+import numpy as np
 from dotenv import load_dotenv
 
-from app.model.mgrade import CourseGradeResponse, CourseGradeImport
-from app.dependencies import get_current_teacher, get_current_user
+from app.model.mgrade import CourseGradeResponse, CourseGradeImport, TranscriptResponse
+from app.dependencies import get_current_cvht, get_current_teacher, get_current_user
+from app.db.loaders import get_loaders
+from app.core.cache import VersionedCache, grade_versions
+from app.core.catalog import course_catalog
+from app.core.grade_events import GradeChange, grade_events
+from app.core.grade_import import GradeImport, write_course_grades
+from app.utils.export import ExportFormat, stream_table
+from app.utils.tabular import UnsupportedFileType, iter_table_rows
+from app.utils.grade_calculator import calculate_semester_gpa_batch, calculate_total_score, calculate_total_score_array, convert_to_gpa_4
 
 load_dotenv()
 
@@ -27,6 +36,111 @@ class SaveGradesRequest(BaseModel):
     grades: List[GradeData]
 
 
+# Cache bảng điểm theo (student_id, semester), hết hiệu lực khi version điểm thay đổi
+transcript_cache = VersionedCache(maxsize=int(os.getenv("TRANSCRIPT_CACHE_SIZE", 2048)))
+
+
+def _to_object_id(field: str) -> dict:
+    return {"$convert": {"input": field, "to": "objectId", "onError": None, "onNull": None}}
+
+
+def build_transcript_pipeline(student_id: str, semester: str | None = None) -> list[dict]:
+    """Pipeline join điểm -> lớp học phần cho 1 sinh viên (môn học lấy từ danh mục)"""
+    pipeline = [
+        {"$match": {"student_id": student_id}},
+        {"$addFields": {"course_class_oid": _to_object_id("$course_class_id")}},
+        {"$lookup": {
+            "from": "course_classes",
+            "localField": "course_class_oid",
+            "foreignField": "_id",
+            "as": "course_class"
+        }},
+        {"$unwind": {"path": "$course_class", "preserveNullAndEmptyArrays": True}},
+    ]
+
+    if semester:
+        pipeline.append({"$match": {"course_class.semester": semester}})
+
+    pipeline += [
+        {"$project": {
+            "_id": {"$toString": "$_id"},
+            "course_class_id": 1,
+            "student_id": 1,
+            "regular_score_1": 1,
+            "regular_score_2": 1,
+            "final_score": 1,
+            "total_score": 1,
+            "updated_at": 1,
+            "semester": "$course_class.semester",
+            "class_code": "$course_class.class_code",
+            "course_id": "$course_class.course_id"
+        }}
+    ]
+    return pipeline
+
+
+def attach_course_info(grades: list[dict]) -> list[dict]:
+    """Gắn tên/mã/tín chỉ môn học từ danh mục và sắp xếp theo học kỳ, mã môn"""
+    for grade in grades:
+        course = course_catalog.get(grade.pop("course_id", None))
+        if course:
+            grade["course_name"] = course["name"]
+            grade["course_code"] = course["code"]
+            grade["credits"] = course["credits"]
+
+    grades.sort(key=lambda g: (g.get("semester") or "", g.get("course_code") or ""))
+    return grades
+
+
+def summarize_transcript(student_id: str, grades: list[dict]) -> dict:
+    """Tính GPA từng học kỳ và GPA tích lũy từ các dòng điểm đã join"""
+    scores = [np.nan if g.get("total_score") is None else g["total_score"] for g in grades]
+    credits = [g.get("credits") or 0 for g in grades]
+
+    by_semester = calculate_semester_gpa_batch(
+        [g.get("semester") or "Unknown" for g in grades], scores, credits
+    )
+    overall_gpa, total_credits, passed_credits = calculate_semester_gpa_batch(
+        [student_id] * len(grades), scores, credits
+    ).get(student_id, (0.0, 0, 0))
+
+    semesters = [
+        {
+            "semester": semester,
+            "gpa": gpa,
+            "credits": semester_credits,
+            "passed_credits": semester_passed
+        }
+        for semester, (gpa, semester_credits, semester_passed) in sorted(by_semester.items())
+        if semester_credits > 0
+    ]
+
+    return {
+        "student_id": student_id,
+        "grades": grades,
+        "semesters": semesters,
+        "overall_gpa": overall_gpa,
+        "total_credits": total_credits,
+        "passed_credits": passed_credits
+    }
+
+
+async def get_student_transcript(db: AsyncDatabase, student_id: str, semester: str | None = None) -> dict:
+    """Lấy bảng điểm (có cache theo version điểm của sinh viên và version danh mục môn học)"""
+    cache_key = (student_id, semester)
+    version = (await grade_versions.current(db, student_id), course_catalog.version)
+
+    transcript = transcript_cache.get(cache_key, version)
+    if transcript is not None:
+        return transcript
+
+    grades = await db.course_grades.aggregate(build_transcript_pipeline(student_id, semester)).to_list(length=None)
+    await course_catalog.ensure(db, (g.get("course_id") for g in grades))
+    transcript = summarize_transcript(student_id, attach_course_info(grades))
+    transcript_cache.set(cache_key, version, transcript)
+    return transcript
+
+
 @router.post("/update")
 async def update_student_grade(
     request: Request,
@@ -53,21 +167,10 @@ async def update_student_grade(
         raise HTTPException(status_code=400, detail="Student not in this class")
     
     # Get course formula for auto-calculation
-    course_id = class_obj.get("course_id")
-    regular_w1 = 0.2
-    regular_w2 = 0.3
-    final_w = 0.5
-    
-    if course_id and ObjectId.is_valid(course_id):
-        course = await db.courses.find_one({"_id": ObjectId(course_id)})
-        if course:
-            formula = course.get("grade_formula", {})
-            regular_w1 = formula.get("regular_weight_1", 0.2)
-            regular_w2 = formula.get("regular_weight_2", 0.3)
-            final_w = formula.get("final_weight", 0.5)
+    await course_catalog.ensure(db, [class_obj.get("course_id")])
+    regular_w1, regular_w2, final_w = course_catalog.grade_formula(class_obj.get("course_id"))
     
     # Calculate total score
-    from app.utils.grade_calculator import calculate_total_score
     total_score = calculate_total_score(
         grade_data.regular_score_1,
         grade_data.regular_score_2,
@@ -76,7 +179,7 @@ async def update_student_grade(
     )
     
     # Update or insert grade
-    result = await db.course_grades.update_one(
+    await db.course_grades.update_one(
         {
             "course_class_id": grade_data.course_class_id,
             "student_id": grade_data.student_id
@@ -93,6 +196,9 @@ async def update_student_grade(
         upsert=True
     )
     
+    await grade_versions.bump(db, grade_data.student_id)
+    grade_events.emit(GradeChange(grade_data.student_id, class_obj.get("semester")))
+    
     return {
         "message": "Grade updated successfully",
         "total_score": total_score
@@ -112,37 +218,23 @@ async def get_my_course_grades(
     if current_user.get("role") != "STUDENT":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only students can view their grades")
 
-    query = {"student_id": user_id}
-    
-    if semester:
-        course_classes = await db.course_classes.find({"semester": semester}).to_list(length=None)
-        class_ids = [str(c["_id"]) for c in course_classes]
-        query["course_class_id"] = {"$in": class_ids}
+    transcript = await get_student_transcript(db, user_id, semester)
+    return transcript["grades"]
 
-    records = await db.course_grades.find(query).to_list(length=100)
-    
-    # Populate course info
-    for r in records:
-        r["_id"] = str(r["_id"])
-        
-        # Get course class to get course_id and semester
-        course_class_id = r.get("course_class_id")
-        if course_class_id and ObjectId.is_valid(course_class_id):
-            course_class = await db.course_classes.find_one({"_id": ObjectId(course_class_id)})
-            if course_class:
-                r["semester"] = course_class.get("semester", "N/A")
-                r["class_code"] = course_class.get("class_code", "N/A")
-                
-                # Get course info
-                course_id = course_class.get("course_id")
-                if course_id and ObjectId.is_valid(course_id):
-                    course = await db.courses.find_one({"_id": ObjectId(course_id)})
-                    if course:
-                        r["course_name"] = course.get("name", "")
-                        r["course_code"] = course.get("code", "")
-                        r["credits"] = course.get("credits", 0)
-        
-    return records
+
+@router.get("/transcript", response_model=TranscriptResponse)
+async def get_my_transcript(
+    request: Request,
+    semester: str | None = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Sinh viên xem bảng điểm: điểm từng môn + GPA theo học kỳ (1 aggregation)"""
+    db: AsyncDatabase = request.app.state.db
+
+    if current_user.get("role") != "STUDENT":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only students can view their transcript")
+
+    return await get_student_transcript(db, str(current_user["_id"]), semester)
 
 
 @router.get("/my-stats")
@@ -153,102 +245,23 @@ async def get_my_course_stats(
     """
     Sinh viên xem thống kê học tập real-time
     """
-    from app.utils.grade_calculator import convert_to_gpa_4, is_passing_grade
-    
     db: AsyncDatabase = request.app.state.db
     user_id = str(current_user["_id"])
     
     if current_user.get("role") != "STUDENT":
         raise HTTPException(status_code=403, detail="Only students can view stats")
     
-    # Get all course classes student is enrolled in
-    course_classes = await db.course_classes.find({
-        "student_ids": user_id
-    }).to_list(length=None)
-    
-    if not course_classes:
-        return {
-            "overall_gpa": 0.0,
-            "total_credits": 0,
-            "passed_credits": 0,
-            "semester_gpas": []
-        }
-    
-    class_ids = [str(c["_id"]) for c in course_classes]
-    
-    # Get all grades
-    grades = await db.course_grades.find({
-        "course_class_id": {"$in": class_ids},
-        "student_id": user_id
-    }).to_list(length=None)
-    
-    # Calculate overall stats
-    total_weighted_score = 0.0
-    total_credits = 0
-    passed_credits = 0
-    semester_data = {}  # {semester: {weighted_score, credits}}
-    
-    for grade in grades:
-        course_class_id = grade["course_class_id"]
-        total_score = grade.get("total_score")
-        
-        if total_score is None:
-            continue
-        
-        # Find course class
-        course_class = next((c for c in course_classes if str(c["_id"]) == course_class_id), None)
-        if not course_class:
-            continue
-        
-        semester = course_class.get("semester", "Unknown")
-        
-        # Get course info
-        course_id = course_class.get("course_id")
-        if not course_id or not ObjectId.is_valid(course_id):
-            continue
-            
-        course = await db.courses.find_one({"_id": ObjectId(course_id)})
-        if not course:
-            continue
-        
-        credits = course.get("credits", 0)
-        if credits == 0:
-            continue
-        
-        # Convert to GPA 4.0
-        gpa_4 = convert_to_gpa_4(total_score)
-        
-        # Overall stats
-        total_weighted_score += gpa_4 * credits
-        total_credits += credits
-        
-        if is_passing_grade(total_score):
-            passed_credits += credits
-        
-        # Semester stats
-        if semester not in semester_data:
-            semester_data[semester] = {"weighted_score": 0.0, "credits": 0}
-        semester_data[semester]["weighted_score"] += gpa_4 * credits
-        semester_data[semester]["credits"] += credits
-    
-    # Calculate overall GPA
-    overall_gpa = round(total_weighted_score / total_credits, 2) if total_credits > 0 else 0.0
-    
-    # Calculate semester GPAs
-    semester_gpas = []
-    for semester, data in sorted(semester_data.items()):
-        sem_gpa = round(data["weighted_score"] / data["credits"], 2) if data["credits"] > 0 else 0.0
-        semester_gpas.append({
-            "semester": semester,
-            "gpa": sem_gpa,
-            "credits": data["credits"]
-        })
+    # Dùng chung bảng điểm đã cache với /transcript
+    transcript = await get_student_transcript(db, user_id)
     
     return {
-        "overall_gpa": overall_gpa,
-        "total_credits": total_credits,
-        "passed_credits": passed_credits,
-        "semester_gpas": semester_gpas
+        "overall_gpa": transcript["overall_gpa"],
+        "total_credits": transcript["total_credits"],
+        "passed_credits": transcript["passed_credits"],
+        "semester_gpas": [
+            {"semester": s["semester"], "gpa": s["gpa"], "credits": s["credits"]}
+            for s in transcript["semesters"]
+        ]
     }
 
 
@@ -276,16 +289,15 @@ async def get_course_class_grades(
     records = await db.course_grades.find({"course_class_id": class_id}).to_list(length=1000)
 
     # Populate student names
+    students = await get_loaders(request).users.load_many(r.get('student_id') for r in records)
     for r in records:
         r["_id"] = str(r["_id"])
         
         # Get student info
-        student_id = r.get('student_id')
-        if student_id and ObjectId.is_valid(student_id):
-            student = await db.users.find_one({"_id": ObjectId(student_id)})
-            if student:
-                r['student_name'] = student.get('full_name', 'Unknown')
-                r['student_mssv'] = student.get('mssv', 'N/A')
+        student = students.get(str(r.get('student_id')))
+        if student:
+            r['student_name'] = student.get('full_name', 'Unknown')
+            r['student_mssv'] = student.get('mssv', 'N/A')
     
     return records
 
@@ -302,13 +314,6 @@ async def save_course_grades(
     course_class_id = grades_request.course_class_id
     grades_data = grades_request.grades
     
-    # Debug logging
-    print(f"\n=== SAVE GRADES DEBUG ===")
-    print(f"Class ID: {course_class_id}")
-    print(f"Number of grades: {len(grades_data)}")
-    for i, grade in enumerate(grades_data[:3]):  # Print first 3
-        print(f"Grade {i}: student_id={grade.student_id}, TX1={grade.regular_score_1}, TX2={grade.regular_score_2}, CK={grade.final_score}")
-    
     if not ObjectId.is_valid(course_class_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid class ID")
     
@@ -325,28 +330,17 @@ async def save_course_grades(
     # Convert ObjectId to string for comparison
     student_ids_in_class = set(str(sid) if isinstance(sid, ObjectId) else sid for sid in class_obj.get("student_ids", []))
     
-    # Debug: Check student_ids format
-    print(f"\nStudent IDs in class (first 3): {list(student_ids_in_class)[:3]}")
-    print(f"Type of first student_id in class: {type(list(student_ids_in_class)[0]) if student_ids_in_class else 'empty'}")
-    
-    bulk_operations = []
-    success_count = 0
     errors = []
     
     # Get grade formula for calculating total score
-    course_id = class_obj.get("course_id")
-    w1 = 0.2
-    w2 = 0.3
-    w3 = 0.5
+    await course_catalog.ensure(db, [class_obj.get("course_id")])
+    w1, w2, w3 = course_catalog.grade_formula(class_obj.get("course_id"))
     
-    if course_id and ObjectId.is_valid(course_id):
-        course = await db.courses.find_one({"_id": ObjectId(course_id)})
-        if course:
-            formula = course.get("grade_formula", {})
-            w1 = formula.get("regular_weight_1", 0.2)
-            w2 = formula.get("regular_weight_2", 0.3)
-            w3 = formula.get("final_weight", 0.5)
+    # Validate scores
+    def validate_score(score):
+        return score if score is not None and 0 <= score <= 10 else None
     
+    valid_rows = []
     for grade_data in grades_data:
         student_id = grade_data.student_id
         
@@ -355,53 +349,194 @@ async def save_course_grades(
             errors.append(f"Student {student_id} not enrolled in this class")
             continue
         
-        # Validate scores
-        def validate_score(score):
-            return score if score is not None and 0 <= score <= 10 else None
-        
-        regular_score_1 = validate_score(grade_data.regular_score_1)
-        regular_score_2 = validate_score(grade_data.regular_score_2)
-        final_score = validate_score(grade_data.final_score)
-        
-        # Calculate total score with weight redistribution
-        from app.utils.grade_calculator import calculate_total_score
-        total_score = calculate_total_score(regular_score_1, regular_score_2, final_score, w1, w2, w3)
-        
-        # Create update operation
-        update_data = {
-            "course_class_id": course_class_id,
-            "student_id": student_id,
-            "regular_score_1": regular_score_1,
-            "regular_score_2": regular_score_2,
-            "final_score": final_score,
-            "total_score": total_score,
-            "updated_at": datetime.now()
-        }
-        
-        # Debug: Print update data for first student
-        if success_count == 0:
-            print(f"\nFirst update_data: {update_data}")
-        
-        op = UpdateOne(
-            filter={
-                "course_class_id": course_class_id,
-                "student_id": student_id
-            },
-            update={"$set": update_data},
-            upsert=True
-        )
-        bulk_operations.append(op)
-        success_count += 1
+        valid_rows.append((
+            student_id,
+            validate_score(grade_data.regular_score_1),
+            validate_score(grade_data.regular_score_2),
+            validate_score(grade_data.final_score)
+        ))
+    
+    # Calculate total score with weight redistribution cho cả lớp trong 1 lượt
+    score_columns = np.array([row[1:] for row in valid_rows], dtype=np.float64).reshape(-1, 3)
+    total_scores = calculate_total_score_array(score_columns[:, 0], score_columns[:, 1], score_columns[:, 2], w1, w2, w3)
+    
+    rows = [
+        (*row, None if math.isnan(total) else total)
+        for row, total in zip(valid_rows, total_scores.tolist())
+    ]
     
     # Execute bulk operations
-    if bulk_operations:
-        result = await db.course_grades.bulk_write(bulk_operations)
-        print(f"\nBulk write result: matched={result.matched_count}, modified={result.modified_count}, upserted={result.upserted_count}")
-    
-    print(f"=== END SAVE GRADES ===\n")
+    if rows:
+        await write_course_grades(db, class_obj, rows)
     
     return {
         "message": "Grades saved successfully",
-        "success_count": success_count,
+        "success_count": len(rows),
         "errors": errors
     }
+
+
+@router.post("/course-class/{class_id}/import")
+async def import_course_grades(
+    class_id: str,
+    request: Request,
+    file: UploadFile = File(...),
+    dry_run: bool = Query(False, description="Chỉ trả về báo cáo thay đổi, không ghi DB"),
+    current_user: dict = Depends(get_current_teacher)
+):
+    """
+    Giáo viên import điểm lớp học phần từ file CSV/Excel
+
+    Cột bắt buộc: mssv; cột điểm: tx1/regular_score_1, tx2/regular_score_2, ck/final_score.
+    Ô trống giữ nguyên điểm cũ. Trả về báo cáo thay đổi theo từng dòng.
+    """
+    db: AsyncDatabase = request.app.state.db
+
+    if not ObjectId.is_valid(class_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid class ID")
+
+    class_obj = await db.course_classes.find_one({
+        "_id": ObjectId(class_id),
+        "teacher_id": str(current_user["_id"])
+    })
+    if not class_obj:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found or access denied")
+
+    try:
+        rows = iter_table_rows(file.file, file.filename)
+        return await GradeImport(db, class_obj).run(rows, dry_run=dry_run)
+    except UnsupportedFileType as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV file must be UTF-8 encoded")
+
+
+EXPORT_BATCH_SIZE = 500
+
+STUDENT_LOOKUP = {"$lookup": {
+    "from": "users",
+    "let": {"student_oid": _to_object_id("$student_id")},
+    "pipeline": [
+        {"$match": {"$expr": {"$eq": ["$_id", "$$student_oid"]}}},
+        {"$project": {"mssv": 1, "full_name": 1}}
+    ],
+    "as": "student"
+}}
+
+
+def _gpa_4(total):
+    return convert_to_gpa_4(total) if total is not None else None
+
+
+async def iter_course_class_export(db: AsyncDatabase, class_id: str):
+    """Các dòng bảng điểm lớp học phần, đọc dần từ cursor (theo index course_class_id, student_id)"""
+    cursor = await db.course_grades.aggregate([
+        {"$match": {"course_class_id": class_id}},
+        {"$sort": {"student_id": 1}},
+        STUDENT_LOOKUP,
+        {"$unwind": {"path": "$student", "preserveNullAndEmptyArrays": True}},
+    ], batchSize=EXPORT_BATCH_SIZE)
+    async for g in cursor:
+        student = g.get("student") or {}
+        yield [
+            student.get("mssv"), student.get("full_name"),
+            g.get("regular_score_1"), g.get("regular_score_2"), g.get("final_score"),
+            g.get("total_score"), _gpa_4(g.get("total_score"))
+        ]
+
+
+async def iter_transcript_export(db: AsyncDatabase, student_ids: list[str], semester: str | None = None):
+    """Các dòng bảng điểm của nhiều sinh viên (lớp chính quy), đọc dần từ cursor"""
+    # Nạp trước mọi môn học các sinh viên đã học bằng 1 truy vấn, trong vòng lặp chỉ tra bộ nhớ
+    class_filter = {"student_ids": {"$in": student_ids}}
+    if semester:
+        class_filter["semester"] = semester
+    await course_catalog.ensure(db, await db.course_classes.distinct("course_id", class_filter))
+
+    pipeline = [
+        {"$match": {"student_id": {"$in": student_ids}}},
+        {"$sort": {"student_id": 1}},
+        {"$lookup": {
+            "from": "course_classes",
+            "let": {"class_oid": _to_object_id("$course_class_id")},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$class_oid"]}}},
+                {"$project": {"semester": 1, "class_code": 1, "course_id": 1}}
+            ],
+            "as": "course_class"
+        }},
+        {"$unwind": {"path": "$course_class", "preserveNullAndEmptyArrays": True}},
+    ]
+    if semester:
+        pipeline.append({"$match": {"course_class.semester": semester}})
+    pipeline += [STUDENT_LOOKUP, {"$unwind": {"path": "$student", "preserveNullAndEmptyArrays": True}}]
+
+    cursor = await db.course_grades.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE)
+    async for g in cursor:
+        student = g.get("student") or {}
+        course_class = g.get("course_class") or {}
+        course = course_catalog.get(course_class.get("course_id")) or {}
+        yield [
+            student.get("mssv"), student.get("full_name"), course_class.get("semester"),
+            course.get("code"), course.get("name"), course.get("credits"), course_class.get("class_code"),
+            g.get("regular_score_1"), g.get("regular_score_2"), g.get("final_score"),
+            g.get("total_score"), _gpa_4(g.get("total_score"))
+        ]
+
+
+@router.get("/course-class/{class_id}/export")
+async def export_course_class_grades(
+    class_id: str,
+    request: Request,
+    format: ExportFormat = Query("xlsx"),
+    current_user: dict = Depends(get_current_teacher)
+):
+    """Giáo viên tải bảng điểm lớp học phần (CSV/Excel)"""
+    db: AsyncDatabase = request.app.state.db
+
+    if not ObjectId.is_valid(class_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid class ID")
+
+    class_obj = await db.course_classes.find_one(
+        {"_id": ObjectId(class_id), "teacher_id": str(current_user["_id"])},
+        {"class_code": 1}
+    )
+    if not class_obj:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    header = ["MSSV", "Họ tên", "TX1", "TX2", "CK", "Tổng kết", "Hệ 4"]
+    return stream_table(
+        format, f"bang_diem_{class_obj.get('class_code') or class_id}", header,
+        iter_course_class_export(db, class_id), title="Bảng điểm"
+    )
+
+
+@router.get("/administrative-class/{class_id}/export")
+async def export_administrative_class_transcripts(
+    class_id: str,
+    request: Request,
+    format: ExportFormat = Query("xlsx"),
+    semester: str | None = None,
+    current_user: dict = Depends(get_current_cvht)
+):
+    """CVHT tải bảng điểm tất cả sinh viên của lớp chính quy (CSV/Excel)"""
+    db: AsyncDatabase = request.app.state.db
+
+    if not ObjectId.is_valid(class_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid class ID")
+
+    admin_class = await db.administrative_classes.find_one(
+        {"_id": ObjectId(class_id), "advisor_id": str(current_user["_id"])},
+        {"name": 1, "student_ids": 1}
+    )
+    if not admin_class:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    student_ids = [str(sid) for sid in admin_class.get("student_ids", [])]
+    header = ["MSSV", "Họ tên", "Học kỳ", "Mã môn", "Tên môn", "Tín chỉ", "Lớp học phần",
+              "TX1", "TX2", "CK", "Tổng kết", "Hệ 4"]
+    filename = f"bang_diem_{admin_class.get('name') or class_id}" + (f"_{semester}" if semester else "")
+    return stream_table(
+        format, filename, header,
+        iter_transcript_export(db, student_ids, semester), title="Bảng điểm"
+    )
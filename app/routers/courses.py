@@ -10,6 +10,9 @@ from dotenv import load_dotenv
 from app.model.mcourse import CourseCreate, CourseUpdate, CourseResponse, CourseClassCreate, CourseClassResponse
 from app.model.muser import UserResponse
 from app.dependencies import get_current_admin, get_current_teacher, get_current_user
+from app.core.cache import grade_versions
+from app.core.catalog import course_catalog
+from app.core.grade_events import GradeChange, grade_events
 
 load_dotenv()
 
@@ -38,6 +41,7 @@ async def create_course(
     new_course = await db.courses.insert_one(course_dict)
     created_course = await db.courses.find_one({"_id": new_course.inserted_id})
     created_course["_id"] = str(created_course["_id"])
+    await course_catalog.refresh(db, created_course["_id"])
 
     return created_course
 
@@ -95,7 +99,7 @@ async def create_course_class(
     if not ObjectId.is_valid(course_class_in.course_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid course ID")
 
-    course = await db.courses.find_one({"_id": ObjectId(course_class_in.course_id)})
+    course = await course_catalog.fetch(db, course_class_in.course_id)
     if not course:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Course not found")
 
@@ -139,17 +143,16 @@ async def get_my_course_classes(
     classes = await db.course_classes.find(filter_query).to_list(length=None)
 
     # Populate course name
+    await course_catalog.ensure(db, (c.get("course_id") for c in classes))
     for c in classes:
         c["_id"] = str(c["_id"])
         
         # Get course info
-        course_id = c.get("course_id")
-        if course_id and ObjectId.is_valid(course_id):
-            course = await db.courses.find_one({"_id": ObjectId(course_id)})
-            if course:
-                c["course_name"] = course.get("name", "")
-                c["course_code"] = course.get("code", "")
-                c["credits"] = course.get("credits", 0)
+        course = course_catalog.get(c.get("course_id"))
+        if course:
+            c["course_name"] = course["name"]
+            c["course_code"] = course["code"]
+            c["credits"] = course["credits"]
     
     return classes
 
@@ -230,10 +233,15 @@ async def remove_student_from_course_class(
     if not class_obj:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
     
-    await db.course_classes.update_one(
+    result = await db.course_classes.update_one(
         {"_id": ObjectId(class_id)},
         {"$pull": {"student_ids": student_id}}
     )
+    await grade_versions.bump(db, student_id)
+
+    # Điểm của lớp này không còn được tính vào tổng kết học kỳ
+    if result.modified_count:
+        grade_events.emit(GradeChange(student_id, class_obj.get("semester")))
 
     return {"message": "Student removed from course class"}
 
@@ -261,6 +269,18 @@ async def update_course(
         update_data["grade_formula"] = course_in.grade_formula.model_dump()
     
     await db.courses.update_one({"_id": ObjectId(course_id)}, {"$set": update_data})
+    # Tăng version danh mục -> bảng điểm cache theo tín chỉ/tên môn cũ hết hiệu lực
+    await course_catalog.refresh(db, course_id)
+
+    # Đổi tín chỉ: tính lại tổng kết của mọi sinh viên học môn này
+    if course.get("credits") != course_in.credits:
+        classes = await db.course_classes.find(
+            {"course_id": course_id}, {"semester": 1, "student_ids": 1}
+        ).to_list(length=None)
+        grade_events.emit(*(
+            GradeChange(student_id, c.get("semester"))
+            for c in classes for student_id in c.get("student_ids", [])
+        ))
     
     updated_course = await db.courses.find_one({"_id": ObjectId(course_id)})
     updated_course["_id"] = str(updated_course["_id"])
@@ -289,5 +309,6 @@ async def delete_course(
     
     # Optionally: Delete related course_classes
     await db.course_classes.delete_many({"course_id": course_id})
+    await course_catalog.refresh(db, course_id)
     
     return {"message": "Course deleted successfully"}
@@ -3,29 +3,33 @@ from pymongo.asynchronous.database import AsyncDatabase
 from bson import ObjectId
 from datetime import datetime
 from dotenv import load_dotenv
+import base64
+import json
 import os
 
-from app.model.mpost import PostCreate, PostResponse, CommentCreate, PostUpdate, PostType
+from app.model.mpost import PostCreate, PostResponse, PostPage, CommentCreate, PostUpdate, PostType
 from app.dependencies import get_current_user
+from app.db.loaders import Loaders, get_loaders
 
 load_dotenv()
 
 router = APIRouter(prefix=os.getenv("API_V1_STR","/api/v1") + "/posts", tags=['Forum'])
 
 
-async def populate_post_user_info(db: AsyncDatabase, post: dict):
-    """Populate user info vào post"""
-    # Get author info
-    author_id = post.get('author_id')
-    
-    if author_id:
-        try:
-            # Ensure author_id is ObjectId
-            if not isinstance(author_id, ObjectId):
-                author_id = ObjectId(author_id)
-            
-            author = await db.users.find_one({"_id": author_id})
-            
+async def populate_posts_user_info(loaders: Loaders, posts: list[dict]):
+    """Populate user info (tác giả + người comment) cho danh sách post bằng 1 truy vấn"""
+    user_ids = []
+    for post in posts:
+        user_ids.append(post.get('author_id'))
+        user_ids.extend(c.get('user_id') for c in post.get('comments', []))
+
+    users = await loaders.users.load_many(user_ids)
+
+    for post in posts:
+        # Get author info
+        author_id = post.get('author_id')
+        if author_id:
+            author = users.get(str(author_id))
             if author:
                 post['author_name'] = author.get('full_name', 'Unknown')
                 post['author_role'] = author.get('role', '')
@@ -33,29 +37,76 @@ async def populate_post_user_info(db: AsyncDatabase, post: dict):
                 print(f"WARNING Backend: User not found for author_id={author_id}")
                 post['author_name'] = 'Unknown User'
                 post['author_role'] = ''
-        except Exception as e:
-            print(f"ERROR Backend: Error populating author: {e}")
-            import traceback
-            traceback.print_exc()
-            post['author_name'] = 'Unknown User'
-            post['author_role'] = ''
-    
-    # Get commenter info
-    for comment in post.get('comments', []):
-        commenter_id = comment.get('user_id')
-        if commenter_id:
-            try:
-                if not isinstance(commenter_id, ObjectId):
-                    commenter_id = ObjectId(commenter_id)
-                
-                user = await db.users.find_one({"_id": commenter_id})
-                if user:
-                    comment['user_name'] = user.get('full_name', 'Unknown')
-            except Exception as e:
-                print(f"Error populating commenter: {e}")
-                comment['user_name'] = 'Unknown'
-    
-    return post
+
+        # Get commenter info
+        for comment in post.get('comments', []):
+            commenter = users.get(str(comment.get('user_id')))
+            if commenter:
+                comment['user_name'] = commenter.get('full_name', 'Unknown')
+
+    return posts
+
+
+def encode_cursor(post: dict) -> str:
+    """Cursor mờ (opaque) từ (created_at, _id) của bài cuối trang"""
+    raw = json.dumps({"t": post["created_at"].isoformat(), "id": str(post["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(data["t"]), ObjectId(data["id"])
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def get_class_posts_page(
+    request: Request,
+    class_id: str,
+    post_type: PostType,
+    user_id: str,
+    cursor: str | None,
+    limit: int,
+    comment_limit: int
+) -> dict:
+    """Lấy 1 trang bài viết (mới nhất trước) theo keyset (created_at, _id)"""
+    db: AsyncDatabase = request.app.state.db
+
+    match = {"class_id": class_id, "post_type": post_type}
+    if cursor:
+        created_at, post_oid = decode_cursor(cursor)
+        match["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": post_oid}}
+        ]
+
+    posts = await db.posts.aggregate([
+        {"$match": match},
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {"$project": {
+            "post_type": 1,
+            "class_id": 1,
+            "author_id": 1,
+            "content": 1,
+            "created_at": 1,
+            "updated_at": 1,
+            "like_count": {"$size": {"$ifNull": ["$likes", []]}},
+            "is_liked": {"$in": [user_id, {"$ifNull": ["$likes", []]}]},
+            "comment_count": {"$size": {"$ifNull": ["$comments", []]}},
+            "comments": {"$slice": [{"$ifNull": ["$comments", []]}, -comment_limit]} if comment_limit else []
+        }}
+    ]).to_list(length=limit + 1)
+
+    next_cursor = encode_cursor(posts[limit - 1]) if len(posts) > limit else None
+    posts = posts[:limit]
+
+    for p in posts:
+        p["_id"] = str(p["_id"])
+    await populate_posts_user_info(get_loaders(request), posts)
+
+    return {"posts": posts, "next_cursor": next_cursor}
 
 
 async def check_administrative_class_membership(db: AsyncDatabase, class_id: str, user_id: str):
@@ -121,30 +172,22 @@ async def create_administrative_post(
     return created_post
 
 
-@router.get("/administrative-classes/{class_id}/posts", response_model=list[PostResponse])
+@router.get("/administrative-classes/{class_id}/posts", response_model=PostPage)
 async def get_administrative_class_posts(
     class_id: str,
     request: Request,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    comments: int = Query(3, ge=0, le=20),
     current_user: dict = Depends(get_current_user)
 ):
-    """Lấy bài đăng của lớp chính quy"""
+    """Lấy bài đăng của lớp chính quy (mỗi bài kèm `comments` comment mới nhất)"""
     db: AsyncDatabase = request.app.state.db
     user_id = str(current_user["_id"])
     
     await check_administrative_class_membership(db, class_id, user_id)
     
-    posts = await db.posts.find({
-        "class_id": class_id,
-        "post_type": PostType.ADMINISTRATIVE
-    }).sort("created_at", -1).skip(skip).limit(limit).to_list(length=limit)
-    
-    for p in posts:
-        p["_id"] = str(p["_id"])
-        await populate_post_user_info(db, p)
-        
-    return posts
+    return await get_class_posts_page(request, class_id, PostType.ADMINISTRATIVE, user_id, cursor, limit, comments)
 
 
 # ============ COURSE CLASS POSTS (TEACHER) ============
@@ -180,30 +223,22 @@ async def create_course_post(
     return created_post
 
 
-@router.get("/course-classes/{class_id}/posts", response_model=list[PostResponse])
+@router.get("/course-classes/{class_id}/posts", response_model=PostPage)
 async def get_course_class_posts(
     class_id: str,
     request: Request,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    comments: int = Query(3, ge=0, le=20),
     current_user: dict = Depends(get_current_user)
 ):
-    """Lấy bài đăng của lớp học phần"""
+    """Lấy bài đăng của lớp học phần (mỗi bài kèm `comments` comment mới nhất)"""
     db: AsyncDatabase = request.app.state.db
     user_id = str(current_user["_id"])
     
     await check_course_class_membership(db, class_id, user_id)
     
-    posts = await db.posts.find({
-        "class_id": class_id,
-        "post_type": PostType.COURSE
-    }).sort("created_at", -1).skip(skip).limit(limit).to_list(length=limit)
-    
-    for p in posts:
-        p["_id"] = str(p["_id"])
-        await populate_post_user_info(db, p)
-        
-    return posts
+    return await get_class_posts_page(request, class_id, PostType.COURSE, user_id, cursor, limit, comments)
 
 
 # ============ COMMON POST OPERATIONS ============
@@ -284,6 +319,7 @@ async def add_comment(
 
     updated_post = await db.posts.find_one({"_id": ObjectId(post_id)})
     updated_post["_id"] = str(updated_post["_id"])
+    await populate_posts_user_info(get_loaders(request), [updated_post])
     
     return updated_post
 
@@ -313,6 +349,7 @@ async def get_post_detail(
         await check_course_class_membership(db, post['class_id'], user_id)
 
     post['_id'] = str(post['_id'])
+    await populate_posts_user_info(get_loaders(request), [post])
     return post
 
 
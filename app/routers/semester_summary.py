@@ -7,78 +7,14 @@ from dotenv import load_dotenv
 
 from app.model.mgrade import SemesterSummaryResponse, SemesterSummaryUpdate
 from app.dependencies import get_current_cvht, get_current_user
+from app.db.loaders import get_loaders
+from app.core.summary_engine import recalculate_semester_summaries
 
 load_dotenv()
 
 router = APIRouter(prefix=os.getenv("API_V1_STR", "/api/v1") + "/semester-summary", tags=['Semester Summary (CVHT)'])
 
 
-from app.utils.grade_calculator import convert_to_gpa_4, is_passing_grade
-
-
-async def calculate_semester_gpa(db: AsyncDatabase, student_id: str, semester: str) -> dict:
-    """Tính GPA học kỳ từ điểm các môn"""
-    
-    # Get all course classes in this semester
-    course_classes = await db.course_classes.find({
-        "semester": semester,
-        "student_ids": student_id
-    }).to_list(length=None)
-    
-    if not course_classes:
-        return {
-            "gpa": 0.0,
-            "credits_earned": 0,
-            "credits_passed": 0
-        }
-    
-    class_ids = [str(c["_id"]) for c in course_classes]
-    
-    # Get grades for these classes
-    grades = await db.course_grades.find({
-        "course_class_id": {"$in": class_ids},
-        "student_id": student_id
-    }).to_list(length=None)
-    
-    total_weighted_score = 0.0
-    total_credits = 0
-    credits_passed = 0
-    
-    for grade in grades:
-        course_class_id = grade["course_class_id"]
-        
-        # Find course class to get course_id
-        course_class = next((c for c in course_classes if str(c["_id"]) == course_class_id), None)
-        if not course_class:
-            continue
-            
-        # Get course info to get credits
-        course = await db.courses.find_one({"_id": ObjectId(course_class["course_id"])})
-        if not course:
-            continue
-            
-        credits = course.get("credits", 0)
-        total_score = grade.get("total_score")
-        
-        if total_score is not None:
-            # Convert to 4.0 scale
-            score_4 = convert_to_gpa_4(total_score)
-            total_weighted_score += score_4 * credits
-            total_credits += credits
-            
-            # Check if passed (>= 4.0 in 10 scale)
-            if is_passing_grade(total_score):
-                credits_passed += credits
-    
-    gpa = (total_weighted_score / total_credits) if total_credits > 0 else 0.0
-    
-    return {
-        "gpa": round(gpa, 2),
-        "credits_earned": total_credits,
-        "credits_passed": credits_passed
-    }
-
-
 @router.post("/calculate/{student_id}")
 async def calculate_and_save_semester_summary(
     student_id: str,
@@ -106,33 +42,12 @@ async def calculate_and_save_semester_summary(
         if not admin_class:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Student not in your class")
     
-    # Calculate GPA
-    result = await calculate_semester_gpa(db, student_id, semester)
-    
-    # Save to database
-    await db.semester_summaries.update_one(
-        {
-            "student_id": student_id,
-            "semester": semester
-        },
-        {
-            "$set": {
-                "gpa": result["gpa"],
-                "credits_earned": result["credits_earned"],
-                "credits_passed": result["credits_passed"],
-                "updated_at": datetime.now()
-            },
-            "$setOnInsert": {
-                "tuition_debt": False,
-                "academic_warning": 0
-            }
-        },
-        upsert=True
-    )
+    # Calculate GPA & save to database
+    summary = await recalculate_semester_summaries(db, [student_id], semester)
     
     return {
         "message": "Semester summary calculated",
-        "data": result
+        "data": summary["results"][student_id]
     }
 
 
@@ -162,34 +77,12 @@ async def calculate_class_semester_summary(
     if not student_ids:
         return {"message": "No students in class", "processed": 0}
     
-    processed = 0
-    for student_id in student_ids:
-        result = await calculate_semester_gpa(db, student_id, semester)
-        
-        await db.semester_summaries.update_one(
-            {
-                "student_id": student_id,
-                "semester": semester
-            },
-            {
-                "$set": {
-                    "gpa": result["gpa"],
-                    "credits_earned": result["credits_earned"],
-                    "credits_passed": result["credits_passed"],
-                    "updated_at": datetime.now()
-                },
-                "$setOnInsert": {
-                    "tuition_debt": False,
-                    "academic_warning": 0
-                }
-            },
-            upsert=True
-        )
-        processed += 1
+    summary = await recalculate_semester_summaries(db, student_ids, semester)
     
     return {
         "message": "Class semester summary calculated",
-        "processed": processed
+        "processed": summary["processed"],
+        "timings_ms": summary["timings_ms"]
     }
 
 
@@ -251,16 +144,15 @@ async def get_class_semester_summary(
     }).to_list(length=1000)
     
     # Populate student names
+    students = await get_loaders(request).users.load_many(s.get("student_id") for s in summaries)
     for s in summaries:
         s["_id"] = str(s["_id"])
         
         # Get student info
-        student_id = s.get("student_id")
-        if student_id and ObjectId.is_valid(student_id):
-            student = await db.users.find_one({"_id": ObjectId(student_id)})
-            if student:
-                s["student_name"] = student.get("full_name", "Unknown")
-                s["student_mssv"] = student.get("mssv", "")
+        student = students.get(str(s.get("student_id")))
+        if student:
+            s["student_name"] = student.get("full_name", "Unknown")
+            s["student_mssv"] = student.get("mssv", "")
     
     return summaries
 
@@ -5,12 +5,116 @@ import os
 from dotenv import load_dotenv
 
 from app.model.mstats import DashboardStats, GPADistribution
-from app.dependencies import get_current_cvht
+from app.dependencies import get_current_cvht, get_current_admin
 
 load_dotenv()
 
 router = APIRouter(prefix=os.getenv("API_V1_STR", "/api/v1") + "/stats", tags=['Statistics (CVHT)'])
 
+# Ngưỡng xếp loại theo GPA trung bình (cận dưới, loại), dưới 2.0 là "weak"
+GPA_BANDS = [(3.6, "excellent"), (3.2, "good"), (2.5, "fair"), (2.0, "average")]
+
+
+def build_class_stats_pipeline(student_ids: list[str]) -> list[dict]:
+    """Pipeline thống kê 1 lớp: GPA trung bình từng SV, phân bố, cảnh báo, nợ học phí"""
+    boundaries = sorted(lower for lower, _ in GPA_BANDS) + [float("inf")]
+
+    return [
+        {"$match": {"student_id": {"$in": student_ids}}},
+        {"$sort": {"student_id": 1, "semester": 1}},
+        {"$group": {
+            "_id": "$student_id",
+            "avg_gpa": {"$avg": "$gpa"},
+            # Cảnh báo và nợ học phí lấy theo học kỳ mới nhất
+            "academic_warning": {"$last": "$academic_warning"},
+            "tuition_debt": {"$last": "$tuition_debt"}
+        }},
+        {"$facet": {
+            "distribution": [
+                {"$bucket": {
+                    "groupBy": "$avg_gpa",
+                    "boundaries": boundaries,
+                    "default": "weak",
+                    "output": {"count": {"$sum": 1}}
+                }}
+            ],
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "students": {"$sum": 1},
+                    "warning_count": {"$sum": {"$cond": [{"$gt": [{"$ifNull": ["$academic_warning", 0]}, 0]}, 1, 0]}},
+                    "debt_count": {"$sum": {"$cond": [{"$eq": ["$tuition_debt", True]}, 1, 0]}}
+                }}
+            ]
+        }}
+    ]
+
+
+def build_university_stats_pipeline() -> list[dict]:
+    """Pipeline thống kê tất cả lớp chính quy trong 1 lần gọi"""
+    has_student = {"$eq": [{"$type": "$student_id"}, "string"]}
+
+    band_branches = [
+        {"case": {"$gte": ["$avg_gpa", lower]}, "then": band}
+        for lower, band in GPA_BANDS
+    ]
+
+    band_counts = {
+        band: {"$sum": {"$cond": [{"$and": [has_student, {"$eq": ["$band", band]}]}, 1, 0]}}
+        for band in [band for _, band in GPA_BANDS] + ["weak"]
+    }
+
+    return [
+        {"$project": {"name": 1, "student_ids": 1}},
+        {"$unwind": {"path": "$student_ids", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {
+            "from": "semester_summaries",
+            "localField": "student_ids",
+            "foreignField": "student_id",
+            "as": "summaries"
+        }},
+        {"$project": {
+            "name": 1,
+            "student_id": "$student_ids",
+            "avg_gpa": {"$avg": "$summaries.gpa"},
+            # Tổng kết có học kỳ lớn nhất
+            "latest": {"$reduce": {
+                "input": "$summaries",
+                "initialValue": None,
+                "in": {"$cond": [
+                    {"$or": [{"$eq": ["$$value", None]}, {"$gte": ["$$this.semester", "$$value.semester"]}]},
+                    "$$this",
+                    "$$value"
+                ]}
+            }}
+        }},
+        {"$project": {
+            "name": 1,
+            "student_id": 1,
+            "band": {"$switch": {"branches": band_branches, "default": "weak"}},
+            "has_warning": {"$gt": [{"$ifNull": ["$latest.academic_warning", 0]}, 0]},
+            "has_debt": {"$eq": ["$latest.tuition_debt", True]}
+        }},
+        {"$group": {
+            "_id": "$_id",
+            "class_name": {"$first": "$name"},
+            "total_students": {"$sum": {"$cond": [has_student, 1, 0]}},
+            "warning_count": {"$sum": {"$cond": ["$has_warning", 1, 0]}},
+            "debt_count": {"$sum": {"$cond": ["$has_debt", 1, 0]}},
+            **band_counts
+        }},
+        {"$sort": {"class_name": 1}}
+    ]
+
+
+def _band_for_bucket(bucket_id) -> str:
+    """Đổi _id của $bucket (cận dưới) sang tên loại"""
+    for lower, band in GPA_BANDS:
+        if bucket_id == lower:
+            return band
+    return "weak"
+
+
 @router.get("/dashboard/{class_id}", response_model=DashboardStats)
 async def get_dashboard_stats(
     class_id: str,
@@ -39,45 +143,54 @@ async def get_dashboard_stats(
     stats = DashboardStats(
         class_id=class_id,
         semester=semester,
+        class_name=admin_class.get("name"),
         gpa_distribution=GPADistribution()
     )
 
     stats.total_students = len(student_ids)
+    if not student_ids:
+        return stats
+
+    result = await db.semester_summaries.aggregate(build_class_stats_pipeline(student_ids)).to_list(length=1)
+    facet = result[0] if result else {"distribution": [], "totals": []}
+
+    for bucket in facet["distribution"]:
+        band = _band_for_bucket(bucket["_id"])
+        setattr(stats.gpa_distribution, band, getattr(stats.gpa_distribution, band) + bucket["count"])
 
-    # Calculate average GPA for each student across all semesters
-    for student_id in student_ids:
-        # Get all semester summaries for this student
-        summaries = await db.semester_summaries.find({
-            'student_id': student_id
-        }).to_list(length=None)
-        
-        if not summaries:
-            # No data, count as weak
-            stats.gpa_distribution.weak += 1
-            continue
-        
-        # Calculate average GPA across all semesters
-        total_gpa = sum(s.get('gpa', 0.0) for s in summaries)
-        avg_gpa = total_gpa / len(summaries)
-        
-        # Check warnings and debt from latest semester
-        latest_summary = summaries[-1] if summaries else None
-        if latest_summary:
-            if latest_summary.get('academic_warning', 0) > 0:
-                stats.warning_count += 1
-            if latest_summary.get('tuition_debt', False):
-                stats.debt_count += 1
-        
-        # Classify by average GPA
-        if avg_gpa >= 3.6:
-            stats.gpa_distribution.excellent += 1
-        elif avg_gpa >= 3.2:
-            stats.gpa_distribution.good += 1
-        elif avg_gpa >= 2.5:
-            stats.gpa_distribution.fair += 1
-        elif avg_gpa >= 2.0:
-            stats.gpa_distribution.average += 1
-        else:
-            stats.gpa_distribution.weak += 1
+    students_with_data = 0
+    if facet["totals"]:
+        totals = facet["totals"][0]
+        students_with_data = totals["students"]
+        stats.warning_count = totals["warning_count"]
+        stats.debt_count = totals["debt_count"]
+
+    # Sinh viên chưa có tổng kết nào được tính là "weak"
+    stats.gpa_distribution.weak += stats.total_students - students_with_data
 
     return stats
+
+
+@router.get("/university", response_model=list[DashboardStats])
+async def get_university_stats(
+    semester: str,
+    request: Request,
+    current_user: dict = Depends(get_current_admin)
+) -> list[DashboardStats]:
+    """Admin xem thống kê tất cả lớp chính quy (1 aggregation)"""
+    db: AsyncDatabase = request.app.state.db
+
+    rows = await db.administrative_classes.aggregate(build_university_stats_pipeline()).to_list(length=None)
+
+    return [
+        DashboardStats(
+            class_id=str(row["_id"]),
+            class_name=row.get("class_name"),
+            semester=semester,
+            total_students=row["total_students"],
+            warning_count=row["warning_count"],
+            debt_count=row["debt_count"],
+            gpa_distribution=GPADistribution(**{band: row[band] for band in GPADistribution.model_fields})
+        )
+        for row in rows
+    ]
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, Request
+from pymongo.asynchronous.database import AsyncDatabase
+import os
+from dotenv import load_dotenv
+
+from app.db.indexes import ensure_indexes, get_index_drift
+from app.dependencies import get_current_admin, user_cache
+from app.routers.course_grades import transcript_cache
+from app.core.grade_events import grade_events
+from app.core.catalog import course_catalog
+from app.core.socket import manager
+from app.core.message_writer import message_writer
+from app.core.security import password_service
+
+load_dotenv()
+
+router = APIRouter(prefix=os.getenv("API_V1_STR", "/api/v1") + "/system", tags=['System (Admin)'])
+
+
+@router.get("/indexes")
+async def get_indexes_status(
+    request: Request,
+    current_user: dict = Depends(get_current_admin)
+):
+    """Admin xem trạng thái index so với registry"""
+    db: AsyncDatabase = request.app.state.db
+
+    drift = await get_index_drift(db)
+    drift["startup_report"] = getattr(request.app.state, "index_report", None)
+    return drift
+
+
+@router.post("/indexes/sync")
+async def sync_indexes(
+    request: Request,
+    current_user: dict = Depends(get_current_admin)
+):
+    """Admin tạo lại các index còn thiếu trong registry"""
+    db: AsyncDatabase = request.app.state.db
+
+    report = await ensure_indexes(db)
+    request.app.state.index_report = report
+    report["drift"] = await get_index_drift(db)
+    return report
+
+
+@router.get("/metrics")
+async def get_metrics(request: Request, current_user: dict = Depends(get_current_admin)):
+    """Admin xem thống kê cache và các tác vụ nền"""
+    ai = request.app.state.ai
+    ai_cache = request.app.state.ai_cache
+    return {
+        "ai": ai.metrics() if ai else None,
+        "caches": {
+            "ai_answers": ai_cache.stats() if ai_cache else None,
+            "users": user_cache.stats(),
+            "transcripts": transcript_cache.stats()
+        },
+        "course_catalog": {"size": len(course_catalog), "version": course_catalog.version},
+        "grade_events": grade_events.stats,
+        "websockets": manager.metrics(),
+        "chat_writes": message_writer.stats,
+        "passwords": password_service.metrics()
+    }
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, Request, status, HTTPException
+from fastapi import APIRouter, Depends, Request, status, HTTPException, UploadFile, File, Form
 from pymongo.asynchronous.database import AsyncDatabase
 from bson import ObjectId
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from dotenv import load_dotenv
 import os
-import bcrypt
 
 from app.model.muser import UserResponse
-from app.dependencies import get_current_user, get_current_admin
+from app.dependencies import get_current_user, get_current_admin, invalidate_user
+from app.core.security import password_service, PasswordServiceBusy
+from app.core.user_import import UserImport, ClassNotFound
+from app.utils.tabular import iter_table_rows, UnsupportedFileType
 
 # Load .env file
 load_dotenv()
@@ -53,7 +55,11 @@ async def create_user(
     
     # Hash password
     password = user_data.password if user_data.password else f"{user_data.mssv}@123"
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        hashed_password = await password_service.hash(password)
+    except PasswordServiceBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is busy, please try again",
+                            headers={"Retry-After": "1"})
     
     # Create user document
     new_user = {
@@ -96,6 +102,36 @@ async def create_user(
     return new_user
 
 
+@router.post("/import")
+async def import_users(
+    request: Request,
+    file: UploadFile = File(...),
+    administrative_class_id: str | None = Form(None),
+    current_user: dict = Depends(get_current_admin)
+):
+    """
+    ADMIN import user hàng loạt từ .csv/.xlsx
+
+    Cột: mssv, email (bắt buộc), full_name, phone, role (mặc định STUDENT),
+    password (mặc định <mssv>@123), administrative_class_id hoặc class_name.
+    administrative_class_id gửi kèm form là lớp mặc định cho sinh viên không ghi lớp.
+    """
+    db: AsyncDatabase = request.app.state.db
+
+    try:
+        rows = iter_table_rows(file.file, file.filename)
+        return await UserImport(db, default_class_id=administrative_class_id).run(rows)
+    except UnsupportedFileType as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV file must be UTF-8 encoded")
+    except ClassNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except PasswordServiceBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is busy, please try again",
+                            headers={"Retry-After": "5"})
+
+
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(current_user: dict = Depends(get_current_user)):
     current_user['_id'] = str(current_user["_id"])
@@ -166,6 +202,8 @@ async def update_user(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     updated_user = await db.users.find_one({'_id': ObjectId(user_id)})
+    # Sửa thông tin hoặc khóa tài khoản (is_active=False) có hiệu lực ngay
+    invalidate_user(mssv=updated_user.get("mssv"))
     updated_user['_id'] = str(updated_user['_id'])
     if "password" in updated_user:
         del updated_user["password"]
@@ -179,10 +217,11 @@ async def delete_user(
     current_user: dict = Depends(get_current_admin)
 ):
     db: AsyncDatabase = request.app.state.db
-    result = await db.users.delete_one({"_id": ObjectId(user_id)})
+    deleted_user = await db.users.find_one_and_delete({"_id": ObjectId(user_id)}, projection={"mssv": 1})
     
-    if result.deleted_count == 0:
+    if deleted_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(mssv=deleted_user.get("mssv"))
         
     return {"message": f"User {user_id} has been deleted"}
 
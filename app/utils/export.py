@@ -0,0 +1,77 @@
+"""
+Xuất bảng dạng stream (CSV/Excel)
+
+Các dòng đến từ async iterator (thường là cursor MongoDB), không gom cả bảng
+trong bộ nhớ:
+- CSV: gửi header ngay, sau đó cứ CSV_FLUSH_ROWS dòng gửi 1 lần
+- Excel: openpyxl write-only ghi từng dòng ra file tạm; file .xlsx (zip) chỉ
+  hoàn chỉnh khi lưu xong nên được gửi theo từng đoạn sau khi ghi hết dòng
+"""
+import csv
+import io
+import tempfile
+from typing import AsyncIterator, Literal
+from urllib.parse import quote
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+ExportFormat = Literal["csv", "xlsx"]
+
+CSV_FLUSH_ROWS = 500
+XLSX_CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+async def csv_chunks(header: list[str], rows: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM để Excel mở đúng tiếng Việt
+    buffer.write("\ufeff")
+    writer.writerow(header)
+
+    count = 0
+    async for row in rows:
+        if count % CSV_FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        writer.writerow(row)
+        count += 1
+    yield buffer.getvalue().encode("utf-8")
+
+
+async def xlsx_chunks(header: list[str], rows: AsyncIterator[list], title: str = "Sheet1") -> AsyncIterator[bytes]:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    async for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as file:
+        await run_in_threadpool(workbook.save, file)
+        file.seek(0)
+        while chunk := await run_in_threadpool(file.read, XLSX_CHUNK_SIZE):
+            yield chunk
+
+
+def stream_table(
+    format: ExportFormat,
+    filename: str,
+    header: list[str],
+    rows: AsyncIterator[list],
+    title: str = "Sheet1"
+) -> StreamingResponse:
+    """StreamingResponse tải file filename.<format> từ các dòng rows"""
+    body = csv_chunks(header, rows) if format == "csv" else xlsx_chunks(header, rows, title)
+    filename = f"{filename}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+    )
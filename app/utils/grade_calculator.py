@@ -1,6 +1,15 @@
 """
 Utility functions for grade calculation
+
+Các hàm *_array nhận cột điểm dạng numpy (NaN = chưa có điểm) và cho kết quả
+giống hệt từng bit với các hàm tính từng điểm tương ứng.
 """
+from collections.abc import Sequence
+import numpy as np
+
+# Mốc điểm hệ 10 (tăng dần) và điểm hệ 4 tương ứng cho np.digitize
+GPA_4_BINS = np.array([4.0, 5.0, 5.5, 6.5, 7.0, 8.0, 8.5])
+GPA_4_POINTS = np.array([0.0, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0])
 
 def calculate_total_score(
     regular_1: float | None, 
@@ -121,3 +130,114 @@ def calculate_semester_gpa(course_grades: list[dict], courses_info: dict) -> tup
     gpa = round(total_grade_points / total_credits, 2) if total_credits > 0 else 0.0
     
     return gpa, total_credits, passed_credits
+
+
+def _round_2(values: np.ndarray) -> np.ndarray:
+    """Làm tròn 2 chữ số giống round() của Python
+
+    np.round tính rint(x * 100) / 100 nên có thể lệch round() ở các giá trị sát
+    mốc .xx5; các phần tử đó được làm tròn lại bằng round().
+    """
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        rounded.flat[i] = round(float(values.flat[i]), 2)
+    return rounded
+
+
+def calculate_total_score_array(
+    regular_1,
+    regular_2,
+    final,
+    regular_weight_1=0.2,
+    regular_weight_2=0.3,
+    final_weight=0.5
+) -> np.ndarray:
+    """
+    Tính điểm tổng kết cho cả cột điểm (giống calculate_total_score)
+
+    Args:
+        regular_1, regular_2, final: Cột điểm, NaN nếu chưa có điểm
+        regular_weight_1, regular_weight_2, final_weight: Trọng số (số hoặc cột)
+
+    Returns:
+        Cột điểm tổng kết, NaN nếu thiếu điểm cuối kỳ
+    """
+    r1 = np.asarray(regular_1, dtype=np.float64)
+    r2 = np.asarray(regular_2, dtype=np.float64)
+    final = np.asarray(final, dtype=np.float64)
+    w1 = np.asarray(regular_weight_1, dtype=np.float64)
+    w2 = np.asarray(regular_weight_2, dtype=np.float64)
+    w3 = np.asarray(final_weight, dtype=np.float64)
+
+    has_1 = ~np.isnan(r1)
+    has_2 = ~np.isnan(r2)
+
+    # Giữ đúng thứ tự phép tính của bản scalar để kết quả trùng từng bit
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = np.select(
+            [has_1 & has_2, has_2, has_1],
+            [
+                r1 * w1 + r2 * w2 + final * w3,
+                (r2 * w2 + final * w3) / (w2 + w3),
+                (r1 * w1 + final * w3) / (w1 + w3)
+            ],
+            default=final
+        )
+
+    return np.where(np.isnan(final), np.nan, _round_2(total))
+
+
+def convert_to_gpa_4_array(scores_10) -> np.ndarray:
+    """Chuyển cột điểm hệ 10 sang hệ 4 (NaN giữ nguyên NaN)"""
+    scores = np.asarray(scores_10, dtype=np.float64)
+    gpa_4 = GPA_4_POINTS[np.digitize(scores, GPA_4_BINS)]
+    return np.where(np.isnan(scores), np.nan, gpa_4)
+
+
+def is_passing_grade_array(scores_10) -> np.ndarray:
+    """Cột bool điểm đạt (>= 4.0), NaN là không đạt"""
+    return np.asarray(scores_10, dtype=np.float64) >= 4.0
+
+
+def calculate_semester_gpa_batch(
+    group_keys: Sequence,
+    total_scores,
+    credits
+) -> dict:
+    """
+    Tính GPA và tín chỉ theo nhóm (thường là theo sinh viên) trong 1 lượt
+
+    Args:
+        group_keys: Khóa nhóm của từng dòng điểm (vd: student_id)
+        total_scores: Cột điểm tổng kết, NaN nếu chưa có
+        credits: Cột số tín chỉ của môn tương ứng
+
+    Returns:
+        {key: (gpa, total_credits, passed_credits)} giống calculate_semester_gpa
+    """
+    if len(group_keys) == 0:
+        return {}
+
+    keys, idx = np.unique(np.asarray(group_keys, dtype=object), return_inverse=True)
+    scores = np.asarray(total_scores, dtype=np.float64)
+    credits = np.asarray(credits, dtype=np.float64)
+
+    # Bỏ các dòng chưa có điểm hoặc môn 0 tín chỉ
+    valid = ~np.isnan(scores) & (credits != 0)
+    credits = np.where(valid, credits, 0.0)
+    gpa_4 = np.where(valid, convert_to_gpa_4_array(scores), 0.0)
+
+    n = len(keys)
+    weighted = np.bincount(idx, weights=gpa_4 * credits, minlength=n)
+    total_credits = np.bincount(idx, weights=credits, minlength=n)
+    passed_credits = np.bincount(idx, weights=np.where(is_passing_grade_array(scores), credits, 0.0), minlength=n)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gpa = np.where(total_credits > 0, _round_2(weighted / total_credits), 0.0)
+
+    return {
+        key: (float(gpa[i]), int(total_credits[i]), int(passed_credits[i]))
+        for i, key in enumerate(keys.tolist())
+    }
@@ -0,0 +1,63 @@
+"""
+Đọc file CSV/Excel dạng stream theo từng dòng
+
+Không nạp cả file vào DataFrame: CSV đọc qua csv.DictReader, Excel qua
+openpyxl read-only (đọc dần từng dòng của sheet đầu tiên). Tên cột được chuẩn
+hóa về chữ thường, khoảng trắng -> "_".
+"""
+import codecs
+import csv
+from itertools import islice
+from typing import BinaryIO, Iterator
+
+
+class UnsupportedFileType(ValueError):
+    pass
+
+
+def normalize_header(name) -> str:
+    return "_".join(str(name or "").strip().lower().split())
+
+
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def iter_csv_rows(file: BinaryIO) -> Iterator[dict]:
+    reader = csv.reader(codecs.iterdecode(file, "utf-8-sig"))
+    header = [normalize_header(h) for h in next(reader, [])]
+    for values in reader:
+        if any(v.strip() for v in values):
+            yield {k: _clean(v) for k, v in zip(header, values) if k}
+
+
+def iter_xlsx_rows(file: BinaryIO) -> Iterator[dict]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [normalize_header(h) for h in next(rows, ())]
+        for values in rows:
+            if any(v is not None and str(v).strip() for v in values):
+                yield {k: _clean(v) for k, v in zip(header, values) if k}
+    finally:
+        workbook.close()
+
+
+def iter_table_rows(file: BinaryIO, filename: str) -> Iterator[dict]:
+    """Các dòng dữ liệu (dict theo tên cột) của file .csv/.xlsx"""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return iter_csv_rows(file)
+    if name.endswith((".xlsx", ".xlsm")):
+        return iter_xlsx_rows(file)
+    raise UnsupportedFileType("Only .csv and .xlsx files are supported")
+
+
+def take(rows: Iterator[dict], size: int) -> list[dict]:
+    """Lấy tối đa size dòng tiếp theo (gọi trong threadpool vì đọc file là blocking)"""
+    return list(islice(rows, size))
@@ -1,4 +1,5 @@
 import requests
+import json
 import os
 from dotenv import load_dotenv
 
@@ -110,9 +111,9 @@ class APIClient:
     def get_class_posts(self, class_id):
         """DEPRECATED: Tương thích ngược"""
         # Try administrative first, then course
-        posts = self.get_administrative_posts(class_id)
+        posts = self.get_administrative_posts(class_id)["posts"]
         if not posts:
-            posts = self.get_course_posts(class_id)
+            posts = self.get_course_posts(class_id)["posts"]
         return posts
     
     def create_post(self, class_id, content):
@@ -174,6 +175,11 @@ class APIClient:
             return data
         return None
 
+    def get_university_stats(self, semester):
+        """Admin xem thống kê tất cả lớp chính quy"""
+        res = self.request("GET", f"/stats/university?semester={semester}")
+        return res.json() if res and res.status_code == 200 else []
+
     # --- ADMINISTRATIVE CLASSES (CVHT) ---
     def get_my_administrative_classes(self):
         """Lấy danh sách lớp chính quy"""
@@ -260,11 +266,51 @@ class APIClient:
         res = self.request("GET", url)
         return res.json() if res and res.status_code == 200 else []
 
+    def get_my_transcript(self, semester=None):
+        """Sinh viên xem bảng điểm kèm GPA từng học kỳ"""
+        url = f"/course-grades/transcript?semester={semester}" if semester else "/course-grades/transcript"
+        res = self.request("GET", url)
+        return res.json() if res and res.status_code == 200 else None
+
     def get_course_class_grades(self, class_id):
         """Giáo viên xem bảng điểm lớp học phần"""
         res = self.request("GET", f"/course-grades/course-class/{class_id}")
         return res.json() if res and res.status_code == 200 else []
 
+    def download(self, endpoint, file_path, params=None):
+        """Tải file (stream) về file_path -> (ok, lỗi)"""
+        res = self.request("GET", endpoint, params=params, stream=True)
+        if res is None:
+            return False, "Error"
+        if res.status_code != 200:
+            return False, res.json().get("detail", f"HTTP {res.status_code}")
+        with open(file_path, "wb") as f:
+            for chunk in res.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+        return True, None
+
+    def export_course_grades(self, class_id, file_path):
+        """Tải bảng điểm lớp học phần (.csv/.xlsx theo đuôi file_path)"""
+        fmt = "csv" if file_path.lower().endswith(".csv") else "xlsx"
+        return self.download(f"/course-grades/course-class/{class_id}/export", file_path, {"format": fmt})
+
+    def export_administrative_transcripts(self, class_id, file_path, semester=None):
+        """Tải bảng điểm sinh viên lớp chính quy (.csv/.xlsx theo đuôi file_path)"""
+        params = {"format": "csv" if file_path.lower().endswith(".csv") else "xlsx"}
+        if semester:
+            params["semester"] = semester
+        return self.download(f"/course-grades/administrative-class/{class_id}/export", file_path, params)
+
+    def import_course_grades(self, class_id, file_path, dry_run=False):
+        """Import điểm lớp học phần từ .csv/.xlsx theo mssv -> (ok, báo cáo hoặc lỗi)"""
+        with open(file_path, "rb") as f:
+            res = self.request("POST", f"/course-grades/course-class/{class_id}/import",
+                               params={"dry_run": str(dry_run).lower()},
+                               files={"file": (os.path.basename(file_path), f)}, headers={"Content-Type": None})
+        if res and res.status_code == 200:
+            return True, res.json()
+        return False, res.json().get("detail") if res is not None else "Error"
+
     # --- SEMESTER SUMMARY (CVHT) ---
     def calculate_semester_summary(self, class_id, semester):
         """Tính toán tổng kết học kỳ cho cả lớp"""
@@ -288,20 +334,26 @@ class APIClient:
         return (True, res.json()) if res and res.status_code == 200 else (False, "Error")
 
     # --- POSTS/FORUM ---
-    def get_administrative_posts(self, class_id, skip=0, limit=50):
-        """Lấy bài đăng lớp chính quy"""
-        res = self.request("GET", f"/posts/administrative-classes/{class_id}/posts?skip={skip}&limit={limit}")
-        return res.json() if res and res.status_code == 200 else []
+    def get_administrative_posts(self, class_id, cursor=None, limit=20):
+        """Lấy 1 trang bài đăng lớp chính quy -> {"posts": [...], "next_cursor": ...}"""
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        res = self.request("GET", f"/posts/administrative-classes/{class_id}/posts", params=params)
+        return res.json() if res and res.status_code == 200 else {"posts": [], "next_cursor": None}
 
     def create_administrative_post(self, class_id, content):
         """Tạo bài đăng lớp chính quy"""
         res = self.request("POST", f"/posts/administrative-classes/{class_id}/posts", json={"content": content})
         return (True, res.json()) if res and res.status_code == 200 else (False, None)
 
-    def get_course_posts(self, class_id, skip=0, limit=50):
-        """Lấy bài đăng lớp học phần"""
-        res = self.request("GET", f"/posts/course-classes/{class_id}/posts?skip={skip}&limit={limit}")
-        return res.json() if res and res.status_code == 200 else []
+    def get_course_posts(self, class_id, cursor=None, limit=20):
+        """Lấy 1 trang bài đăng lớp học phần -> {"posts": [...], "next_cursor": ...}"""
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        res = self.request("GET", f"/posts/course-classes/{class_id}/posts", params=params)
+        return res.json() if res and res.status_code == 200 else {"posts": [], "next_cursor": None}
 
     def create_course_post(self, class_id, content):
         """Tạo bài đăng lớp học phần"""
@@ -313,6 +365,11 @@ class APIClient:
         res = self.request("GET", f"/users/{user_id}")
         return res.json() if res and res.status_code == 200 else None
 
+    def get_post(self, post_id):
+        """Lấy chi tiết bài viết (đầy đủ comment)"""
+        res = self.request("GET", f"/posts/{post_id}")
+        return res.json() if res and res.status_code == 200 else None
+
     def toggle_like(self, post_id):
         """Like/Unlike bài viết"""
         self.request("PUT", f"/posts/{post_id}/like")
@@ -337,10 +394,18 @@ class APIClient:
         res = self.request("GET", "/conversations")
         return res.json() if res and res.status_code == 200 else []
 
-    def get_messages(self, conv_id):
-        """Lấy tin nhắn trong hội thoại"""
-        res = self.request("GET", f"/conversations/{conv_id}/messages")
-        return res.json() if res and res.status_code == 200 else []
+    def mark_conversation_read(self, conv_id):
+        """Đánh dấu đã đọc hội thoại"""
+        res = self.request("POST", f"/conversations/{conv_id}/read")
+        return res is not None and res.status_code == 200
+
+    def get_messages(self, conv_id, before=None, after=None, limit=50):
+        """Lấy 1 trang tin nhắn: {"messages": [...], "next_cursor": ..., "has_more": ...}"""
+        params = {"limit": limit}
+        if before: params["before"] = before
+        if after: params["after"] = after
+        res = self.request("GET", f"/conversations/{conv_id}/messages", params=params)
+        return res.json() if res and res.status_code == 200 else {"messages": [], "next_cursor": None, "has_more": False}
 
     def create_conversation(self, receiver_id):
         """Tạo hội thoại mới theo ID"""
@@ -373,6 +438,17 @@ class APIClient:
         """Xóa user"""
         res = self.request("DELETE", f"/users/{user_id}")
         return (True, "OK") if res and res.status_code == 200 else (False, "Error")
+
+    def import_users(self, file_path, administrative_class_id=None):
+        """Import user hàng loạt từ .csv/.xlsx -> (ok, báo cáo hoặc lỗi)"""
+        data = {"administrative_class_id": administrative_class_id} if administrative_class_id else None
+        with open(file_path, "rb") as f:
+            # Bỏ Content-Type json mặc định của session để requests tự đặt multipart
+            res = self.request("POST", "/users/import", files={"file": (os.path.basename(file_path), f)},
+                               data=data, headers={"Content-Type": None})
+        if res and res.status_code == 200:
+            return True, res.json()
+        return False, res.json().get("detail") if res is not None else "Error"
     
     # --- AI ASSISTANT ---
     def chat_with_ai(self, message, context=None):
@@ -383,6 +459,37 @@ class APIClient:
             return data.get('response')
         return None
     
+    def chat_with_ai_stream(self, message, context=None):
+        """Chat with AI assistant, yield từng đoạn câu trả lời (Server-Sent Events)"""
+        url = f"{self.base_url}/ai/chat/stream"
+        payload = {"message": message, "context": context}
+        try:
+            res = self.session.post(url, json=payload, stream=True)
+            if res.status_code == 401 and self.refresh_access_token():
+                res = self.session.post(url, json=payload, stream=True)
+            if res.status_code != 200:
+                raise RuntimeError(f"HTTP {res.status_code}")
+            res.encoding = "utf-8"
+            
+            event = None
+            for line in res.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):].strip())
+                    if event == "done":
+                        return
+                    if event == "error":
+                        raise RuntimeError(data.get("error", "AI error"))
+                    yield data.get("delta", "")
+                elif not line:
+                    event = None
+            # Kết nối đóng trước sự kiện done: câu trả lời bị cắt
+            raise RuntimeError("AI stream ended unexpectedly")
+        except Exception as e:
+            print(f"API Error: {e}")
+            raise
+    
     def check_ai_health(self):
         """Check if AI service is available"""
         res = self.request("GET", "/ai/health")
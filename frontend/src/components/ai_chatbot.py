@@ -16,6 +16,8 @@ class AIChatbot(ctk.CTkToplevel):
         
         self.FONT_FAMILY = "Ubuntu"
         self._destroyed = False
+        self._stream_label = None
+        self._stream_text = ""
         
         self.build_ui()
     
@@ -95,9 +97,11 @@ class AIChatbot(ctk.CTkToplevel):
         bubble = ctk.CTkFrame(self.messages_frame, fg_color="#F1F5F9", corner_radius=15)
         bubble.pack(anchor="w", pady=5, padx=10)
         
-        ctk.CTkLabel(bubble, text=text, font=(self.FONT_FAMILY, 12),
-                    text_color="#334155", wraplength=350,
-                    justify="left").pack(padx=15, pady=10)
+        label = ctk.CTkLabel(bubble, text=text, font=(self.FONT_FAMILY, 12),
+                             text_color="#334155", wraplength=350,
+                             justify="left")
+        label.pack(padx=15, pady=10)
+        return label
     
     def add_loading_message(self):
         """Add loading indicator"""
@@ -129,14 +133,73 @@ class AIChatbot(ctk.CTkToplevel):
         # Add loading
         loading = self.add_loading_message()
         
-        # Send to API in background
-        def send_to_api():
-            response = api.chat_with_ai(message)
+        # Stream câu trả lời trong background, hiển thị dần từng đoạn
+        def stream_from_api():
+            received = False
+            interrupted = False
+            try:
+                for delta in api.chat_with_ai_stream(message):
+                    if self._destroyed:
+                        return
+                    if not received:
+                        received = True
+                        self.after(0, lambda: self.start_bot_stream(loading))
+                    self.after(0, lambda d=delta: self.append_bot_text(d))
+            except Exception:
+                if not received:
+                    # Stream không khả dụng -> gọi API thường
+                    response = api.chat_with_ai(message)
+                    if not self._destroyed:
+                        self.after(0, lambda: self.handle_response(response, loading))
+                    return
+                interrupted = True
             
             if not self._destroyed:
-                self.after(0, lambda: self.handle_response(response, loading))
+                if received:
+                    self.after(0, lambda: self.finish_bot_stream(interrupted))
+                else:
+                    self.after(0, lambda: self.handle_response(None, loading))
+        
+        threading.Thread(target=stream_from_api, daemon=True).start()
+    
+    def start_bot_stream(self, loading_widget):
+        """Thay loading bằng bubble trống để nối dần câu trả lời"""
+        if self._destroyed:
+            return
+        
+        try:
+            loading_widget.destroy()
+        except:
+            pass
+        
+        self._stream_text = ""
+        self._stream_label = self.add_bot_message("")
+    
+    def append_bot_text(self, delta):
+        """Nối thêm đoạn văn bản vào bubble đang stream"""
+        if self._destroyed or self._stream_label is None:
+            return
         
-        threading.Thread(target=send_to_api, daemon=True).start()
+        self._stream_text += delta
+        self._stream_label.configure(text=self._stream_text)
+        
+        try:
+            self.messages_frame._parent_canvas.yview_moveto(1.0)
+        except:
+            pass
+    
+    def finish_bot_stream(self, interrupted=False):
+        """Kết thúc stream, mở lại ô nhập (đánh dấu nếu câu trả lời bị cắt giữa chừng)"""
+        if self._destroyed:
+            return
+        
+        if interrupted:
+            self.append_bot_text("\n\n[Câu trả lời bị gián đoạn. Vui lòng thử lại.]")
+        
+        self._stream_label = None
+        self.send_btn.configure(state="normal")
+        self.input_entry.configure(state="normal")
+        self.input_entry.focus()
     
     def handle_response(self, response, loading_widget):
         """Handle AI response"""
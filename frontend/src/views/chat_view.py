@@ -3,6 +3,7 @@ from src.api.client import api
 import threading
 import websocket
 import json
+import time
 from tkinter import messagebox
 
 class ChatView(ctk.CTkFrame):
@@ -12,6 +13,11 @@ class ChatView(ctk.CTkFrame):
         
         # Quản lý trạng thái
         self.current_conv_id = None
+        self.older_cursor = None  # Cursor trang tin nhắn cũ hơn (None = đã hết)
+        self.loading_older = False
+        self.conv_buttons = {}  # {conv_id: (button, conv)} để cập nhật badge chưa đọc
+        self.last_seen_id = None  # Id tin nhắn mới nhất đã nhận, gửi lên khi kết nối lại
+        self.seen_ids = set()  # Bỏ qua tin trùng (replay + real-time)
         self.ws = None
         self.user_id = api.user_info.get("_id") if api.user_info else ""
         
@@ -84,20 +90,36 @@ class ChatView(ctk.CTkFrame):
             # Khi có tin nhắn mới từ Server gửi về
             try:
                 data = json.loads(message)
-                if data.get("event") == "new_message":
+                event = data.get("event")
+                if self._destroyed:
+                    return
+                if event == "new_message":
                     msg_data = data["data"]
-                    # Nếu đang mở đúng cuộc hội thoại đó thì hiện lên ngay
-                    if msg_data["conversation_id"] == self.current_conv_id and not self._destroyed:
-                        try:
-                            self.after(0, lambda: self.add_message_bubble(msg_data) if not self._destroyed else None)
-                        except:
-                            pass  # Widget destroyed
+                    # Xác nhận đã nhận để server lưu mốc delivered
+                    ws.send(json.dumps({"type": "ack", "conversation_id": msg_data["conversation_id"],
+                                        "message_id": msg_data["id"]}))
+                    self.after(0, lambda: self.on_new_message(msg_data) if not self._destroyed else None)
+                elif event == "replay":
+                    # Các tin nhắn bị lỡ trong lúc mất kết nối
+                    replay = data["data"]
+                    if replay["messages"]:
+                        last = replay["messages"][-1]
+                        ws.send(json.dumps({"type": "ack", "conversation_id": last["conversation_id"],
+                                            "message_id": last["id"]}))
+                    self.after(0, lambda: self.on_replay(replay) if not self._destroyed else None)
+                elif event == "resync_required":
+                    self.after(0, lambda: self.resync() if not self._destroyed else None)
             except:
                 pass  # Ignore errors in callback
 
         def run_ws():
-            self.ws = websocket.WebSocketApp(ws_url, on_message=on_message)
-            self.ws.run_forever()
+            # Server có thể ngắt kết nối chậm (code 1013) -> tự kết nối lại,
+            # gửi kèm id tin mới nhất đã nhận để server chỉ gửi bù phần thiếu
+            while not self._destroyed:
+                url = ws_url + (f"?last_seen={self.last_seen_id}" if self.last_seen_id else "")
+                self.ws = websocket.WebSocketApp(url, on_message=on_message)
+                self.ws.run_forever()
+                time.sleep(2)
 
         # Chạy thread ngầm
         threading.Thread(target=run_ws, daemon=True).start()
@@ -115,30 +137,84 @@ class ChatView(ctk.CTkFrame):
             ctk.CTkLabel(self.conv_list, text="No conversations yet\nClick + New to start chatting").pack(pady=20)
             return
 
-        # Render danh sách
+        # Render danh sách (unread_count có sẵn trong inbox, không cần gọi thêm API)
+        self.conv_buttons = {}
         for conv in convs_with_messages:
-            # Get other user name from populated field
-            display_name = conv.get("other_user_name", "Unknown")
-            
-            # Check if has unread messages (simple: check if last message sender is not me)
-            last_msg = conv.get("last_message")
-            has_unread = False
-            if last_msg and last_msg.get("sender_id") != self.user_id:
-                has_unread = True
-            
-            # Add red dot if unread
-            display_text = f"{display_name}" if has_unread else f"{display_name}"
-            
-            btn = ctk.CTkButton(self.conv_list, text=display_text, 
+            btn = ctk.CTkButton(self.conv_list, text="", 
                                 fg_color="transparent", text_color="#1E293B",
                                 hover_color="#E2E8F0", anchor="w", height=50,
                                 font=(self.FONT_FAMILY, 14),
                                 command=lambda c=conv: self.select_conversation(c))
             btn.pack(fill="x", pady=2)
+            self.conv_buttons[conv["_id"]] = (btn, conv)
+            self.update_unread_badge(conv["_id"], conv.get("unread_count", 0))
+
+    def update_unread_badge(self, conv_id, unread_count):
+        """Hiện số tin chưa đọc cạnh tên người chat"""
+        if conv_id not in self.conv_buttons:
+            return
+        btn, conv = self.conv_buttons[conv_id]
+        conv["unread_count"] = unread_count
+        display_name = conv.get("other_user_name", "Unknown")
+        
+        try:
+            if unread_count:
+                badge = "99+" if unread_count > 99 else str(unread_count)
+                btn.configure(text=f"{display_name}  ● {badge}", font=(self.FONT_FAMILY, 14, "bold"))
+            else:
+                btn.configure(text=display_name, font=(self.FONT_FAMILY, 14))
+        except:
+            pass  # Widget destroyed
+
+    def remember_message(self, msg_id):
+        """Ghi nhận id đã thấy, trả về False nếu là tin trùng"""
+        if msg_id in self.seen_ids:
+            return False
+        self.seen_ids.add(msg_id)
+        # ObjectId dạng hex cùng độ dài: so sánh chuỗi = so sánh thời gian tạo
+        if self.last_seen_id is None or msg_id > self.last_seen_id:
+            self.last_seen_id = msg_id
+        return True
+
+    def on_replay(self, replay):
+        if replay.get("truncated"):
+            # Lỡ quá nhiều tin: tải lại như mới mở
+            self.resync()
+            return
+        for msg in replay.get("messages", []):
+            self.on_new_message(msg)
+
+    def resync(self):
+        """Tải lại danh sách hội thoại và hội thoại đang mở"""
+        self.load_conversations()
+        conv = self.conv_buttons.get(self.current_conv_id)
+        if conv:
+            self.select_conversation(conv[1])
+
+    def on_new_message(self, msg_data):
+        """Tin nhắn real-time: hiện lên nếu đang mở hội thoại, ngược lại tăng badge"""
+        if not self.remember_message(msg_data["id"]):
+            return
+        conv_id = msg_data["conversation_id"]
+        if conv_id == self.current_conv_id:
+            self.add_message_bubble(msg_data)
+            if msg_data["sender_id"] != self.user_id:
+                threading.Thread(target=api.mark_conversation_read, args=(conv_id,), daemon=True).start()
+        elif conv_id in self.conv_buttons:
+            if msg_data["sender_id"] != self.user_id:
+                self.update_unread_badge(conv_id, self.conv_buttons[conv_id][1].get("unread_count", 0) + 1)
+        else:
+            # Hội thoại mới chưa có trong danh sách
+            self.load_conversations()
 
     def select_conversation(self, conv):
         self.current_conv_id = conv["_id"]
         
+        # Đánh dấu đã đọc
+        if conv.get("unread_count"):
+            self.update_unread_badge(conv["_id"], 0)
+            threading.Thread(target=api.mark_conversation_read, args=(conv["_id"],), daemon=True).start()
+        
         # Update Header with populated name
         name = conv.get("other_user_name", "Unknown")
         self.lbl_chat_user.configure(text=f"Chat with {name}")
@@ -147,29 +223,89 @@ class ChatView(ctk.CTkFrame):
         self.msg_box.destroy() # Reset frame tin nhắn để xóa sạch cũ
         self.msg_box = ctk.CTkScrollableFrame(self.right_frame, fg_color="transparent")
         self.msg_box.grid(row=1, column=0, sticky="nsew", padx=5, pady=5)
+        self.older_cursor = None
+        self.loading_older = True  # Chặn tải trang cũ cho tới khi trang đầu hiển thị xong
+        self.watch_scroll_top()
         
-        threading.Thread(target=self.load_history, daemon=True).start()
+        threading.Thread(target=self.load_history, args=(self.current_conv_id,), daemon=True).start()
 
-    def load_history(self):
-        msgs = api.get_messages(self.current_conv_id)
+    def watch_scroll_top(self):
+        """Tải trang tin nhắn cũ hơn khi cuộn lên đầu khung chat"""
+        canvas = self.msg_box._parent_canvas
+        scrollbar_set = canvas.cget("yscrollcommand")
+        
+        def on_scroll(first, last):
+            canvas.tk.call(scrollbar_set, first, last)
+            if float(first) <= 0.0 and float(last) < 1.0:
+                self.load_older_messages()
+        
+        canvas.configure(yscrollcommand=on_scroll)
+
+    def load_history(self, conv_id):
+        # Chỉ tải trang mới nhất, trang cũ hơn tải dần khi cuộn lên
+        page = api.get_messages(conv_id)
         if not self._destroyed:
             try:
-                self.after(0, lambda: self.render_messages(msgs) if not self._destroyed else None)
+                self.after(0, lambda: self.render_messages(conv_id, page) if not self._destroyed else None)
             except:
                 pass  # Widget destroyed
 
-    def render_messages(self, msgs):
-        if self._destroyed:
+    def render_messages(self, conv_id, page):
+        if self._destroyed or conv_id != self.current_conv_id:
             return
-        for msg in msgs:
+        self.older_cursor = page.get("next_cursor")
+        for msg in page.get("messages", []):
+            self.remember_message(msg["_id"])
             self.add_message_bubble(msg)
         # Cuộn xuống cuối
         try:
+            self.msg_box.update_idletasks()
             self.msg_box._parent_canvas.yview_moveto(1.0)
         except:
             pass  # Widget destroyed
+        self.loading_older = False
+
+    def load_older_messages(self):
+        if not self.older_cursor or self.loading_older or not self.current_conv_id:
+            return
+        self.loading_older = True
+        conv_id, cursor = self.current_conv_id, self.older_cursor
+        
+        def fetch():
+            page = api.get_messages(conv_id, before=cursor)
+            if not self._destroyed:
+                try:
+                    self.after(0, lambda: self.prepend_messages(conv_id, page) if not self._destroyed else None)
+                except:
+                    pass  # Widget destroyed
+        
+        threading.Thread(target=fetch, daemon=True).start()
+
+    def prepend_messages(self, conv_id, page):
+        """Chèn trang tin nhắn cũ lên đầu, giữ nguyên vị trí đang xem"""
+        if conv_id != self.current_conv_id:
+            return
+        self.loading_older = False
+        self.older_cursor = page.get("next_cursor")
+        msgs = page.get("messages", [])
+        if not msgs:
+            return
+        
+        try:
+            canvas = self.msg_box._parent_canvas
+            old_height = self.msg_box.winfo_height()
+            first_child = self.msg_box.winfo_children()[0] if self.msg_box.winfo_children() else None
+            for msg in msgs:
+                self.add_message_bubble(msg, before=first_child)
+            
+            self.msg_box.update_idletasks()
+            new_height = self.msg_box.winfo_height()
+            if new_height > 0:
+                canvas.yview_moveto((new_height - old_height) / new_height)
+        except:
+            pass  # Widget destroyed
 
-    def add_message_bubble(self, msg):
+    def add_message_bubble(self, msg, before=None):
         if self._destroyed:
             return
             
@@ -178,7 +314,10 @@ class ChatView(ctk.CTkFrame):
         try:
             # Frame bao quanh tin nhắn
             bubble_frame = ctk.CTkFrame(self.msg_box, fg_color="transparent")
-            bubble_frame.pack(fill="x", pady=5, padx=10)
+            if before is not None:
+                bubble_frame.pack(fill="x", pady=5, padx=10, before=before)
+            else:
+                bubble_frame.pack(fill="x", pady=5, padx=10)
 
             # Style bong bóng
             bg_color = "#3B82F6" if is_me else "#E2E8F0" # Xanh nếu là mình, Xám nếu là họ
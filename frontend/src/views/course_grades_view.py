@@ -1,5 +1,6 @@
 import customtkinter as ctk
-from tkinter import messagebox
+import threading
+from tkinter import messagebox, filedialog
 from src.api.client import api
 
 class CourseGradesView(ctk.CTkScrollableFrame):
@@ -29,6 +30,16 @@ class CourseGradesView(ctk.CTkScrollableFrame):
                                      command=self.save_grades, state="disabled")
         self.save_btn.pack(side="right")
         
+        self.import_btn = ctk.CTkButton(header_frame, text="📥 Import Excel", font=self.FONT_NORMAL,
+                                       height=36, fg_color="#10B981", hover_color="#059669",
+                                       command=self.import_grades, state="disabled")
+        self.import_btn.pack(side="right", padx=(0, 10))
+        
+        self.export_btn = ctk.CTkButton(header_frame, text="📤 Xuất file", font=self.FONT_NORMAL,
+                                       height=36, fg_color="#64748B", hover_color="#475569",
+                                       command=self.export_grades, state="disabled")
+        self.export_btn.pack(side="right", padx=(0, 10))
+        
         # Instructions
         info = ctk.CTkFrame(self, fg_color="#EFF6FF", corner_radius=8, border_width=1, border_color="#BFDBFE")
         info.pack(fill="x", pady=(0, 20))
@@ -219,6 +230,8 @@ class CourseGradesView(ctk.CTkScrollableFrame):
         
         # Enable save button
         self.save_btn.configure(state="normal")
+        self.import_btn.configure(state="normal")
+        self.export_btn.configure(state="normal")
     
 
     def save_grades(self):
@@ -275,4 +288,86 @@ class CourseGradesView(ctk.CTkScrollableFrame):
         else:
             messagebox.showerror("Lỗi", f"Lưu điểm thất bại: {result}")
 
+    def import_grades(self):
+        """Import điểm từ file: xem trước thay đổi (dry run) rồi mới ghi"""
+        if not self.selected_class:
+            return
+        path = filedialog.askopenfilename(filetypes=[("CSV/Excel", "*.csv *.xlsx"), ("All files", "*.*")])
+        if not path:
+            return
+        class_id = self.selected_class.get('_id', self.selected_class.get('id'))
+        self.import_btn.configure(state="disabled", text="Đang kiểm tra...")
+        
+        def worker():
+            ok, res = api.import_course_grades(class_id, path, dry_run=True)
+            self.after(0, lambda: self.on_import_preview(class_id, path, ok, res))
+        
+        threading.Thread(target=worker, daemon=True).start()
+
+    def format_import_report(self, res):
+        msg = f"Tạo mới: {res['created']}, cập nhật: {res['updated']}, không đổi: {res['unchanged']}, lỗi: {res['failed']}"
+        labels = {"regular_score_1": "TX1", "regular_score_2": "TX2", "final_score": "CK", "total_score": "TK"}
+        lines = []
+        for r in res["rows"][:10]:
+            if r["status"] == "error":
+                lines.append(f"Dòng {r['row']} ({r['mssv']}): {r['error']}")
+            else:
+                changes = ", ".join(f"{labels.get(f, f)} {old} → {new}" for f, (old, new) in r["changes"].items())
+                lines.append(f"Dòng {r['row']} {r['mssv']} {r.get('student_name') or ''}: {changes}")
+        if lines:
+            msg += "\n\n" + "\n".join(lines)
+            if len(res["rows"]) > 10:
+                msg += "\n..."
+        return msg
+
+    def on_import_preview(self, class_id, path, ok, res):
+        self.import_btn.configure(state="normal", text="📥 Import Excel")
+        if not ok:
+            messagebox.showerror("Lỗi", str(res))
+            return
+        if not res["created"] and not res["updated"]:
+            messagebox.showinfo("Import", self.format_import_report(res))
+            return
+        if not messagebox.askyesno("Xác nhận import", self.format_import_report(res) + "\n\nLưu các thay đổi này?"):
+            return
+        
+        self.import_btn.configure(state="disabled", text="Đang import...")
+        
+        def worker():
+            ok, res = api.import_course_grades(class_id, path)
+            self.after(0, lambda: self.on_import_done(class_id, ok, res))
+        
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_import_done(self, class_id, ok, res):
+        self.import_btn.configure(state="normal", text="📥 Import Excel")
+        if not ok:
+            messagebox.showerror("Lỗi", str(res))
+            return
+        messagebox.showinfo("Thành công", f"Đã lưu điểm: {res['created']} tạo mới, {res['updated']} cập nhật")
+        self.load_students_and_grades(class_id)
+
+    def export_grades(self):
+        """Tải bảng điểm lớp đang chọn ra file CSV/Excel"""
+        if not self.selected_class:
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".xlsx",
+                                            initialfile=f"bang_diem_{self.selected_class.get('class_code', '')}",
+                                            filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")])
+        if not path:
+            return
+        class_id = self.selected_class.get('_id', self.selected_class.get('id'))
+        self.export_btn.configure(state="disabled", text="Đang xuất...")
+        
+        def worker():
+            ok, err = api.export_course_grades(class_id, path)
+            self.after(0, lambda: self.on_export_done(path, ok, err))
+        
+        threading.Thread(target=worker, daemon=True).start()
 
+    def on_export_done(self, path, ok, err):
+        self.export_btn.configure(state="normal", text="📤 Xuất file")
+        if ok:
+            messagebox.showinfo("Thành công", f"Đã lưu bảng điểm: {path}")
+        else:
+            messagebox.showerror("Lỗi", f"Xuất file thất bại: {err}")
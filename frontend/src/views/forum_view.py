@@ -8,6 +8,8 @@ class ForumView(ctk.CTkFrame):
         self.FONT_FAMILY = "Ubuntu"
         self.user_id = api.user_info.get("_id")
         self.selected_class_id = None
+        self.next_cursor = None  # Cursor trang bài viết kế tiếp
+        self.btn_load_more = None
         self._destroyed = False
 
         # Layout: 2 Cột (25% Danh sách lớp - 75% Newsfeed)
@@ -112,7 +114,8 @@ class ForumView(ctk.CTkFrame):
         
         threading.Thread(target=lambda: self.load_posts(loading), daemon=True).start()
 
-    def load_posts(self, loading_widget):
+    def load_posts(self, loading_widget, cursor=None):
+        """Tải 1 trang bài viết (cursor=None: trang mới nhất, thay toàn bộ feed)"""
         if self._destroyed:
             return
             
@@ -120,21 +123,21 @@ class ForumView(ctk.CTkFrame):
         if hasattr(self, 'selected_class_data'):
             if 'name' in self.selected_class_data:
                 # Administrative class
-                posts = api.get_administrative_posts(self.selected_class_id)
+                page = api.get_administrative_posts(self.selected_class_id, cursor=cursor)
             else:
                 # Course class
-                posts = api.get_course_posts(self.selected_class_id)
+                page = api.get_course_posts(self.selected_class_id, cursor=cursor)
         else:
             # Fallback to old method
-            posts = api.get_class_posts(self.selected_class_id)
+            page = {"posts": api.get_class_posts(self.selected_class_id), "next_cursor": None}
         
         if not self._destroyed:
             try:
-                self.after(0, lambda: self.render_posts(posts, loading_widget) if not self._destroyed else None)
+                self.after(0, lambda: self.render_posts(page, loading_widget, append=cursor is not None) if not self._destroyed else None)
             except:
                 pass  # Widget destroyed
 
-    def render_posts(self, posts, loading_widget):
+    def render_posts(self, page, loading_widget, append=False):
         if self._destroyed:
             return
         try:
@@ -142,11 +145,20 @@ class ForumView(ctk.CTkFrame):
         except:
             pass  # Already destroyed
         
-        # Clear all existing posts first
-        for widget in self.posts_area.winfo_children():
-            widget.destroy()
+        if append:
+            # Chỉ bỏ nút "Load more" cũ, giữ các bài đã hiển thị
+            if self.btn_load_more:
+                self.btn_load_more.destroy()
+        else:
+            # Clear all existing posts first
+            for widget in self.posts_area.winfo_children():
+                widget.destroy()
+        self.btn_load_more = None
+        
+        posts = page.get("posts", [])
+        self.next_cursor = page.get("next_cursor")
         
-        if not posts:
+        if not posts and not append:
             ctk.CTkLabel(self.posts_area, text="No posts yet. Be the first to share!", 
                          font=(self.FONT_FAMILY, 14)).pack(pady=20)
             return
@@ -154,6 +166,21 @@ class ForumView(ctk.CTkFrame):
         for post in posts:
             self.create_post_card(post)
 
+        if self.next_cursor:
+            self.btn_load_more = ctk.CTkButton(self.posts_area, text="Load more posts",
+                                               fg_color="transparent", text_color="#3B82F6",
+                                               hover_color="#E2E8F0", font=(self.FONT_FAMILY, 13, "bold"),
+                                               command=self.load_more_posts)
+            self.btn_load_more.pack(pady=10)
+
+    def load_more_posts(self):
+        """Tải trang bài viết cũ hơn và nối vào cuối feed"""
+        if not self.next_cursor or not self.btn_load_more:
+            return
+        self.btn_load_more.configure(text="Loading...", state="disabled")
+        cursor = self.next_cursor
+        threading.Thread(target=lambda: self.load_posts(self.btn_load_more, cursor), daemon=True).start()
+
     def create_post_card(self, post):
         """Tạo giao diện 1 bài viết (Card)"""
         card = ctk.CTkFrame(self.posts_area, fg_color="white", corner_radius=10)
@@ -231,9 +258,10 @@ class ForumView(ctk.CTkFrame):
         actions = ctk.CTkFrame(card, fg_color="#F8FAFC", corner_radius=0, height=40)
         actions.pack(fill="x", pady=(10, 0))
         
-        is_liked = self.user_id in post.get('likes', [])
+        is_liked = post.get('is_liked', False)
+        like_count = post.get('like_count', 0)
         like_color = "#EF4444" if is_liked else "#64748B"
-        like_text = f"♥ Liked ({len(post.get('likes', []))})" if is_liked else f"♡ Like ({len(post.get('likes', []))})"
+        like_text = f"♥ Liked ({like_count})" if is_liked else f"♡ Like ({like_count})"
         
         btn_like = ctk.CTkButton(actions, text=like_text, 
                                  fg_color="transparent", hover_color="#E2E8F0",
@@ -249,31 +277,22 @@ class ForumView(ctk.CTkFrame):
         comments_frame = ctk.CTkFrame(card, fg_color="#F1F5F9", corner_radius=0)
         comments_frame.pack(fill="x")
 
-        # List comments cũ
-        for cmt in post.get('comments', []):
-            cmt_row = ctk.CTkFrame(comments_frame, fg_color="transparent")
-            cmt_row.pack(fill="x", padx=15, pady=5)
-            
-            # Get commenter name
-            commenter_id = cmt.get('user_id', 'Unknown')
-            commenter_name = cmt.get('user_name')
-            
-            # Nếu là comment của mình, hiển thị "You"
-            if commenter_id == api.user_info.get("_id"):
-                commenter_name = "You"
-            elif not commenter_name:
-                # Fallback nếu backend không populate
-                commenter_name = "Unknown User"
-            
-            # Comment bubble
-            comment_bubble = ctk.CTkFrame(cmt_row, fg_color="#F1F5F9", corner_radius=8)
-            comment_bubble.pack(fill="x", pady=2)
-            
-            ctk.CTkLabel(comment_bubble, text=commenter_name, 
-                         font=(self.FONT_FAMILY, 11, "bold"), text_color="#0EA5E9").pack(anchor="w", padx=10, pady=(5, 0))
-            ctk.CTkLabel(comment_bubble, text=cmt.get('content', ''), 
-                         font=(self.FONT_FAMILY, 12), text_color="#334155", 
-                         wraplength=900, justify="left").pack(anchor="w", padx=10, pady=(0, 5))
+        # List comments: backend chỉ trả về vài comment mới nhất
+        comments_list = ctk.CTkFrame(comments_frame, fg_color="transparent")
+        comments_list.pack(fill="x")
+        
+        comments = post.get('comments', [])
+        hidden = post.get('comment_count', len(comments)) - len(comments)
+        if hidden > 0:
+            btn_all = ctk.CTkButton(comments_list, text=f"View all {post['comment_count']} comments",
+                                    fg_color="transparent", text_color="#64748B", hover_color="#E2E8F0",
+                                    font=(self.FONT_FAMILY, 11, "bold"), anchor="w", height=24)
+            btn_all.configure(command=lambda pid=post['_id'], frame=comments_list, btn=btn_all:
+                              self.load_all_comments(pid, frame, btn))
+            btn_all.pack(anchor="w", padx=15, pady=(5, 0))
+        
+        for cmt in comments:
+            self.create_comment_row(comments_list, cmt)
 
         # Input Comment
         input_row = ctk.CTkFrame(comments_frame, fg_color="transparent")
@@ -298,23 +317,66 @@ class ForumView(ctk.CTkFrame):
         btn_send.pack(side="right")
         entry_cmt.bind("<Return>", lambda e: send_comment())
 
+    def create_comment_row(self, parent, cmt):
+        cmt_row = ctk.CTkFrame(parent, fg_color="transparent")
+        cmt_row.pack(fill="x", padx=15, pady=5)
+        
+        # Get commenter name
+        commenter_id = cmt.get('user_id', 'Unknown')
+        commenter_name = cmt.get('user_name')
+        
+        # Nếu là comment của mình, hiển thị "You"
+        if commenter_id == api.user_info.get("_id"):
+            commenter_name = "You"
+        elif not commenter_name:
+            # Fallback nếu backend không populate
+            commenter_name = "Unknown User"
+        
+        # Comment bubble
+        comment_bubble = ctk.CTkFrame(cmt_row, fg_color="#F1F5F9", corner_radius=8)
+        comment_bubble.pack(fill="x", pady=2)
+        
+        ctk.CTkLabel(comment_bubble, text=commenter_name, 
+                     font=(self.FONT_FAMILY, 11, "bold"), text_color="#0EA5E9").pack(anchor="w", padx=10, pady=(5, 0))
+        ctk.CTkLabel(comment_bubble, text=cmt.get('content', ''), 
+                     font=(self.FONT_FAMILY, 12), text_color="#334155", 
+                     wraplength=900, justify="left").pack(anchor="w", padx=10, pady=(0, 5))
+
+    def load_all_comments(self, post_id, comments_list, btn):
+        """Tải đầy đủ comment của 1 bài (chi tiết bài viết)"""
+        btn.configure(text="Loading...", state="disabled")
+
+        def worker():
+            post = api.get_post(post_id)
+            if post and not self._destroyed:
+                self.after(0, lambda: self.render_all_comments(comments_list, post.get('comments', [])))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def render_all_comments(self, comments_list, comments):
+        if self._destroyed or not comments_list.winfo_exists():
+            return
+        for widget in comments_list.winfo_children():
+            widget.destroy()
+        for cmt in comments:
+            self.create_comment_row(comments_list, cmt)
+
     def toggle_like_ui(self, post, like_btn):
         """Toggle like và update UI ngay lập tức"""
         # Gọi API
         api.toggle_like(post['_id'])
         
         # Update UI ngay
-        user_id = self.user_id
-        likes = post.get('likes', [])
-        
-        if user_id in likes:
+        if post.get('is_liked'):
             # Unlike
-            likes.remove(user_id)
-            like_btn.configure(text=f"♡ Like ({len(likes)})", text_color="#64748B")
+            post['is_liked'] = False
+            post['like_count'] = max(post.get('like_count', 1) - 1, 0)
+            like_btn.configure(text=f"♡ Like ({post['like_count']})", text_color="#64748B")
         else:
             # Like
-            likes.append(user_id)
-            like_btn.configure(text=f"♥ Liked ({len(likes)})", text_color="#EF4444")
+            post['is_liked'] = True
+            post['like_count'] = post.get('like_count', 0) + 1
+            like_btn.configure(text=f"♥ Liked ({post['like_count']})", text_color="#EF4444")
 
     def open_post_dialog(self):
         dialog = ctk.CTkToplevel(self)
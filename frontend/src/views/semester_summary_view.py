@@ -1,5 +1,6 @@
 import customtkinter as ctk
-from tkinter import messagebox
+import threading
+from tkinter import messagebox, filedialog
 from src.api.client import api
 
 class SemesterSummaryView(ctk.CTkScrollableFrame):
@@ -49,6 +50,11 @@ class SemesterSummaryView(ctk.CTkScrollableFrame):
                      fg_color="#0EA5E9", hover_color="#0284C7",
                      command=self.load_summary).grid(row=0, column=5, padx=10, pady=5)
         
+        self.export_btn = ctk.CTkButton(inner, text="Xuất bảng điểm", font=self.FONT_NORMAL, height=36,
+                                        fg_color="#64748B", hover_color="#475569",
+                                        command=self.export_transcripts)
+        self.export_btn.grid(row=0, column=6, padx=10, pady=5)
+        
         # Summary table
         self.table_frame = ctk.CTkFrame(self, fg_color="white", corner_radius=12)
         self.table_frame.pack(fill="both", expand=True)
@@ -98,6 +104,41 @@ class SemesterSummaryView(ctk.CTkScrollableFrame):
         else:
             messagebox.showerror("Lỗi", "Tính điểm TB thất bại")
 
+    def export_transcripts(self):
+        """Tải bảng điểm các môn của cả lớp (học kỳ đang nhập, để trống = tất cả)"""
+        class_name = self.class_var.get()
+        semester = self.semester_var.get().strip() or None
+        
+        class_id = None
+        for cls in getattr(self, 'classes_data', []):
+            if cls['name'] == class_name:
+                class_id = cls.get('id', cls.get('_id'))
+                break
+        
+        if not class_id:
+            messagebox.showerror("Lỗi", "Vui lòng chọn lớp")
+            return
+        
+        path = filedialog.asksaveasfilename(defaultextension=".xlsx",
+                                            initialfile=f"bang_diem_{class_name}" + (f"_{semester}" if semester else ""),
+                                            filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")])
+        if not path:
+            return
+        self.export_btn.configure(state="disabled", text="Đang xuất...")
+        
+        def worker():
+            ok, err = api.export_administrative_transcripts(class_id, path, semester)
+            self.after(0, lambda: self.on_export_done(path, ok, err))
+        
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_export_done(self, path, ok, err):
+        self.export_btn.configure(state="normal", text="Xuất bảng điểm")
+        if ok:
+            messagebox.showinfo("Thành công", f"Đã lưu bảng điểm: {path}")
+        else:
+            messagebox.showerror("Lỗi", f"Xuất file thất bại: {err}")
+
     def load_summary(self):
         """Load tổng kết học kỳ"""
         class_name = self.class_var.get()
@@ -1,7 +1,7 @@
 import customtkinter as ctk
 from src.api.client import api
 import threading
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
 
 class UsersView(ctk.CTkFrame):
     def __init__(self, master):
@@ -69,6 +69,39 @@ class UsersView(ctk.CTkFrame):
                      fg_color="#6366F1", hover_color="#4F46E5",
                      corner_radius=10, font=(self.FONT, 16),
                      command=lambda: self.refresh(None)).pack(side="left", padx=5)
+        
+        self.btn_import = ctk.CTkButton(filter_frame, text="Import CSV/Excel", height=38,
+                                        fg_color="#10B981", hover_color="#059669",
+                                        corner_radius=10, font=(self.FONT, 13, "bold"),
+                                        command=self.import_users)
+        self.btn_import.pack(side="left", padx=5)
+
+    def import_users(self):
+        path = filedialog.askopenfilename(filetypes=[("CSV/Excel", "*.csv *.xlsx"), ("All files", "*.*")])
+        if not path:
+            return
+        self.btn_import.configure(state="disabled", text="Đang import...")
+        
+        def worker():
+            ok, res = api.import_users(path)
+            self.after(0, lambda: self.on_import_done(ok, res))
+        
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_import_done(self, ok, res):
+        self.btn_import.configure(state="normal", text="Import CSV/Excel")
+        if not ok:
+            messagebox.showerror("Lỗi", str(res))
+            return
+        
+        msg = f"Đã thêm {res['inserted']}/{res['total_rows']} người dùng ({res['elapsed_ms'] / 1000:.1f}s)"
+        if res["failed"]:
+            lines = [f"Dòng {e['row']} ({e['mssv']}): {e['error']}" for e in res["errors"][:10]]
+            msg += f"\n\n{res['failed']} dòng lỗi:\n" + "\n".join(lines)
+            if res["failed"] > 10:
+                msg += "\n..."
+        messagebox.showinfo("Import", msg)
+        self.refresh(None)
 
     def refresh(self, _):
         for widget in self.scroll.winfo_children():
@@ -0,0 +1,426 @@
+"""
+Sinh dữ liệu giả lập quy mô lớn (1 trường đại học) và nạp vào MongoDB
+
+Dữ liệu được sinh lần lượt theo từng lớp chính quy (sinh viên, lớp học phần
+các học kỳ, điểm, tổng kết, bài đăng, hội thoại) và ghi song song bằng
+BulkLoader nên bộ nhớ không phụ thuộc số sinh viên.
+
+Ví dụ:
+    python generate_sample_data.py --drop
+    python generate_sample_data.py --students 100000 --drop --concurrency 16
+
+Mọi tài khoản dùng chung 1 mật khẩu (mặc định password123, đã băm bcrypt).
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+from datetime import datetime, timedelta
+from time import perf_counter
+import numpy as np
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient
+
+from app.core.catalog import CourseCatalog
+from app.core.conversations import pair_key
+from app.core.security import hash_password, password_service
+from app.db.bulk_loader import BulkLoader
+from app.db.indexes import ensure_indexes
+from app.utils.grade_calculator import calculate_semester_gpa_batch, calculate_total_score_array, convert_to_gpa_4_array
+
+load_dotenv()
+
+COLLECTIONS = [
+    "users", "courses", "administrative_classes", "course_classes", "course_grades",
+    "semester_summaries", "posts", "conversations", "messages",
+]
+
+LAST_NAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ", "Hồ", "Ngô", "Dương", "Lý"]
+MIDDLE_NAMES = ["Văn", "Thị", "Hữu", "Đức", "Minh", "Ngọc", "Thanh", "Quang", "Thu", "Gia", "Xuân", "Hoài"]
+FIRST_NAMES = ["An", "Bình", "Chi", "Dũng", "Giang", "Hà", "Hải", "Hạnh", "Hiếu", "Hoa", "Huy", "Khánh", "Lan", "Linh",
+               "Long", "Mai", "Nam", "Nga", "Phúc", "Quân", "Sơn", "Tâm", "Thảo", "Trang", "Trung", "Tú", "Vy", "Yến"]
+SUBJECTS = ["Lập trình Python", "Cấu trúc dữ liệu", "Giải tích", "Đại số tuyến tính", "Xác suất thống kê",
+            "Cơ sở dữ liệu", "Mạng máy tính", "Hệ điều hành", "Trí tuệ nhân tạo", "Học máy", "Kỹ thuật phần mềm",
+            "Lập trình Web", "An toàn thông tin", "Vật lý đại cương", "Tiếng Anh chuyên ngành", "Kinh tế học"]
+GRADE_FORMULAS = [(0.2, 0.3, 0.5), (0.1, 0.3, 0.6), (0.2, 0.2, 0.6), (0.15, 0.15, 0.7)]
+POSTS = ["Thông báo lịch học tuần tới", "Mọi người nộp bài tập trước thứ 6 nhé", "Có ai có tài liệu ôn thi không?",
+         "Lịch thi cuối kỳ đã được cập nhật", "Nhắc lớp đóng học phí đúng hạn", "Chia sẻ đề cương ôn tập",
+         "Lớp mình nghỉ học buổi chiều nay", "Kết quả giữa kỳ đã có trên hệ thống"]
+COMMENTS = ["Cảm ơn bạn!", "Đã nhận ạ", "Cho mình xin với", "Ok mọi người", "Thầy/cô ơi cho em hỏi thêm ạ",
+            "Mình cũng cần", "Tuyệt vời", "Đã nộp rồi nhé"]
+MESSAGES = ["Chào bạn", "Bài tập hôm nay làm chưa?", "Mai đi học không?", "Ok bạn", "Gửi mình tài liệu với",
+            "Cảm ơn nhé", "Mấy giờ họp nhóm?", "Để mình xem đã", "Được rồi", "Hẹn gặp ở thư viện"]
+
+
+class UniversityGenerator:
+    """Sinh document cho từng collection, yield (collection, doc)"""
+
+    def __init__(
+        self,
+        students: int = 1000,
+        class_size: int = 50,
+        teachers: int | None = None,
+        advisors: int | None = None,
+        courses: int = 60,
+        semesters: int = 4,
+        courses_per_semester: int = 5,
+        start_year: int = 2021,
+        posts_per_class: int = 3,
+        comments_per_post: int = 4,
+        conversations_per_class: int = 10,
+        messages_per_conversation: int = 20,
+        password_hash: str = "",
+        seed: int = 42
+    ):
+        self.students = students
+        self.class_size = class_size
+        self.admin_classes = math.ceil(students / class_size)
+        self.teachers = teachers or max(2, students // 50)
+        self.advisors = advisors or max(1, self.admin_classes // 4)
+        self.courses = courses
+        self.semesters = [f"{start_year + i // 2}-{i % 2 + 1}" for i in range(semesters)]
+        self.courses_per_semester = min(courses_per_semester, courses)
+        self.start_year = start_year
+        self.posts_per_class = posts_per_class
+        self.comments_per_post = comments_per_post
+        self.conversations_per_class = conversations_per_class
+        self.messages_per_conversation = messages_per_conversation
+        self.password_hash = password_hash
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+
+        self.course_docs: list[dict] = []
+        self.teacher_ids: list[str] = []
+        self.advisor_ids: list[str] = []
+        self._sections: dict[str, int] = {}  # course_id -> số lớp học phần đã tạo
+
+    def object_id_at(self, when: datetime) -> ObjectId:
+        """ObjectId có timestamp = when để thứ tự _id khớp created_at (phân trang keyset)"""
+        return ObjectId(int(when.timestamp()).to_bytes(4, "big") + self.rng.randbytes(8))
+
+    def semester_range(self, semester: str) -> tuple[datetime, datetime]:
+        year, term = map(int, semester.split("-"))
+        start = datetime(year, 9, 1) if term == 1 else datetime(year + 1, 2, 1)
+        return start, start + timedelta(days=140)
+
+    def random_time(self, start: datetime, end: datetime) -> datetime:
+        return start + timedelta(seconds=self.rng.randrange(int((end - start).total_seconds())))
+
+    def full_name(self) -> str:
+        rng = self.rng
+        return f"{rng.choice(LAST_NAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(FIRST_NAMES)}"
+
+    def user(self, mssv: str, role: str, **extra) -> dict:
+        return {
+            "_id": ObjectId(),
+            "mssv": mssv,
+            "email": f"{mssv.lower()}@university.edu",
+            "full_name": self.full_name(),
+            "phone": f"09{self.rng.randrange(10 ** 8):08d}",
+            "password": self.password_hash,
+            "role": role,
+            "is_active": True,
+            **extra
+        }
+
+    def staff(self):
+        yield "users", self.user("ADMIN001", "ADMIN", full_name="System Administrator")
+        for i in range(self.advisors):
+            doc = self.user(f"CVHT{i + 1:04d}", "CVHT")
+            self.advisor_ids.append(str(doc["_id"]))
+            yield "users", doc
+        for i in range(self.teachers):
+            doc = self.user(f"GV{i + 1:04d}", "TEACHER")
+            self.teacher_ids.append(str(doc["_id"]))
+            yield "users", doc
+
+    def catalog(self):
+        created_at = datetime(self.start_year, 8, 1)
+        for i in range(self.courses):
+            w1, w2, w3 = self.rng.choice(GRADE_FORMULAS)
+            doc = {
+                "_id": ObjectId(),
+                "code": f"IT{3000 + i * 10}",
+                "name": SUBJECTS[i % len(SUBJECTS)] + (f" {i // len(SUBJECTS) + 1}" if i >= len(SUBJECTS) else ""),
+                "credits": self.rng.choice([2, 3, 3, 4]),
+                "grade_formula": {"regular_weight_1": w1, "regular_weight_2": w2, "final_weight": w3},
+                "created_at": created_at
+            }
+            self.course_docs.append(doc)
+            yield "courses", doc
+
+    def scores(self, ability: np.ndarray, difficulty: float, graded: bool):
+        """3 cột điểm (NaN = chưa có), làm tròn 1 chữ số"""
+        def column(noise, missing):
+            values = np.clip(np.round(ability + difficulty + self.np_rng.normal(0, noise, len(ability)), 1), 0, 10)
+            return np.where(self.np_rng.random(len(ability)) < missing, np.nan, values)
+
+        r1, r2 = column(1.0, 0.02), column(1.0, 0.02)
+        final = column(1.3, 0.01) if graded else np.full(len(ability), np.nan)
+        return r1, r2, final
+
+    def administrative_class(self, index: int):
+        start = index * self.class_size
+        size = min(self.class_size, self.students - start)
+        class_id = ObjectId()
+        advisor_id = self.advisor_ids[index % len(self.advisor_ids)]
+
+        students = [
+            self.user(f"{self.start_year}{start + i + 1:06d}", "STUDENT", administrative_class_id=str(class_id))
+            for i in range(size)
+        ]
+        student_ids = [str(s["_id"]) for s in students]
+        for doc in students:
+            yield "users", doc
+
+        yield "administrative_classes", {
+            "_id": class_id,
+            "name": f"CNTT-K{self.start_year % 100}-{index + 1:04d}",
+            "academic_year": f"{self.start_year}-{self.start_year + 4}",
+            "advisor_id": advisor_id,
+            "student_ids": student_ids,
+            "created_at": datetime(self.start_year, 8, 15)
+        }
+
+        ability = np.clip(self.np_rng.normal(7.0, 1.0, size), 2, 9.5)
+        points = np.zeros(size)
+        credits_total = np.zeros(size)
+
+        for semester in self.semesters:
+            sem_start, sem_end = self.semester_range(semester)
+            graded = semester != self.semesters[-1] or len(self.semesters) == 1
+            rows_student, rows_score, rows_credits = [], [], []
+
+            for course in self.rng.sample(self.course_docs, self.courses_per_semester):
+                course_id = str(course["_id"])
+                section = self._sections.get(course_id, 0) + 1
+                self._sections[course_id] = section
+                teacher_id = self.rng.choice(self.teacher_ids)
+                course_class_id = ObjectId()
+
+                yield "course_classes", {
+                    "_id": course_class_id,
+                    "course_id": course_id,
+                    "semester": semester,
+                    "class_code": f"{course['code']}.{section:03d}",
+                    "teacher_id": teacher_id,
+                    "student_ids": student_ids,
+                    "created_at": sem_start - timedelta(days=14)
+                }
+
+                formula = course["grade_formula"]
+                r1, r2, final = self.scores(ability, self.rng.gauss(0, 0.7), graded)
+                totals = calculate_total_score_array(
+                    r1, r2, final, formula["regular_weight_1"], formula["regular_weight_2"], formula["final_weight"]
+                )
+                for i, row in enumerate(zip(r1.tolist(), r2.tolist(), final.tolist(), totals.tolist())):
+                    yield "course_grades", {
+                        "_id": ObjectId(),
+                        "course_class_id": str(course_class_id),
+                        "student_id": student_ids[i],
+                        **{k: None if math.isnan(v) else v
+                           for k, v in zip(("regular_score_1", "regular_score_2", "final_score", "total_score"), row)},
+                        "updated_at": sem_end
+                    }
+                rows_student.extend(range(size))
+                rows_score.extend(totals.tolist())
+                rows_credits.extend([course["credits"]] * size)
+
+                members = [teacher_id] + student_ids
+                yield from self.posts("COURSE", str(course_class_id), [teacher_id], members, sem_start, sem_end)
+
+            if graded:
+                yield from self.summaries(semester, student_ids, rows_student, rows_score, rows_credits,
+                                          points, credits_total, sem_end)
+
+        first_start, _ = self.semester_range(self.semesters[0])
+        _, last_end = self.semester_range(self.semesters[-1])
+        members = [advisor_id] + student_ids
+        yield from self.posts("ADMINISTRATIVE", str(class_id), members, members, first_start, last_end)
+        yield from self.conversations(members, first_start, last_end)
+
+    def summaries(self, semester, student_ids, rows_student, rows_score, rows_credits, points, credits_total, when):
+        """Tổng kết học kỳ tính giống summary_engine (kèm grade_points, cumulative_gpa)"""
+        batch = calculate_semester_gpa_batch(rows_student, rows_score, rows_credits)
+        scores = np.asarray(rows_score, dtype=np.float64)
+        weights = np.where(np.isnan(scores), 0.0, convert_to_gpa_4_array(scores) * np.asarray(rows_credits))
+        grade_points = np.bincount(np.asarray(rows_student, dtype=np.intp), weights=weights, minlength=len(student_ids))
+
+        for i, student_id in enumerate(student_ids):
+            gpa, credits_earned, credits_passed = batch.get(i, (0.0, 0, 0))
+            points[i] += grade_points[i]
+            credits_total[i] += credits_earned
+            yield "semester_summaries", {
+                "_id": ObjectId(),
+                "student_id": student_id,
+                "semester": semester,
+                "gpa": gpa,
+                "credits_earned": credits_earned,
+                "credits_passed": credits_passed,
+                "grade_points": float(grade_points[i]),
+                "cumulative_gpa": round(float(points[i] / credits_total[i]), 2) if credits_total[i] > 0 else 0.0,
+                "tuition_debt": self.rng.random() < 0.02,
+                "academic_warning": 1 if gpa < 1.0 else 0,
+                "updated_at": when
+            }
+
+    def posts(self, post_type, class_id, authors, members, start, end):
+        for _ in range(self.posts_per_class):
+            created_at = self.random_time(start, end)
+            comments = []
+            for _ in range(self.rng.randint(0, 2 * self.comments_per_post)):
+                created_at_comment = created_at + timedelta(minutes=self.rng.randrange(1, 7 * 24 * 60))
+                comments.append({
+                    "user_id": self.rng.choice(members),
+                    "content": self.rng.choice(COMMENTS),
+                    "created_at": created_at_comment
+                })
+            comments.sort(key=lambda c: c["created_at"])
+            yield "posts", {
+                "_id": self.object_id_at(created_at),
+                "post_type": post_type,
+                "class_id": class_id,
+                "author_id": self.rng.choice(authors),
+                "content": self.rng.choice(POSTS),
+                "likes": self.rng.sample(members, self.rng.randint(0, min(len(members), 10))),
+                "comments": comments,
+                "created_at": created_at,
+                "updated_at": created_at
+            }
+
+    def conversations(self, members, start, end):
+        if len(members) < 2 or not self.messages_per_conversation:
+            return
+        pairs = set()
+        for _ in range(self.conversations_per_class * 3):
+            if len(pairs) >= self.conversations_per_class:
+                break
+            pairs.add(pair_key(*self.rng.sample(members, 2)))
+
+        for key in pairs:
+            participants = key.split(":")
+            conversation_id = ObjectId()
+            created_at = self.random_time(start, end)
+            message = None
+            for _ in range(self.messages_per_conversation):
+                created_at += timedelta(seconds=self.rng.randrange(5, 6 * 3600))
+                message = {
+                    "_id": self.object_id_at(created_at),
+                    "conversation_id": str(conversation_id),
+                    "sender_id": self.rng.choice(participants),
+                    "content": self.rng.choice(MESSAGES),
+                    "created_at": created_at
+                }
+                yield "messages", message
+
+            receiver = participants[0] if participants[1] == message["sender_id"] else participants[1]
+            yield "conversations", {
+                "_id": conversation_id,
+                "pair_key": key,
+                "participants": participants,
+                "last_message": {k: message[k] for k in ("content", "sender_id", "created_at")},
+                "updated_at": message["created_at"],
+                "unread": {message["sender_id"]: 0, receiver: self.rng.randint(0, 3)},
+                "last_read": {message["sender_id"]: message["created_at"]}
+            }
+
+    def documents(self):
+        yield from self.staff()
+        yield from self.catalog()
+        for index in range(self.admin_classes):
+            yield from self.administrative_class(index)
+
+
+async def load(args):
+    client = AsyncMongoClient(
+        host=os.getenv("DATABASE_HOST", "localhost"),
+        port=int(os.getenv("DATABASE_PORT", 27017))
+    )
+    db = client[os.getenv("DATABASE_NAME", "data")]
+
+    try:
+        if args.drop:
+            for name in COLLECTIONS:
+                await db.drop_collection(name)
+            print("Đã xóa dữ liệu cũ")
+        elif await db.users.estimated_document_count():
+            print("Database đã có dữ liệu, chạy lại với --drop để xóa trước khi sinh")
+            return
+
+        started = perf_counter()
+        password = hash_password(args.password, password_service.rounds)
+        generator = UniversityGenerator(
+            students=args.students,
+            class_size=args.class_size,
+            teachers=args.teachers,
+            advisors=args.advisors,
+            courses=args.courses,
+            semesters=args.semesters,
+            courses_per_semester=args.courses_per_semester,
+            start_year=args.start_year,
+            posts_per_class=args.posts_per_class,
+            comments_per_post=args.comments_per_post,
+            conversations_per_class=args.conversations_per_class,
+            messages_per_conversation=args.messages_per_conversation,
+            password_hash=password,
+            seed=args.seed
+        )
+        print(f"Sinh {args.students} sinh viên, {generator.admin_classes} lớp chính quy, "
+              f"{generator.teachers} giáo viên, {args.courses} môn, {args.semesters} học kỳ")
+
+        loader = BulkLoader(db, batch_size=args.batch_size, concurrency=args.concurrency)
+        total = 0
+        for collection, doc in generator.documents():
+            await loader.add(collection, doc)
+            total += 1
+            if total % 200_000 == 0:
+                print(f"  {total} documents ({total / (perf_counter() - started):.0f}/s)")
+        await loader.flush()
+        # Server đang chạy nạp lại danh mục môn học mới
+        await CourseCatalog.notify_changed(db)
+
+        elapsed = perf_counter() - started
+        print(f"\nĐã nạp {sum(loader.inserted.values())} documents trong {elapsed:.1f}s "
+              f"({sum(loader.inserted.values()) / elapsed:.0f}/s, {loader.batches} lô)")
+        for name in COLLECTIONS:
+            errors = f", {loader.errors[name]} lỗi" if loader.errors.get(name) else ""
+            print(f"  - {name}: {loader.inserted.get(name, 0)}{errors}")
+
+        if not args.no_indexes:
+            index_started = perf_counter()
+            report = await ensure_indexes(db)
+            print(f"\nIndexes created: {len(report['created'])}, errors: {len(report['errors'])} "
+                  f"({perf_counter() - index_started:.1f}s)")
+
+        print(f"\nTài khoản (mật khẩu: {args.password}): ADMIN001, CVHT0001, GV0001, {args.start_year}000001")
+    finally:
+        await client.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu giả lập và nạp vào MongoDB")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--class-size", type=int, default=50, help="Số sinh viên mỗi lớp chính quy")
+    parser.add_argument("--teachers", type=int, default=None, help="Mặc định: students / 50")
+    parser.add_argument("--advisors", type=int, default=None, help="Mặc định: số lớp chính quy / 4")
+    parser.add_argument("--courses", type=int, default=60)
+    parser.add_argument("--semesters", type=int, default=4)
+    parser.add_argument("--courses-per-semester", type=int, default=5)
+    parser.add_argument("--start-year", type=int, default=2021)
+    parser.add_argument("--posts-per-class", type=int, default=3)
+    parser.add_argument("--comments-per-post", type=int, default=4)
+    parser.add_argument("--conversations-per-class", type=int, default=10)
+    parser.add_argument("--messages-per-conversation", type=int, default=20)
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000, help="Số document mỗi lệnh insert_many")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số lô insert_many chạy song song")
+    parser.add_argument("--drop", action="store_true", help="Xóa dữ liệu cũ trước khi nạp")
+    parser.add_argument("--no-indexes", action="store_true", help="Không tạo index sau khi nạp")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(load(parse_args()))
@@ -1,31 +1,36 @@
 """
 Script để import sample data mới vào MongoDB
 Dựa trên backend đã refactor với cấu trúc điểm mới
+
+Dữ liệu lớn (benchmark, kiểm tra index): dùng generate_sample_data.py
 """
 import asyncio
 import json
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient
 from dotenv import load_dotenv
 import os
 from datetime import datetime
 from bson import ObjectId
 
+from app.core.catalog import CourseCatalog
+from app.core.security import hash_password, password_service
+
 load_dotenv()
 
 async def import_sample_data():
     """Import sample data vào MongoDB"""
     
     # Kết nối database
-    client = AsyncIOMotorClient(
+    client = AsyncMongoClient(
         host=os.getenv("DATABASE_HOST", "localhost"),
         port=int(os.getenv("DATABASE_PORT", 27017))
     )
-    db = client[os.getenv("DATABASE_NAME", "qlsv")]
+    db = client[os.getenv("DATABASE_NAME", "data")]
     
     print("=" * 60)
     print("IMPORT SAMPLE DATA - BACKEND MỚI")
     print("=" * 60)
-    print(f"Database: {os.getenv('DATABASE_NAME', 'qlsv')}")
+    print(f"Database: {os.getenv('DATABASE_NAME', 'data')}")
     print("-" * 60)
     
     # Đọc file JSON
@@ -61,6 +66,12 @@ async def import_sample_data():
         # Import users
         print("\n👥 Import users...")
         users = convert_objectid(data['users'])
+        # File mẫu lưu mật khẩu dạng rõ, băm trước khi ghi (mỗi mật khẩu 1 lần)
+        hashed = {}
+        for user in users:
+            if user['password'] not in hashed:
+                hashed[user['password']] = hash_password(user['password'], password_service.rounds)
+            user['password'] = hashed[user['password']]
         result = await db.users.insert_many(users)
         print(f"✓ Đã import {len(result.inserted_ids)} users")
         
@@ -100,6 +111,9 @@ async def import_sample_data():
         result = await db.posts.insert_many(posts)
         print(f"✓ Đã import {len(result.inserted_ids)} posts")
         
+        # Server đang chạy nạp lại danh mục môn học mới
+        await CourseCatalog.notify_changed(db)
+        
         print("\n" + "=" * 60)
         print("✅ IMPORT HOÀN TẤT!")
         print("=" * 60)
@@ -134,7 +148,7 @@ async def import_sample_data():
         import traceback
         traceback.print_exc()
     finally:
-        client.close()
+        await client.close()
 
 if __name__ == "__main__":
     asyncio.run(import_sample_data())